@@ -0,0 +1,219 @@
+"""
+Batch mode for ollama_model: run many queries from a JSONL file.
+
+    python batch_recommend.py queries.jsonl results.jsonl --workers 4 --concurrency 2
+
+Input: one JSON object per line, {"id": ..., "query": "..."} ("id" defaults
+to the line number).
+Output: one JSON object per query with route, recommendations, timings,
+prompt stats and parse/request errors (route "failed" when filtering or
+prompt building raised for that query). Lines are flushed as they finish, so
+an interrupted run picks up where it stopped: queries whose id is already
+in the output file are skipped.
+
+Filtering and prompt building run in a process pool (each worker maps the
+same dataset store, see restaurant_store.py); Ollama requests run on a
+thread pool of --concurrency threads sharing one pooled requests.Session.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+import ollama_model
+
+
+def read_queries(path: str):
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            yield str(record.get("id", lineno)), record["query"]
+
+
+def finished_ids(path: str) -> set:
+    """Ids already written by a previous (possibly interrupted) run."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(str(json.loads(line)["id"]))
+            except (ValueError, KeyError):
+                # torn last line from an interrupted run
+                continue
+    return done
+
+
+def prepare(query_id: str, query: str, max_candidates: int, fast_path: bool) -> dict:
+    """Process-pool task: filtering, ranking and prompt building for one query."""
+    prepared = ollama_model.prepare_recommendation(query, max_candidates=max_candidates, fast_path=fast_path)
+    candidates = prepared["candidates"]
+
+    result = {
+        "id": query_id,
+        "query": query,
+        "route": prepared["route"],
+        "prompt": prepared["prompt"],
+        "prompt_stats": prepared["prompt_stats"],
+        "candidates": candidates.to_dict("records") if candidates is not None else [],
+        "timings": {"prepare_ms": prepared["prepare_ms"]},
+        "recommendations": [],
+        "parse_error": False,
+        "error": None,
+    }
+    if prepared["route"] == "fast":
+        result["recommendations"] = ollama_model.recommendation_records(
+            [{"id": i} for i in range(len(candidates))], candidates
+        )
+    return result
+
+
+def failed_record(query_id: str, query, error: Exception) -> dict:
+    """Output line for a query whose preparation raised."""
+    return {
+        "id": query_id,
+        "query": query,
+        "route": "failed",
+        "timings": {},
+        "recommendations": [],
+        "parse_error": False,
+        "error": repr(error),
+    }
+
+
+def run_llm(result: dict, session: requests.Session, timeout: float) -> dict:
+    """Thread-pool task: one Ollama call for a prepared query."""
+    t0 = time.perf_counter()
+    try:
+        raw_response = ollama_model.call_ollama_chat(result["prompt"], session=session, timeout=timeout)
+    except (requests.RequestException, ValueError, KeyError) as e:
+        result["error"] = repr(e)
+    else:
+        items = ollama_model.parse_llm_json(raw_response)
+        candidates = pd.DataFrame(result["candidates"])
+        result["recommendations"] = ollama_model.recommendation_records(items, candidates)
+        result["parse_error"] = not result["recommendations"]
+        if result["parse_error"]:
+            result["raw_response"] = raw_response
+    result["timings"]["llm_ms"] = (time.perf_counter() - t0) * 1000
+    return result
+
+
+def make_session(concurrency: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def run_batch(
+    input_path: str,
+    output_path: str,
+    workers: int = 4,
+    concurrency: int = 2,
+    max_candidates: int = 40,
+    fast_path: bool = True,
+    timeout: float = 300.0,
+) -> dict:
+    done = finished_ids(output_path)
+    queries = list(read_queries(input_path))
+    todo = [(qid, q) for qid, q in queries if qid not in done]
+    # input queries already answered in output_path (not every id found there)
+    summary = {"skipped": len(queries) - len(todo), "total": 0, "fast": 0, "llm": 0, "rejected": 0, "failed": 0,
+               "parse_errors": 0, "errors": 0}
+
+    # a torn last line must not swallow the first new record
+    if os.path.exists(output_path) and os.path.getsize(output_path):
+        with open(output_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    else:
+        needs_newline = False
+
+    t_start = time.perf_counter()
+    session = make_session(concurrency)
+
+    with open(output_path, "a", encoding="utf-8") as out, \
+            ProcessPoolExecutor(max_workers=workers) as prep_pool, \
+            ThreadPoolExecutor(max_workers=concurrency) as llm_pool:
+
+        if needs_newline:
+            out.write("\n")
+
+        def write(result):
+            result.pop("prompt", None)
+            result.pop("candidates", None)
+            result["timings"]["total_ms"] = sum(result["timings"].values())
+            out.write(json.dumps(result, default=str) + "\n")
+            out.flush()
+
+            summary["total"] += 1
+            summary[result["route"]] += 1
+            summary["parse_errors"] += int(result["parse_error"])
+            summary["errors"] += int(result["error"] is not None)
+
+        # prepare future -> (id, query), so a query that fails is recorded, not fatal
+        preparing = {prep_pool.submit(prepare, qid, q, max_candidates, fast_path): (qid, q) for qid, q in todo}
+        pending = set(preparing)
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                if fut in preparing:
+                    qid, q = preparing.pop(fut)
+                    try:
+                        result = fut.result()
+                    except Exception as e:
+                        write(failed_record(qid, q, e))
+                        continue
+                else:
+                    result = fut.result()
+                if result["route"] == "llm" and result["error"] is None and "llm_ms" not in result["timings"]:
+                    pending.add(llm_pool.submit(run_llm, result, session, timeout))
+                else:
+                    write(result)
+
+    summary["wall_s"] = time.perf_counter() - t_start
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="queries JSONL")
+    parser.add_argument("output", help="results JSONL (appended to; resumable)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2,
+                        help="processes for filtering/prompt building")
+    parser.add_argument("--concurrency", type=int, default=2,
+                        help="max concurrent Ollama requests")
+    parser.add_argument("--max-candidates", type=int, default=40)
+    parser.add_argument("--no-fast-path", action="store_true",
+                        help="send every query to the model")
+    parser.add_argument("--timeout", type=float, default=300.0,
+                        help="per-request Ollama timeout in seconds")
+    args = parser.parse_args(argv)
+
+    summary = run_batch(
+        args.input,
+        args.output,
+        workers=args.workers,
+        concurrency=args.concurrency,
+        max_candidates=args.max_candidates,
+        fast_path=not args.no_fast_path,
+        timeout=args.timeout,
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+Offline geospatial lookup for Manhattan.
+
+- manhattan_zip_centroids.csv: ZIP -> centroid (lat, lng)
+- manhattan_neighborhoods.csv: neighborhood name + aliases -> centroid
+- GridIndex: uniform lat/lng grid over restaurant coordinates, answering
+  "rows within N miles of a point" by visiting only the nearby cells.
+
+Restaurants use their own LATITUDE/LONGITUDE when the dataset has them
+(full DOHMH feed) and fall back to their ZIP centroid otherwise.
+"""
+
+import math
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ZIP_CENTROIDS_PATH = os.path.join(HERE, "manhattan_zip_centroids.csv")
+NEIGHBORHOODS_PATH = os.path.join(HERE, "manhattan_neighborhoods.csv")
+
+MILES_PER_DEG_LAT = 69.0
+MILES_PER_BLOCK = 0.05  # ~20 north-south blocks per mile
+MILES_PER_KM = 0.621371
+DEFAULT_RADIUS_MILES = 0.75
+
+RADIUS_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(blocks?|miles?|mi\b|km\b|kilometers?)")
+
+
+def load_zip_centroids(path: str = ZIP_CENTROIDS_PATH) -> dict:
+    """ZIP string -> (lat, lng)."""
+    table = pd.read_csv(path, dtype={"ZIPCODE": str})
+    return {
+        z: (float(lat), float(lng))
+        for z, lat, lng in zip(table["ZIPCODE"], table["LATITUDE"], table["LONGITUDE"])
+    }
+
+
+def load_neighborhoods(path: str = NEIGHBORHOODS_PATH) -> dict:
+    """Lowercase alias -> (neighborhood name, lat, lng)."""
+    table = pd.read_csv(path)
+    aliases = {}
+    for name, alias_list, lat, lng in zip(
+        table["NAME"], table["ALIASES"], table["LATITUDE"], table["LONGITUDE"]
+    ):
+        for alias in str(alias_list).split(";"):
+            alias = alias.strip().lower()
+            if alias:
+                aliases[alias] = (name, float(lat), float(lng))
+    return aliases
+
+
+def parse_radius_miles(query: str, default: float = DEFAULT_RADIUS_MILES) -> float:
+    """'within 5 blocks' -> 0.25, 'within 2 miles' -> 2.0; default if absent."""
+    m = RADIUS_RE.search(query.lower())
+    if not m:
+        return default
+    value, unit = float(m.group(1)), m.group(2)
+    if unit.startswith("block"):
+        return value * MILES_PER_BLOCK
+    if unit.startswith("k"):
+        return value * MILES_PER_KM
+    return value
+
+
+def distance_miles(lat0: float, lng0: float, lat, lng):
+    """Equirectangular distance; accurate to well under 1% across Manhattan."""
+    dy = (np.asarray(lat) - lat0) * MILES_PER_DEG_LAT
+    dx = (np.asarray(lng) - lng0) * MILES_PER_DEG_LAT * math.cos(math.radians(lat0))
+    return np.hypot(dx, dy)
+
+
+def restaurant_coordinates(store, zip_centroids: dict):
+    """
+    (lat, lng) float arrays per row id. NaN where neither the row's own
+    coordinates nor its ZIP centroid are known.
+    """
+    zip_cats = store.categories("ZIPCODE")
+    cat_lat = np.array([zip_centroids.get(z, (np.nan, np.nan))[0] for z in zip_cats])
+    cat_lng = np.array([zip_centroids.get(z, (np.nan, np.nan))[1] for z in zip_cats])
+    codes = np.asarray(store.codes("ZIPCODE"))
+    lat, lng = cat_lat[codes], cat_lng[codes]
+
+    if "LATITUDE" in store.columns and "LONGITUDE" in store.columns:
+        own_lat = np.asarray(store.column("LATITUDE"), dtype=np.float64)
+        own_lng = np.asarray(store.column("LONGITUDE"), dtype=np.float64)
+        # the DOHMH feed uses 0 for "not geocoded"
+        has_own = np.isfinite(own_lat) & np.isfinite(own_lng) & (own_lat != 0) & (own_lng != 0)
+        lat = np.where(has_own, own_lat, lat)
+        lng = np.where(has_own, own_lng, lng)
+
+    return lat, lng
+
+
+class GridIndex:
+    """Row ids bucketed by (lng, lat) grid cell; cells sorted for binary search."""
+
+    def __init__(self, lat: np.ndarray, lng: np.ndarray, cell_deg: float = 0.005):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lng = np.asarray(lng, dtype=np.float64)
+        self.cell_deg = cell_deg
+
+        rows = np.nonzero(np.isfinite(self.lat) & np.isfinite(self.lng))[0]
+        cx = np.floor(self.lng[rows] / cell_deg).astype(np.int64)
+        cy = np.floor(self.lat[rows] / cell_deg).astype(np.int64)
+
+        keys = self._key(cx, cy)
+        order = np.argsort(keys, kind="stable")
+        self.rows = rows[order].astype(np.int64)
+        sorted_keys = keys[order]
+        self.cell_keys, self.cell_starts = np.unique(sorted_keys, return_index=True)
+        self.cell_ends = np.append(self.cell_starts[1:], len(sorted_keys))
+
+    @staticmethod
+    def _key(cx, cy):
+        # lat/lng cell numbers are far below 2**31 in magnitude
+        return (np.asarray(cx, dtype=np.int64) << 32) + (np.asarray(cy, dtype=np.int64) & 0xFFFFFFFF)
+
+    def query_radius(self, lat: float, lng: float, miles: float) -> np.ndarray:
+        """Sorted row ids within `miles` of (lat, lng)."""
+        dlat = miles / MILES_PER_DEG_LAT
+        dlng = miles / (MILES_PER_DEG_LAT * math.cos(math.radians(lat)))
+
+        xs = np.arange(math.floor((lng - dlng) / self.cell_deg), math.floor((lng + dlng) / self.cell_deg) + 1)
+        ys = np.arange(math.floor((lat - dlat) / self.cell_deg), math.floor((lat + dlat) / self.cell_deg) + 1)
+        wanted = self._key(np.repeat(xs, len(ys)), np.tile(ys, len(xs)))
+
+        pos = np.searchsorted(self.cell_keys, wanted)
+        inside = pos < len(self.cell_keys)
+        pos, wanted = pos[inside], wanted[inside]
+        pos = pos[self.cell_keys[pos] == wanted]
+        if not len(pos):
+            return np.empty(0, dtype=np.int64)
+
+        rows = np.concatenate([self.rows[s:e] for s, e in zip(self.cell_starts[pos], self.cell_ends[pos])])
+        rows = rows[distance_miles(lat, lng, self.lat[rows], self.lng[rows]) <= miles]
+        return np.sort(rows)
@@ -0,0 +1,203 @@
+"""
+Ingest the full DOHMH restaurant inspection history into the dataset
+ollama_model.py reads.
+
+    python ingest_inspections.py DOHMH_New_York_City_Restaurant_Inspection_Results.csv
+
+The raw feed has one row per violation per inspection (millions of rows).
+It is streamed in chunks, filtered to Manhattan and reduced to one row per
+CAMIS: the restaurant's details from its latest inspection, the latest
+inspection's CRITICALFLAG, and its critical-violation history
+(CRITICAL_VIOLATIONS count, LAST_CRITICAL_DATE). Memory stays bounded by the
+number of Manhattan restaurants plus one chunk.
+
+Re-running with a newer file is incremental: the previous output is the
+starting state and only rows inspected after the stored watermark (latest
+inspection date already ingested) are processed. Rows dated exactly on the
+watermark that show up later are not picked up; use --full to rebuild.
+"""
+
+import argparse
+import json
+import os
+
+import pandas as pd
+
+from restaurant_store import DATA_PATH, STORE_PATH, convert_csv
+
+STATE_SUFFIX = ".ingest.json"
+CHUNK_ROWS = 200_000
+
+# raw DOHMH column -> dataset column
+RAW_COLUMNS = {
+    "CAMIS": "CAMIS",
+    "DBA": "RESTAURANT",
+    "BUILDING": "BUILDING",
+    "STREET": "STREET",
+    "ZIPCODE": "ZIPCODE",
+    "PHONE": "PHONE",
+    "CUISINE DESCRIPTION": "CUISINE_DESCRIPTION",
+    "Latitude": "LATITUDE",
+    "Longitude": "LONGITUDE",
+}
+INFO_COLUMNS = list(RAW_COLUMNS.values())[1:]
+OUTPUT_COLUMNS = (
+    ["CAMIS", "RESTAURANT", "BUILDING", "STREET", "ZIPCODE", "PHONE",
+     "CUISINE_DESCRIPTION", "CRITICALFLAG"]
+    + ["INSPECTION_DATE", "CRITICAL_VIOLATIONS", "LAST_CRITICAL_DATE", "LATITUDE", "LONGITUDE"]
+)
+
+# the latest inspection is "Critical" if any of its violations is
+FLAG_RANK = {"critical": 2, "not critical": 1, "not applicable": 0}
+RANK_FLAG = {2: "Critical", 1: "Not Critical", 0: "Not Applicable"}
+
+
+def reduce_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Raw violation rows (already Manhattan, dated) -> one row per CAMIS."""
+    flag_rank = chunk["CRITICAL FLAG"].str.strip().str.lower().map(FLAG_RANK).fillna(-1)
+    is_critical = flag_rank == 2
+
+    chunk = chunk.assign(
+        FLAG_RANK=flag_rank,
+        IS_CRITICAL=is_critical,
+        CRITICAL_DATE=chunk["INSPECTION_DATE"].where(is_critical),
+    )
+    history = chunk.groupby("CAMIS").agg(
+        CRITICAL_VIOLATIONS=("IS_CRITICAL", "sum"),
+        LAST_CRITICAL_DATE=("CRITICAL_DATE", "max"),
+    )
+
+    latest_date = chunk.groupby("CAMIS")["INSPECTION_DATE"].transform("max")
+    latest = chunk[chunk["INSPECTION_DATE"] == latest_date]
+    flags = latest.groupby("CAMIS")["FLAG_RANK"].max().rename("FLAG_RANK")
+    info = latest.groupby("CAMIS")[INFO_COLUMNS + ["INSPECTION_DATE"]].last()
+
+    return info.join(flags).join(history)
+
+
+def merge_state(state: pd.DataFrame, part: pd.DataFrame) -> pd.DataFrame:
+    """Combine two per-CAMIS reductions (either may be empty)."""
+    if state is None or state.empty:
+        return part
+    if part.empty:
+        return state
+
+    both = pd.concat([state, part])
+    grouped = both.groupby(level=0)
+
+    history = pd.DataFrame({
+        "CRITICAL_VIOLATIONS": grouped["CRITICAL_VIOLATIONS"].sum(),
+        "LAST_CRITICAL_DATE": grouped["LAST_CRITICAL_DATE"].max(),
+    })
+
+    # an inspection can straddle a chunk boundary: merge flags of equal dates
+    latest_date = grouped["INSPECTION_DATE"].transform("max")
+    latest = both[both["INSPECTION_DATE"] == latest_date]
+    flags = latest.groupby(level=0)["FLAG_RANK"].max()
+    info = latest.groupby(level=0)[INFO_COLUMNS + ["INSPECTION_DATE"]].last()
+
+    return info.join(flags).join(history)
+
+
+def load_previous(output_path: str):
+    """Previous output + watermark, or (None, None) for a fresh ingest."""
+    state_path = output_path + STATE_SUFFIX
+    if not (os.path.exists(output_path) and os.path.exists(state_path)):
+        return None, None
+
+    with open(state_path, encoding="utf-8") as f:
+        watermark = pd.Timestamp(json.load(f)["watermark"])
+
+    prev = pd.read_csv(output_path, dtype=str, keep_default_na=False, na_values=[""])
+    prev["CAMIS"] = prev["CAMIS"].astype("int64")
+    prev = prev.set_index("CAMIS")
+    prev["INSPECTION_DATE"] = pd.to_datetime(prev["INSPECTION_DATE"])
+    prev["LAST_CRITICAL_DATE"] = pd.to_datetime(prev["LAST_CRITICAL_DATE"])
+    prev["CRITICAL_VIOLATIONS"] = prev["CRITICAL_VIOLATIONS"].astype("int64")
+    prev["FLAG_RANK"] = prev["CRITICALFLAG"].str.lower().map(FLAG_RANK).fillna(-1)
+    return prev.drop(columns=["CRITICALFLAG"]), watermark
+
+
+def write_output(state: pd.DataFrame, output_path: str, watermark):
+    out = state.reset_index().rename(columns={"index": "CAMIS"})
+    out["CRITICALFLAG"] = out["FLAG_RANK"].map(RANK_FLAG).fillna("Not Applicable")
+    out["INSPECTION_DATE"] = out["INSPECTION_DATE"].dt.strftime("%Y-%m-%d")
+    out["LAST_CRITICAL_DATE"] = out["LAST_CRITICAL_DATE"].dt.strftime("%Y-%m-%d")
+    out["CRITICAL_VIOLATIONS"] = out["CRITICAL_VIOLATIONS"].astype("int64")
+    out = out.sort_values("CAMIS")[OUTPUT_COLUMNS]
+
+    tmp_path = output_path + ".tmp"
+    out.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, output_path)
+
+    with open(output_path + STATE_SUFFIX, "w", encoding="utf-8") as f:
+        json.dump({"watermark": watermark.strftime("%Y-%m-%d"), "restaurants": len(out)}, f)
+
+
+def ingest(
+    raw_path: str,
+    output_path: str = DATA_PATH,
+    full: bool = False,
+    chunk_rows: int = CHUNK_ROWS,
+    build_store: bool = False,
+) -> dict:
+    state, watermark = (None, None) if full else load_previous(output_path)
+    new_watermark = watermark
+    stats = {"raw_rows": 0, "manhattan_rows": 0, "new_rows": 0}
+
+    reader = pd.read_csv(
+        raw_path,
+        usecols=list(RAW_COLUMNS) + ["BORO", "INSPECTION DATE", "CRITICAL FLAG"],
+        dtype=str,
+        chunksize=chunk_rows,
+    )
+    for chunk in reader:
+        stats["raw_rows"] += len(chunk)
+
+        chunk = chunk[chunk["BORO"].str.strip().str.lower() == "manhattan"]
+        stats["manhattan_rows"] += len(chunk)
+
+        chunk = chunk.rename(columns=RAW_COLUMNS)
+        chunk["CAMIS"] = pd.to_numeric(chunk["CAMIS"], errors="coerce")
+        chunk["INSPECTION_DATE"] = pd.to_datetime(chunk.pop("INSPECTION DATE"), format="%m/%d/%Y", errors="coerce")
+        chunk = chunk.dropna(subset=["CAMIS", "INSPECTION_DATE"])
+        if watermark is not None:
+            chunk = chunk[chunk["INSPECTION_DATE"] > watermark]
+        if chunk.empty:
+            continue
+
+        chunk["CAMIS"] = chunk["CAMIS"].astype("int64")
+        stats["new_rows"] += len(chunk)
+        chunk_max = chunk["INSPECTION_DATE"].max()
+        new_watermark = chunk_max if new_watermark is None else max(new_watermark, chunk_max)
+
+        state = merge_state(state, reduce_chunk(chunk))
+
+    if state is None:
+        raise ValueError(f"No Manhattan inspections found in {raw_path}")
+
+    write_output(state, output_path, new_watermark if new_watermark is not None else pd.Timestamp(0))
+    stats["restaurants"] = len(state)
+    stats["watermark"] = str(new_watermark.date()) if new_watermark is not None else None
+
+    if build_store:
+        convert_csv(output_path, STORE_PATH)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("raw", help="DOHMH inspection results CSV")
+    parser.add_argument("--output", default=DATA_PATH, help="dataset CSV to write (default: %(default)s)")
+    parser.add_argument("--full", action="store_true", help="ignore the watermark and rebuild from scratch")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--store", action="store_true",
+                        help=f"also rebuild the memory-mapped store ({STORE_PATH})")
+    args = parser.parse_args(argv)
+
+    stats = ingest(args.raw, args.output, full=args.full, chunk_rows=args.chunk_rows, build_store=args.store)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,49 +1,201 @@
+import numpy as np
 import pandas as pd
 import requests
 import json
+import os
+import time
+from collections import deque
+from functools import lru_cache
+from typing import NamedTuple
+
+from restaurant_store import DATA_PATH, STORE_PATH, load_store
+from geo_index import GridIndex, distance_miles, load_neighborhoods, load_zip_centroids, parse_radius_miles, restaurant_coordinates
+from query_parser import PatternMatcher, on_word_boundaries
+from retrieval import INDEX_META, BM25Index, store_documents
 
-DATA_PATH = "manhattan_restaurants.csv" 
 MODEL_NAME = "gemma3:12b"
-OLLAMA_URL = "http://localhost:11434/api/chat" 
+# overridable to point at a stub (see the Approach 2 bench/stub_upstreams.py)
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/chat")
+# keep the model (and its cached prompt prefix) loaded between requests
+OLLAMA_KEEP_ALIVE = "30m"
+
+
+# Memory-mapped columnar store when `python restaurant_store.py` has been run,
+# otherwise the CSV (same cleaning as before, see restaurant_store.read_clean_csv)
+store = load_store(DATA_PATH, STORE_PATH)
+
+
+# =============================
+#  Candidate indexes (built once at load time)
+# =============================
+
+EMPTY_ROWS = np.empty(0, dtype=np.int64)
+
+
+def group_rows(codes: np.ndarray, categories: np.ndarray) -> dict:
+    """
+    Map each category of a dictionary-encoded column to the sorted array of
+    row positions holding it. One stable argsort over the integer codes, so
+    it stays O(n log n) even on the full multi-million-row inspection dataset.
+    """
+    codes = np.asarray(codes)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(categories) + 1))
+    return {
+        categories[k]: order[bounds[k] : bounds[k + 1]].astype(np.int64)
+        for k in range(len(categories))
+    }
+
+
+def union_rows(row_arrays) -> np.ndarray:
+    """Sorted union of several row-id arrays."""
+    row_arrays = [rows for rows in row_arrays if len(rows)]
+    if not row_arrays:
+        return EMPTY_ROWS
+    return np.unique(np.concatenate(row_arrays))
+
+
+# cuisine description -> row ids
+CUISINE_ROWS = group_rows(store.codes("CUISINE_DESCRIPTION"), store.categories("CUISINE_DESCRIPTION"))
 
+# Locations: bundled neighborhood/ZIP centroid tables + a grid index over
+# restaurant coordinates, so "near X (within N blocks)" is a radius search
+NEIGHBORHOODS = load_neighborhoods()
+ZIP_CENTROIDS = load_zip_centroids()
+ROW_LAT, ROW_LNG = restaurant_coordinates(store, ZIP_CENTROIDS)
+GEO_INDEX = GridIndex(ROW_LAT, ROW_LNG)
 
-df = pd.read_csv(DATA_PATH)
+ALL_ROWS = np.arange(len(store), dtype=np.int64)
 
-# Basic data cleaning
-df["ZIPCODE"] = df["ZIPCODE"].fillna(0).astype(int).astype(str)
-df["CUISINE_DESCRIPTION"] = df["CUISINE_DESCRIPTION"].astype(str)
-df["RESTAURANT"] = df["RESTAURANT"].astype(str)
-df["STREET"] = df["STREET"].astype(str)
-df["BUILDING"] = df["BUILDING"].astype(str)
-df["PHONE"] = df["PHONE"].astype(str)
-df["CRITICALFLAG"] = df["CRITICALFLAG"].astype(str)
+# widest radius filter_candidates widens a "near X" search to
+MAX_SEARCH_RADIUS_MILES = 4.0
+
+
+@lru_cache(maxsize=1)
+def retrieval_index() -> BM25Index:
+    """
+    BM25 over name + cuisine + street, used to rank rows within the filter
+    result. Memory-mapped from the store when restaurant_store.py saved it
+    there; otherwise (CSV only, or an older store) built on the first
+    ranked query rather than at import.
+    """
+    if store.path and os.path.exists(os.path.join(store.path, INDEX_META)):
+        return BM25Index.open(store.path)
+    return BM25Index.build(store_documents(store))
 
 
 # =============================
-#  Simple intent check
+#  Query parsing (one pass over the query)
 # =============================
 
-def looks_like_restaurant_query(user_query: str) -> bool:
+RESTAURANT_WORDS = [
+    "restaurant", "restaur", "resturant", "restruant",
+    "food", "eat", "dinner", "lunch", "breakfast",
+    "brunch", "supper", "meal", "place to eat", "where to eat",
+    "recommend", "recommendation", "recommendations"
+]
+
+CUISINE_WORDS = [
+    "chinese", "japanese", "korean", "thai", "italian", "french", "mexican",
+    "indian", "sushi", "noodle", "ramen", "dim sum", "pizza", "burger",
+    "steakhouse", "cafe", "coffee", "bakery"
+]
+
+# Extra words that point at a CUISINE_DESCRIPTION value of the dataset
+CUISINE_ALIASES = {
+    "sushi": "Japanese",
+    "ramen": "Japanese",
+    "izakaya": "Japanese",
+    "dim sum": "Chinese",
+    "dumpling": "Chinese",
+    "taco": "Mexican",
+    "burrito": "Mexican",
+    "curry": "Indian Subcontinent",
+    "indian": "Indian Subcontinent",
+    "steak": "Barbecue & Steakhouse",
+    "bbq": "Barbecue & Steakhouse",
+    "barbecue": "Barbecue & Steakhouse",
+    "vegan": "Vegan_Vegetarian",
+    "vegetarian": "Vegan_Vegetarian",
+    "kosher": "Jewish/Kosher",
+    "ice cream": "Frozen Desserts",
+    "sandwich": "Soups_Salads_Sandwiches_Beverages",
+    "salad": "Soups_Salads_Sandwiches_Beverages",
+}
+
+
+class QueryParse(NamedTuple):
+    intent_words: tuple       # restaurant / cuisine words that mark a food request
+    cuisines: frozenset       # CUISINE_DESCRIPTION values mentioned
+    location: tuple | None    # (label, lat, lng) of the most specific place named
+    radius_miles: float
+
+
+def build_query_matcher() -> PatternMatcher:
+    matcher = PatternMatcher()
+
+    for word in RESTAURANT_WORDS + CUISINE_WORDS:
+        matcher.add(word, ("intent", word))
+
+    # crude match: cuisine name (or first token) appearing anywhere in the query
+    for cuisine in CUISINE_ROWS:
+        c_low = str(cuisine).lower()
+        matcher.add(c_low.split("/")[0], ("cuisine", cuisine))
+        matcher.add(c_low, ("cuisine", cuisine))
+    for alias, cuisine in CUISINE_ALIASES.items():
+        if cuisine in CUISINE_ROWS:
+            matcher.add(alias, ("cuisine", cuisine))
+
+    # places must match on word boundaries ("les" is not inside "miles")
+    for alias, place in NEIGHBORHOODS.items():
+        matcher.add(alias, ("location", place))
+    for zipcode, (lat, lng) in ZIP_CENTROIDS.items():
+        matcher.add(zipcode, ("location", (zipcode, lat, lng)))
+
+    matcher.build()
+    return matcher
+
+
+QUERY_MATCHER = build_query_matcher()
+
+
+@lru_cache(maxsize=1024)
+def parse_query(user_query: str) -> QueryParse:
     """
-    Simple heuristic: check for food/restaurant/cuisine words.
-    If this returns False, we ask the user for a clearer restaurant prompt.
+    Intent words, cuisines and location from a single automaton pass.
+    Shared by looks_like_restaurant_query and filter_candidates.
     """
     q = user_query.lower()
+    intent_words, cuisines = [], set()
+    location, location_len = None, 0
+
+    for start, end, (kind, value) in QUERY_MATCHER.find(q):
+        if kind == "intent":
+            intent_words.append(value)
+        elif kind == "cuisine":
+            cuisines.add(value)
+        elif on_word_boundaries(q, start, end) and end - start > location_len:
+            # longest place name wins, e.g. "midtown east" over "midtown"
+            location, location_len = value, end - start
+
+    return QueryParse(
+        intent_words=tuple(intent_words),
+        cuisines=frozenset(cuisines),
+        location=location,
+        radius_miles=parse_radius_miles(q),
+    )
 
-    restaurant_words = [
-        "restaurant", "restaur", "resturant", "restruant",
-        "food", "eat", "dinner", "lunch", "breakfast",
-        "brunch", "supper", "meal", "place to eat", "where to eat",
-        "recommend", "recommendation", "recommendations"
-    ]
 
-    cuisine_words = [
-        "chinese", "japanese", "korean", "thai", "italian", "french", "mexican",
-        "indian", "sushi", "noodle", "ramen", "dim sum", "pizza", "burger",
-        "steakhouse", "cafe", "coffee", "bakery"
-    ]
+# =============================
+#  Simple intent check
+# =============================
 
-    return any(w in q for w in (restaurant_words + cuisine_words))
+def looks_like_restaurant_query(user_query: str) -> bool:
+    """
+    Simple heuristic: check for food/restaurant/cuisine words.
+    If this returns False, we ask the user for a clearer restaurant prompt.
+    """
+    return bool(parse_query(user_query).intent_words)
 
 
 
@@ -53,71 +205,149 @@ def filter_candidates(user_query: str, max_candidates: int = 40) -> pd.DataFrame
     """
     Heuristic filter:
     - Match cuisine words in the query to CUISINE_DESCRIPTION.
-    - Narrow by ZIP codes based on location keywords.
-    - Limit to max_candidates rows.
-    Always returns a DataFrame (never None).
+    - Narrow to rows within a radius of the neighborhood / ZIP named in the
+      query ("within N blocks/miles" if given), doubled up to
+      MAX_SEARCH_RADIUS_MILES while fewer than FAST_PATH_TOP_N such rows
+      are in range (the answer has that many picks).
+    - Keep the max_candidates rows most relevant to the query (BM25 over
+      name, cuisine and street), most relevant first.
+    Always returns a DataFrame (never None); attrs["radius_miles"] is the
+    radius the location filter ended up using (rank_candidates scores
+    proximity against it).
     """
-    q = user_query.lower()
-    candidates = df.copy()
+    parsed = parse_query(user_query)
 
     # --- 1) Cuisine filter based on cuisine description ---
-    cuisine_mask = pd.Series(False, index=candidates.index)
+    rows = union_rows(CUISINE_ROWS[c] for c in parsed.cuisines)
+    if not len(rows):
+        rows = ALL_ROWS
+
+    # --- 2) Location filter: radius search around the named place ---
+    # Rows without own coordinates sit at their ZIP centroid, so a small
+    # radius may contain few or none: widen it until enough cuisine rows
+    # are inside, or keep what the widest radius has.
+    radius = parsed.radius_miles
+    if parsed.location is not None:
+        _, lat, lng = parsed.location
+        while True:
+            nearby = np.intersect1d(rows, GEO_INDEX.query_radius(lat, lng, radius), assume_unique=True)
+            if len(nearby) >= FAST_PATH_TOP_N or radius >= MAX_SEARCH_RADIUS_MILES:
+                break
+            radius = min(radius * 2, MAX_SEARCH_RADIUS_MILES)
+        if len(nearby):
+            rows = nearby
+
+    # --- 3) Fallback if over-filtered: nothing near the place keeps the
+    # cuisine match (rows is only empty if the cuisine filter was) ---
+    if not len(rows):
+        rows = ALL_ROWS
+
+    # --- 4) Rank by relevance and limit candidate count ---
+    rows = retrieval_index().top_k(user_query, max_candidates, rows)
+
+    candidates = store.take(rows)
+    candidates.attrs["radius_miles"] = radius
+    return candidates
 
-    for cuisine in candidates["CUISINE_DESCRIPTION"].unique():
-        c_low = str(cuisine).lower()
-        # crude match: if cuisine name (or first token) appears in query
-        if c_low.split("/")[0] in q or c_low in q:
-            cuisine_mask |= (candidates["CUISINE_DESCRIPTION"] == cuisine)
-
-    if cuisine_mask.any():
-        candidates = candidates[cuisine_mask]
-
-    # --- 2) Location filter by ZIP code keywords ---
-    zip_by_keyword = {
-        # Times Square area
-        "times square": ["10036", "10018", "10019"],
-        "time square":  ["10036", "10018", "10019"],
-
-        # Midtown West
-        "midtown west":   ["10018", "10019", "10036"],
-        "hell's kitchen": ["10018", "10019", "10036"],
-        "hells kitchen":  ["10018", "10019", "10036"],
-        "theater district": ["10018", "10019", "10036"],
-
-        # Midtown East
-        "midtown east":   ["10016", "10017", "10022"],
-        "grand central":  ["10016", "10017", "10022"],
-        "united nations": ["10017", "10022"],
-
-        # Generic "midtown" = east + west
-        "midtown": ["10016", "10017", "10018", "10019", "10022", "10036"],
-
-        # Columbia University / Morningside Heights / UWS
-        "columbia university": ["10027", "10025"],
-        "morningside heights": ["10027", "10025"],
-        "upper west side":     ["10023", "10024", "10025"],
-        "uws":                 ["10023", "10024", "10025"],
-    }
+# pompt builder
 
-    zip_mask = pd.Series(True, index=candidates.index)
-    for keyword, zips in zip_by_keyword.items():
-        if keyword in q:
-            zip_mask = candidates["ZIPCODE"].isin(zips)
-            break
+# Rough token estimate for gemma-style tokenizers on English/addresses.
+CHARS_PER_TOKEN = 4
+PROMPT_TOKEN_BUDGET = 2048
+
+# Static instruction block. It is kept byte-identical and placed first so the
+# local model can reuse its prompt/KV cache for it across requests; everything
+# request-specific comes after it.
+PROMPT_PREFIX = "\n".join([
+    "You are a restaurant recommendation assistant for Manhattan, NYC.",
+    "You will receive:",
+    "1) A user request (location, cuisine, preferences).",
+    "2) A list of candidate restaurants from a Manhattan dataset.",
+    "",
+    "Your job:",
+    "- Pick the BEST 5 restaurants for the user.",
+    "- Prefer candidates that match the location and cuisine hints.",
+    "- If multiple match, prioritize good variety and interesting options.",
+    "- If the list has fewer than 5, recommend as many as possible.",
+    "",
+    "Please answer in this JSON-like format (no extra commentary, "
+    "no explanations outside the JSON array):\n"
+    "[\n"
+    "  {\n"
+    '    \"id\": <candidate ID>,\n'
+    '    \"name\": \"<restaurant name>\",\n'
+    '    \"why\": \"<1-2 sentence explanation>\",\n'
+    '    \"address\": \"<address string>\"\n'
+    "  },\n"
+    "  ... up to 5 entries total ...\n"
+    "]",
+    "",
+])
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def format_candidate_lines(candidates: pd.DataFrame) -> pd.Series:
+    """
+    One prompt line per candidate, built with vectorized string ops.
+    IDs are positions 0..N-1 (candidates is reset_index'ed by the caller).
+    """
+    ids = pd.Series(np.arange(len(candidates)), index=candidates.index).astype(str)
+    address = (
+        candidates["BUILDING"].astype(str) + " "
+        + candidates["STREET"].astype(str) + ", Manhattan, NY "
+        + candidates["ZIPCODE"].astype(str)
+    )
+    return (
+        "- ID " + ids + ": " + candidates["RESTAURANT"].astype(str)
+        + " | Cuisine: " + candidates["CUISINE_DESCRIPTION"].astype(str)
+        + " | Address: " + address
+        + " | InspectionFlag: " + candidates["CRITICALFLAG"].astype(str)
+    )
 
-    candidates = candidates[zip_mask]
 
-    # --- 3) Fallback if over-filtered ---
-    if candidates.empty:
-        candidates = df.copy()
+def build_prompt_with_stats(
+    user_query: str,
+    candidates: pd.DataFrame,
+    token_budget: int = PROMPT_TOKEN_BUDGET,
+):
+    """
+    Build the prompt and pack as many candidates as fit in token_budget.
+    Candidates are taken in order, so the caller puts the highest-priority
+    rows first; at least one candidate is always included.
 
-    # --- 4) Limit candidate count ---
-    if len(candidates) > max_candidates:
-        candidates = candidates.sample(max_candidates, random_state=42)
+    Returns (prompt, stats) where stats has prompt_tokens, prefix_tokens,
+    candidates_used, candidates_dropped and build_ms. Only the first
+    candidates_used rows of `candidates` are referenced by the prompt.
+    """
+    t0 = time.perf_counter()
 
-    return candidates
+    request_block = (
+        "User request:\n" + user_query + "\n\n"
+        "Here are the candidate restaurants (each with an ID):\n"
+    )
+    fixed_tokens = estimate_tokens(PROMPT_PREFIX) + estimate_tokens(request_block)
+
+    lines = format_candidate_lines(candidates)
+    # +1 for the newline joining each line
+    line_tokens = -(-(lines.str.len().to_numpy() + 1) // CHARS_PER_TOKEN)
+    cumulative = np.cumsum(line_tokens)
+    n_used = int(np.searchsorted(cumulative, token_budget - fixed_tokens, side="right"))
+    n_used = min(len(lines), max(n_used, 1))
+
+    prompt = PROMPT_PREFIX + request_block + "\n".join(lines.iloc[:n_used])
+
+    stats = {
+        "prompt_tokens": fixed_tokens + (int(cumulative[n_used - 1]) if n_used else 0),
+        "prefix_tokens": estimate_tokens(PROMPT_PREFIX),
+        "candidates_used": n_used,
+        "candidates_dropped": len(lines) - n_used,
+        "build_ms": (time.perf_counter() - t0) * 1000,
+    }
+    return prompt, stats
 
-# pompt builder
 
 def build_prompt(user_query: str, candidates: pd.DataFrame) -> str:
     """
@@ -126,75 +356,59 @@ def build_prompt(user_query: str, candidates: pd.DataFrame) -> str:
     - Provides structured restaurant info
     - Asks for exactly top 5 recommendations
     """
-    lines = []
-
-    lines.append("You are a restaurant recommendation assistant for Manhattan, NYC.")
-    lines.append("You will receive:")
-    lines.append("1) A user request (location, cuisine, preferences).")
-    lines.append("2) A list of candidate restaurants from a Manhattan dataset.")
-    lines.append("")
-    lines.append("Your job:")
-    lines.append("- Pick the BEST 5 restaurants for the user.")
-    lines.append("- Prefer candidates that match the location and cuisine hints.")
-    lines.append("- If multiple match, prioritize good variety and interesting options.")
-    lines.append("- If the list has fewer than 5, recommend as many as possible.")
-    lines.append("")
-    lines.append("User request:")
-    lines.append(user_query)
-    lines.append("")
-    lines.append("Here are the candidate restaurants (each with an ID):")
-
-    # candidates has already been reset_index in recommend_restaurants
-    for i, row in candidates.iterrows():
-        address = f"{row['BUILDING']} {row['STREET']}, Manhattan, NY {row['ZIPCODE']}"
-        line = (
-            f"- ID {i}: {row['RESTAURANT']} | "
-            f"Cuisine: {row['CUISINE_DESCRIPTION']} | "
-            f"Address: {address} | "
-            f"InspectionFlag: {row['CRITICALFLAG']}"
-        )
-        lines.append(line)
-
-    lines.append("")
-    lines.append(
-        "Please answer in this JSON-like format (no extra commentary, "
-        "no explanations outside the JSON array):\n"
-        "[\n"
-        "  {\n"
-        '    \"id\": <candidate ID>,\n'
-        '    \"name\": \"<restaurant name>\",\n'
-        '    \"why\": \"<1-2 sentence explanation>\",\n'
-        '    \"address\": \"<address string>\"\n'
-        "  },\n"
-        "  ... up to 5 entries total ...\n"
-        "]"
-    )
-
-    return "\n".join(lines)
+    return build_prompt_with_stats(user_query, candidates)[0]
 
 
 # call local model
 
-def call_ollama_chat(prompt: str) -> str:
-    """
-    Call Ollama chat endpoint with gemma3:12b.
-    Make sure `ollama serve` is running locally.
-    """
-    payload = {
+def build_chat_payload(prompt: str, stream: bool = False) -> dict:
+    return {
         "model": MODEL_NAME,
         "messages": [
             {"role": "system", "content": "You are a helpful restaurant recommendation assistant."},
             {"role": "user", "content": prompt},
         ],
-        "stream": False,  
+        "stream": stream,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
     }
 
-    resp = requests.post(OLLAMA_URL, json=payload)
+
+def call_ollama_chat(prompt: str, session=None, timeout=None) -> str:
+    """
+    Call Ollama chat endpoint with gemma3:12b.
+    Make sure `ollama serve` is running locally.
+    Pass a requests.Session to reuse pooled connections across calls.
+    """
+    payload = build_chat_payload(prompt, stream=False)
+
+    resp = (session or requests).post(OLLAMA_URL, json=payload, timeout=timeout)
     resp.raise_for_status()
     data = resp.json()
     return data["message"]["content"]
 
 
+def stream_ollama_chat(prompt: str):
+    """
+    Same request as call_ollama_chat with "stream": true.
+    Yields the content pieces of Ollama's NDJSON chunk stream as they arrive.
+    Raises ValueError if a chunk is not valid JSON or reports an error.
+    Closing the generator early closes the connection, which stops generation.
+    """
+    payload = build_chat_payload(prompt, stream=True)
+
+    with requests.post(OLLAMA_URL, json=payload, stream=True) as resp:
+        resp.raise_for_status()
+        for line in resp.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if "error" in chunk:
+                raise ValueError(f"Ollama stream error: {chunk['error']}")
+            piece = (chunk.get("message") or {}).get("content") or ""
+            if piece:
+                yield piece
+            if chunk.get("done"):
+                break
 
 
 # Parse JSON-like model output
@@ -231,8 +445,151 @@ def parse_llm_json(response: str):
         return None
 
 
+class IncrementalJSONArrayParser:
+    """
+    Incremental version of parse_llm_json for streamed output.
+
+    feed() takes the next piece of model text and returns the objects of the
+    first top-level JSON array whose closing brace arrived in that piece.
+    Anything before the opening '[' (```json fences, chatter) and after the
+    closing ']' is ignored. If an object fails to decode, `failed` is set and
+    the caller should fall back to parse_llm_json on `text`.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._obj = []
+        self.failed = False
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def feed(self, piece: str) -> list:
+        self._parts.append(piece)
+        items = []
+
+        for ch in piece:
+            if self._done:
+                break
+
+            if not self._in_array:
+                if ch == "[":
+                    self._in_array = True
+                continue
+
+            if self._depth == 0:
+                # between objects: only care about a new object or the end
+                if ch == "{":
+                    self._depth = 1
+                    self._obj = [ch]
+                elif ch == "]":
+                    self._done = True
+                continue
+
+            self._obj.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        items.append(json.loads("".join(self._obj)))
+                    except ValueError:
+                        self.failed = True
+                        self._done = True
+                    self._obj = []
+
+        return items
+
+
 # clean output format
 
+def candidate_id(item, candidates: pd.DataFrame):
+    """The candidate ID an LLM item points at, or None if it is not a valid one."""
+    try:
+        rid = int(item.get("id"))
+    except Exception:
+        return None
+    return rid if 0 <= rid < len(candidates) else None
+
+
+def print_recommendation(item, candidates: pd.DataFrame) -> bool:
+    """
+    Print one LLM recommendation. Returns False (printing nothing) when the
+    item does not point at a valid candidate ID.
+    """
+    rid = candidate_id(item, candidates)
+    if rid is None:
+        return False
+
+    row = candidates.iloc[rid]
+
+    name = item.get("name", row["RESTAURANT"])
+    address = f"{row['BUILDING']} {row['STREET']}, Manhattan, NY {row['ZIPCODE']}"
+    phone = row["PHONE"]
+
+    critical_flag = row["CRITICALFLAG"].strip().lower()
+    if critical_flag.startswith("critical"):
+        warning = "⚠️ Food safety notice: This restaurant has a CRITICAL violation flag."
+    else:
+        warning = "No critical food safety violations flagged in the latest record."
+
+    print(f"{name}:")
+    print(f"  Address: {address}")
+    print(f"  Phone: {phone}")
+    print(f"  Warning: {warning}")
+    print()  # blank line between restaurants
+    return True
+
+
+def recommendation_records(items, candidates: pd.DataFrame, max_items: int = 5) -> list:
+    """
+    Structured form of print_pretty_recommendations: one dict per valid item
+    (id, name, why, address, phone, critical) for the first max_items items.
+    """
+    records = []
+    if not isinstance(items, list):
+        return records
+
+    for item in items[:max_items]:
+        rid = candidate_id(item, candidates)
+        if rid is None:
+            continue
+
+        row = candidates.iloc[rid]
+        records.append({
+            "id": rid,
+            "name": item.get("name", row["RESTAURANT"]),
+            "why": item.get("why", ""),
+            "address": f"{row['BUILDING']} {row['STREET']}, Manhattan, NY {row['ZIPCODE']}",
+            "phone": row["PHONE"],
+            "critical": row["CRITICALFLAG"].strip().lower().startswith("critical"),
+        })
+    return records
+
+
 def print_pretty_recommendations(items, candidates: pd.DataFrame):
     """
     items: list of dicts from LLM (id, name, why, address, ...)
@@ -245,56 +602,243 @@ def print_pretty_recommendations(items, candidates: pd.DataFrame):
     print("Great, here are the top 5 recommended restaurants:\n")
 
     for item in items[:5]:
-        # Get candidate ID safely
-        try:
-            rid = int(item.get("id"))
-        except Exception:
-            continue
+        print_recommendation(item, candidates)
 
-        if not (0 <= rid < len(candidates)):
-            continue
 
-        row = candidates.iloc[rid]
+def stream_recommendations(prompt: str, candidates: pd.DataFrame, max_items: int = 5):
+    """
+    Streaming counterpart of call_ollama_chat + parse_llm_json +
+    print_pretty_recommendations: each recommendation is printed as soon as
+    its JSON object closes in the token stream.
+
+    Falls back to whole-response parsing when the stream is malformed:
+    - bad JSON inside the answer: parse_llm_json on the text received so far
+    - bad NDJSON chunk / dropped connection: re-request without streaming
+      and print the picks of the new answer that were not printed yet
+    Items are deduplicated by candidate ID, so a restaurant is never printed
+    twice even when the fallback answer comes from a different generation.
+    """
+    parser = IncrementalJSONArrayParser()
+    printed = set()   # candidate IDs already printed
+    full_text = None
+
+    def emit(item):
+        rid = candidate_id(item, candidates)
+        if rid is None or rid in printed or len(printed) >= max_items:
+            return
+        if not printed:
+            print("Great, here are the top 5 recommended restaurants:\n")
+        print_recommendation(item, candidates)
+        printed.add(rid)
+
+    pieces = stream_ollama_chat(prompt)
+    try:
+        for piece in pieces:
+            for item in parser.feed(piece):
+                emit(item)
+            if len(printed) >= max_items or parser.done:
+                break
+        if parser.failed or not printed:
+            # an object that does not decode, or no closed object at all
+            # (e.g. not an array): parse the answer as a whole
+            full_text = parser.text
+    except (ValueError, requests.exceptions.ChunkedEncodingError):
+        # the objects that did arrive are already printed; a truncated
+        # array holds nothing more, so ask again for the rest
+        full_text = call_ollama_chat(prompt)
+    finally:
+        pieces.close()
+
+    if full_text is not None:
+        items = parse_llm_json(full_text)
+        if isinstance(items, list):
+            for item in items:
+                emit(item)
+
+    if not printed:
+        print("I couldn't parse any recommendations from the model output.")
 
-        name = item.get("name", row["RESTAURANT"])
-        address = f"{row['BUILDING']} {row['STREET']}, Manhattan, NY {row['ZIPCODE']}"
-        phone = row["PHONE"]
 
-        critical_flag = row["CRITICALFLAG"].strip().lower()
-        if critical_flag.startswith("critical"):
-            warning = "⚠️ Food safety notice: This restaurant has a CRITICAL violation flag."
-        else:
-            warning = "No critical food safety violations flagged in the latest record."
+# Deterministic fast path (no LLM)
+
+# Score weights; a query is served without the model when its top picks
+# are clearly separated from the rest: the 5th-best candidate beats the
+# 6th by at least FAST_PATH_MIN_MARGIN. (An absolute score threshold does
+# not work: candidates are already filtered by cuisine, so the cuisine term
+# alone puts nearly every candidate at 0.5 or more.)
+CUISINE_WEIGHT = 0.5
+PROXIMITY_WEIGHT = 0.3
+RELEVANCE_WEIGHT = 0.2
+CRITICAL_PENALTY = 0.15
+FAST_PATH_MIN_MARGIN = 0.05
+FAST_PATH_TOP_N = 5
+
+# route -> queries served, and the end-to-end latencies (seconds) of the
+# last ROUTE_LATENCY_WINDOW of them, for recommend_restaurants
+ROUTE_LATENCY_WINDOW = 1000
+ROUTE_COUNTS = {"fast": 0, "llm": 0}
+ROUTE_LATENCIES = {route: deque(maxlen=ROUTE_LATENCY_WINDOW) for route in ROUTE_COUNTS}
 
-        print(f"{name}:")
-        print(f"  Address: {address}")
-        print(f"  Phone: {phone}")
-        print(f"  Warning: {warning}")
-        print()  # blank line between restaurants
+
+def rank_candidates(user_query: str, candidates: pd.DataFrame) -> pd.DataFrame:
+    """
+    Deterministic score per candidate from existing columns:
+    cuisine match + distance to the named place (within the search radius
+    filter_candidates used, which may be wider than the query's)
+    + BM25 relevance, minus a penalty for a CRITICAL inspection flag.
+    candidates must still be indexed by row id (as filter_candidates returns).
+    Returns candidates sorted by score (best first) with a "score" column.
+    """
+    parsed = parse_query(user_query)
+    rows = candidates.index.to_numpy()
+
+    cuisine = candidates["CUISINE_DESCRIPTION"].isin(parsed.cuisines).to_numpy(dtype=float)
+
+    if parsed.location is not None:
+        _, lat, lng = parsed.location
+        radius = candidates.attrs.get("radius_miles", parsed.radius_miles)
+        dist = distance_miles(lat, lng, ROW_LAT[rows], ROW_LNG[rows])
+        proximity = np.nan_to_num(np.clip(1.0 - dist / radius, 0.0, 1.0))
+    else:
+        proximity = np.zeros(len(rows))
+
+    relevance = retrieval_index().score(user_query)[rows]
+    if len(relevance) and relevance.max() > 0:
+        relevance = relevance / relevance.max()
+
+    critical = (
+        candidates["CRITICALFLAG"].astype(str).str.strip().str.lower()
+        .str.startswith("critical").to_numpy(dtype=float)
+    )
+
+    scores = (
+        CUISINE_WEIGHT * cuisine
+        + PROXIMITY_WEIGHT * proximity
+        + RELEVANCE_WEIGHT * relevance
+        - CRITICAL_PENALTY * critical
+    )
+    order = np.argsort(-scores, kind="stable")
+    return candidates.iloc[order].assign(score=scores[order])
+
+
+def fast_path_recommendations(user_query: str, candidates: pd.DataFrame):
+    """
+    Top FAST_PATH_TOP_N candidates when the deterministic ranker is confident,
+    else None (the query is ambiguous and goes to the LLM). Confident means:
+    the query names both a cuisine and a place, and the last of the top picks
+    scores at least FAST_PATH_MIN_MARGIN above the best candidate left out
+    (with FAST_PATH_TOP_N candidates or fewer there is nothing to choose).
+
+    Dense areas usually go to the LLM: around Times Square dozens of
+    same-cuisine rows score within a few hundredths of each other (cuisine
+    match and proximity dominate), so picking five of them is a matter of
+    variety, which is what the model is asked for.
+    """
+    parsed = parse_query(user_query)
+    if not parsed.cuisines or parsed.location is None:
+        return None
+
+    ranked = rank_candidates(user_query, candidates)
+    scores = ranked["score"].to_numpy()
+    if len(scores) > FAST_PATH_TOP_N and scores[FAST_PATH_TOP_N - 1] - scores[FAST_PATH_TOP_N] < FAST_PATH_MIN_MARGIN:
+        return None
+    return ranked.iloc[:FAST_PATH_TOP_N]
+
+
+def route_report() -> dict:
+    """Share of queries served without the model, and recent p50/p99 latency per path."""
+    total = sum(ROUTE_COUNTS.values())
+    report = {
+        "queries": total,
+        "fast_fraction": ROUTE_COUNTS["fast"] / total if total else 0.0,
+    }
+    for route, latencies in ROUTE_LATENCIES.items():
+        if latencies:
+            report[f"{route}_p50_ms"] = float(np.percentile(latencies, 50) * 1000)
+            report[f"{route}_p99_ms"] = float(np.percentile(latencies, 99) * 1000)
+    return report
 
 
 # Main recommendation function
 
-def recommend_restaurants(user_query: str, max_candidates: int = 40):
-    if not looks_like_restaurant_query(user_query):
-        print(
-            "It looks like your message may not be a restaurant recommendation request.\n"
-            "Please provide more details like where you are in Manhattan and what kind of food you want.\n"
-            "For example:\n"
-            "  - \"I'm near Times Square and want some Chinese food\"\n"
-            "  - \"I'm in SoHo looking for a casual Italian restaurant\"\n"
-        )
+NOT_A_RESTAURANT_QUERY_MESSAGE = (
+    "It looks like your message may not be a restaurant recommendation request.\n"
+    "Please provide more details like where you are in Manhattan and what kind of food you want.\n"
+    "For example:\n"
+    "  - \"I'm near Times Square and want some Chinese food\"\n"
+    "  - \"I'm in SoHo looking for a casual Italian restaurant\"\n"
+)
+
+
+def prepare_recommendation(user_query: str, max_candidates: int = 40, fast_path: bool = True) -> dict:
+    """
+    Everything recommend_restaurants does before calling the model, without
+    printing. Returns a dict with:
+    - route: "rejected" (not a restaurant query), "fast" or "llm"
+    - candidates: DataFrame with reset_index 0..N-1 (the IDs the answer uses)
+    - prompt, prompt_stats: only for route "llm"
+    - prepare_ms
+    """
+    t0 = time.perf_counter()
+    result = {"route": "rejected", "candidates": None, "prompt": None, "prompt_stats": None}
+
+    if looks_like_restaurant_query(user_query):
+        candidates = filter_candidates(user_query, max_candidates=max_candidates)
+
+        ranked = fast_path_recommendations(user_query, candidates) if fast_path else None
+        if ranked is not None:
+            result["route"] = "fast"
+            result["candidates"] = ranked.reset_index(drop=True)
+        else:
+            candidates = candidates.reset_index(drop=True)
+            prompt, prompt_stats = build_prompt_with_stats(user_query, candidates)
+            result["route"] = "llm"
+            result["candidates"] = candidates.iloc[: prompt_stats["candidates_used"]]
+            result["prompt"] = prompt
+            result["prompt_stats"] = prompt_stats
+
+    result["prepare_ms"] = (time.perf_counter() - t0) * 1000
+    return result
+
+
+def recommend_restaurants(
+    user_query: str,
+    max_candidates: int = 40,
+    stream: bool = False,
+    fast_path: bool = True,
+):
+    """
+    stream=True prints each recommendation as soon as the model has produced
+    it (see stream_recommendations) instead of waiting for the full answer.
+    fast_path=True answers confident queries with the deterministic ranker
+    and skips the model (see fast_path_recommendations).
+    Latency per path is recorded in ROUTE_LATENCIES (see route_report).
+    """
+    t0 = time.perf_counter()
+    prepared = prepare_recommendation(user_query, max_candidates=max_candidates, fast_path=fast_path)
+    candidates = prepared["candidates"]
+
+    if prepared["route"] == "rejected":
+        print(NOT_A_RESTAURANT_QUERY_MESSAGE)
+        return
+
+    if prepared["route"] == "fast":
+        print_pretty_recommendations([{"id": i} for i in range(len(candidates))], candidates)
+        ROUTE_COUNTS["fast"] += 1
+        ROUTE_LATENCIES["fast"].append(time.perf_counter() - t0)
         return
 
-    candidates = filter_candidates(user_query, max_candidates=max_candidates)
-    candidates = candidates.reset_index(drop=True)
-    prompt = build_prompt(user_query, candidates)
-    raw_response = call_ollama_chat(prompt)
-    items = parse_llm_json(raw_response)
+    if stream:
+        stream_recommendations(prepared["prompt"], candidates)
+    else:
+        raw_response = call_ollama_chat(prepared["prompt"])
+        items = parse_llm_json(raw_response)
+        print_pretty_recommendations(items, candidates)
 
-    print_pretty_recommendations(items, candidates)
+    ROUTE_COUNTS["llm"] += 1
+    ROUTE_LATENCIES["llm"].append(time.perf_counter() - t0)
 
 
 if __name__ == "__main__":
     user_query = input("Tell me what you're looking for (location + cuisine/preferences):\n> ")
-    recommend_restaurants(user_query)
+    recommend_restaurants(user_query, stream=True)
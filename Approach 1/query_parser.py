@@ -0,0 +1,81 @@
+"""
+Single-pass multi-pattern matching for user queries.
+
+PatternMatcher is an Aho-Corasick automaton: all patterns (intent words,
+cuisine names, neighborhood aliases, ZIPs, ...) are compiled once, and one
+left-to-right pass over the query reports every occurrence of every pattern,
+overlapping ones included. Cost per query is O(len(query) + matches),
+independent of how many patterns are loaded.
+"""
+
+from collections import deque
+
+
+def is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class PatternMatcher:
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]  # per state: [(pattern length, tag), ...]
+        self._built = True
+
+    def add(self, pattern: str, tag):
+        """Register pattern (matched literally, case-sensitive) with a tag."""
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[node][ch] = nxt
+            node = nxt
+        self._out[node].append((len(pattern), tag))
+        self._built = False
+
+    def build(self):
+        """Compute failure links (BFS) and merge outputs along them."""
+        queue = deque(self._goto[0].values())
+        for nxt in queue:
+            self._fail[nxt] = 0
+
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+        self._built = True
+
+    def find(self, text: str) -> list:
+        """All matches as (start, end, tag), in order of their end position."""
+        if not self._built:
+            self.build()
+
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        matches = []
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, tag in out[node]:
+                matches.append((i + 1 - length, i + 1, tag))
+        return matches
+
+
+def on_word_boundaries(text: str, start: int, end: int) -> bool:
+    """Same rule as regex \\b around text[start:end]."""
+    before_ok = start == 0 or not is_word_char(text[start - 1]) or not is_word_char(text[start])
+    after_ok = end == len(text) or not is_word_char(text[end]) or not is_word_char(text[end - 1])
+    return before_ok and after_ok
@@ -0,0 +1,311 @@
+"""
+Columnar on-disk format for the restaurant dataset.
+
+Convert once:
+
+    python restaurant_store.py manhattan_restaurants.csv manhattan_restaurants.store
+
+The store is a directory of .npy files plus a small meta.json:
+- CUISINE_DESCRIPTION, ZIPCODE, CRITICALFLAG are dictionary-encoded
+  (small integer codes + a category list in meta.json)
+- free-text columns (RESTAURANT, STREET, ...) are offset-encoded UTF-8:
+  one uint8 blob plus an int64 offsets array
+- numeric columns (CAMIS, ...) are stored as-is
+- the BM25 retrieval index over the rows (see retrieval.py), so loading
+  it is a memory map too instead of tokenizing every row at startup
+
+RestaurantStore.open() memory-maps every array, so several worker processes
+loading the same store share the same page-cache pages instead of each one
+holding its own copy of Python string objects.
+
+Compare cold start and memory against the CSV path with:
+
+    python restaurant_store.py --bench
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+from retrieval import BM25Index, store_documents
+
+DATA_PATH = "manhattan_restaurants.csv"
+STORE_PATH = "manhattan_restaurants.store"
+
+CATEGORICAL_COLUMNS = ["CUISINE_DESCRIPTION", "ZIPCODE", "CRITICALFLAG"]
+STRING_COLUMNS = ["RESTAURANT", "STREET", "BUILDING", "PHONE"]
+
+STORE_FORMAT_VERSION = 1
+
+
+def read_clean_csv(path: str = DATA_PATH) -> pd.DataFrame:
+    """Read the CSV and apply the basic cleaning ollama_model has always used."""
+    df = pd.read_csv(path)
+
+    df["ZIPCODE"] = df["ZIPCODE"].fillna(0).astype(int).astype(str)
+    for col in CATEGORICAL_COLUMNS + STRING_COLUMNS:
+        if col != "ZIPCODE":
+            df[col] = df[col].astype(str)
+
+    return df
+
+
+def _encode_strings(values):
+    encoded = [str(v).encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return offsets, data
+
+
+def _load_array(path: str, mmap: bool) -> np.ndarray:
+    if not mmap:
+        return np.load(path)
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        # zero-length arrays cannot be mapped
+        return np.load(path)
+
+
+class RestaurantStore:
+    """
+    Column store with the same content as the cleaned CSV DataFrame.
+
+    Row ids are positions 0..n-1. Categorical columns are exposed as codes +
+    categories so indexes can be built without decoding any strings; full
+    rows are only materialized for the ids passed to take().
+    """
+
+    def __init__(self, n_rows, columns, categoricals, strings, numerics):
+        self.n_rows = n_rows
+        self.columns = list(columns)
+        # name -> (codes, categories as object array)
+        self._categoricals = categoricals
+        # name -> (offsets, utf-8 blob)
+        self._strings = strings
+        # name -> ndarray
+        self._numerics = numerics
+        # directory this was opened from (None when built from a CSV)
+        self.path = None
+
+    def __len__(self):
+        return self.n_rows
+
+    # ---------- construction ----------
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> "RestaurantStore":
+        categoricals, strings, numerics = {}, {}, {}
+
+        for col in df.columns:
+            if col in CATEGORICAL_COLUMNS:
+                codes, uniques = pd.factorize(df[col].astype(str), sort=True)
+                code_dtype = np.int16 if len(uniques) < np.iinfo(np.int16).max else np.int32
+                categoricals[col] = (
+                    codes.astype(code_dtype),
+                    np.asarray(uniques, dtype=object),
+                )
+            elif df[col].dtype.kind in "iuf":
+                numerics[col] = df[col].to_numpy()
+            else:
+                strings[col] = _encode_strings(df[col].to_numpy())
+
+        return cls(len(df), df.columns, categoricals, strings, numerics)
+
+    @classmethod
+    def from_csv(cls, path: str = DATA_PATH) -> "RestaurantStore":
+        return cls.from_dataframe(read_clean_csv(path))
+
+    @classmethod
+    def open(cls, path: str = STORE_PATH, mmap: bool = True) -> "RestaurantStore":
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+
+        if meta.get("format") != STORE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported store format in {path}: {meta.get('format')}")
+
+        categoricals, strings, numerics = {}, {}, {}
+        for col, kind in meta["kinds"].items():
+            base = os.path.join(path, col)
+            if kind == "categorical":
+                categoricals[col] = (
+                    _load_array(base + ".codes.npy", mmap),
+                    np.asarray(meta["categories"][col], dtype=object),
+                )
+            elif kind == "string":
+                strings[col] = (
+                    _load_array(base + ".offsets.npy", mmap),
+                    _load_array(base + ".data.npy", mmap),
+                )
+            else:
+                numerics[col] = _load_array(base + ".npy", mmap)
+
+        store = cls(meta["n_rows"], meta["columns"], categoricals, strings, numerics)
+        store.path = path
+        return store
+
+    def save(self, path: str = STORE_PATH):
+        os.makedirs(path, exist_ok=True)
+        kinds, categories = {}, {}
+
+        for col, (codes, cats) in self._categoricals.items():
+            np.save(os.path.join(path, col + ".codes.npy"), np.ascontiguousarray(codes))
+            kinds[col] = "categorical"
+            categories[col] = [str(c) for c in cats]
+        for col, (offsets, data) in self._strings.items():
+            np.save(os.path.join(path, col + ".offsets.npy"), np.ascontiguousarray(offsets))
+            np.save(os.path.join(path, col + ".data.npy"), np.ascontiguousarray(data))
+            kinds[col] = "string"
+        for col, values in self._numerics.items():
+            np.save(os.path.join(path, col + ".npy"), np.ascontiguousarray(values))
+            kinds[col] = "numeric"
+
+        meta = {
+            "format": STORE_FORMAT_VERSION,
+            "n_rows": self.n_rows,
+            "columns": self.columns,
+            "kinds": kinds,
+            "categories": categories,
+        }
+        # meta.json last, so a half-written store is never picked up
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    # ---------- access ----------
+
+    def codes(self, col: str) -> np.ndarray:
+        return self._categoricals[col][0]
+
+    def categories(self, col: str) -> np.ndarray:
+        return self._categoricals[col][1]
+
+    def column(self, col: str) -> np.ndarray:
+        """Decode a whole column (used for one-off index builds, not per query)."""
+        if col in self._categoricals:
+            codes, cats = self._categoricals[col]
+            return cats[np.asarray(codes)]
+        if col in self._numerics:
+            return np.asarray(self._numerics[col])
+        offsets, data = self._strings[col]
+        blob = data.tobytes()
+        return np.array(
+            [blob[offsets[i] : offsets[i + 1]].decode("utf-8") for i in range(self.n_rows)],
+            dtype=object,
+        )
+
+    def take(self, rows) -> pd.DataFrame:
+        """Materialize the given row ids as a DataFrame indexed by row id."""
+        rows = np.asarray(rows, dtype=np.int64)
+        out = {}
+
+        for col in self.columns:
+            if col in self._categoricals:
+                codes, cats = self._categoricals[col]
+                out[col] = cats[codes[rows]]
+            elif col in self._numerics:
+                out[col] = np.asarray(self._numerics[col][rows])
+            else:
+                offsets, data = self._strings[col]
+                out[col] = np.array(
+                    [bytes(data[offsets[i] : offsets[i + 1]]).decode("utf-8") for i in rows],
+                    dtype=object,
+                )
+
+        return pd.DataFrame(out, index=pd.Index(rows), columns=self.columns)
+
+
+def load_store(csv_path: str = DATA_PATH, store_path: str = STORE_PATH) -> RestaurantStore:
+    """Open the memory-mapped store when it has been built, else parse the CSV."""
+    if os.path.exists(os.path.join(store_path, "meta.json")):
+        return RestaurantStore.open(store_path)
+    return RestaurantStore.from_csv(csv_path)
+
+
+def convert_csv(csv_path: str = DATA_PATH, store_path: str = STORE_PATH) -> RestaurantStore:
+    """
+    Build the store next to the old one and swap directories, so processes
+    that still map the old files keep reading valid (now unlinked) pages.
+    """
+    store = RestaurantStore.from_csv(csv_path)
+
+    tmp_path = f"{store_path}.tmp-{os.getpid()}"
+    store.save(tmp_path)
+    BM25Index.build(store_documents(store)).save(tmp_path)
+    if os.path.exists(store_path):
+        old_path = f"{store_path}.old-{os.getpid()}"
+        os.rename(store_path, old_path)
+        os.rename(tmp_path, store_path)
+        shutil.rmtree(old_path)
+    else:
+        os.rename(tmp_path, store_path)
+    return store
+
+
+# =============================
+#  Startup benchmark
+# =============================
+
+_BENCH_SNIPPET = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from restaurant_store import RestaurantStore
+t1 = time.perf_counter()
+backend, path = sys.argv[1], sys.argv[2]
+store = RestaurantStore.from_csv(path) if backend == "csv" else RestaurantStore.open(path)
+# touch what ollama_model touches at startup
+store.codes("CUISINE_DESCRIPTION").sum(); store.codes("ZIPCODE").sum()
+t2 = time.perf_counter()
+mem = {}
+with open("/proc/self/status") as f:
+    for line in f:
+        key, _, value = line.partition(":")
+        if key in ("VmRSS", "RssAnon", "RssFile"):
+            mem[key] = int(value.split()[0])
+print(json.dumps({"import_s": t1 - t0, "load_s": t2 - t1, "total_s": t2 - t0, **mem}))
+"""
+
+
+def bench_startup(csv_path: str = DATA_PATH, store_path: str = STORE_PATH, runs: int = 3):
+    """
+    Start fresh interpreters loading each backend and report wall time and
+    memory. RssAnon is private to the process; RssFile is page cache that
+    other processes mapping the same store share.
+    """
+    if not os.path.exists(os.path.join(store_path, "meta.json")):
+        convert_csv(csv_path, store_path)
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    for backend, path in (("csv", csv_path), ("store", store_path)):
+        results = []
+        for _ in range(runs):
+            proc = subprocess.run(
+                [sys.executable, "-c", _BENCH_SNIPPET, backend, os.path.abspath(path)],
+                cwd=here,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            results.append(json.loads(proc.stdout))
+
+        best = min(results, key=lambda r: r["total_s"])
+        print(f"{backend:>5}: load {best['load_s'] * 1000:8.1f} ms | "
+              f"startup {best['total_s'] * 1000:8.1f} ms | "
+              f"RSS {best.get('VmRSS', 0) / 1024:7.1f} MiB "
+              f"(private {best.get('RssAnon', 0) / 1024:.1f} MiB, "
+              f"shared file {best.get('RssFile', 0) / 1024:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+        bench_startup()
+    else:
+        src = sys.argv[1] if len(sys.argv) > 1 else DATA_PATH
+        dst = sys.argv[2] if len(sys.argv) > 2 else STORE_PATH
+        store = convert_csv(src, dst)
+        print(f"Wrote {len(store)} rows to {dst}")
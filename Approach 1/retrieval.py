@@ -0,0 +1,136 @@
+"""
+Offline BM25 retrieval over restaurant name, cuisine and street.
+
+The index is a term -> postings layout held in plain NumPy arrays (the CSC
+form of the term/document matrix): postings of term t are
+doc_ids[indptr[t]:indptr[t + 1]] with their precomputed BM25 weights.
+Scoring a query touches only the postings of its terms, so a query against
+the whole dataset costs a few milliseconds and needs no network or model.
+
+`python restaurant_store.py` saves the arrays inside the store directory
+(bm25.*.npy + bm25.json); BM25Index.open() memory-maps them like the store
+columns, so loading the index costs no tokenizing at all.
+"""
+
+import json
+import os
+import re
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# the text indexed for each row
+INDEX_COLUMNS = ("RESTAURANT", "CUISINE_DESCRIPTION", "STREET")
+INDEX_META = "bm25.json"
+INDEX_ARRAYS = ("indptr", "doc_ids", "weights", "tiebreak")
+
+
+def tokenize(text: str) -> list:
+    return TOKEN_RE.findall(str(text).lower())
+
+
+def store_documents(store):
+    """One document per row id of a RestaurantStore: name + cuisine + street."""
+    return (" ".join(parts) for parts in zip(*(store.column(col) for col in INDEX_COLUMNS)))
+
+
+def _load_array(path: str, mmap: bool) -> np.ndarray:
+    try:
+        return np.load(path, mmap_mode="r" if mmap else None)
+    except ValueError:
+        # zero-length arrays cannot be mapped
+        return np.load(path)
+
+
+class BM25Index:
+    def __init__(self, vocab: dict, indptr, doc_ids, weights, tiebreak):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.tiebreak = tiebreak
+        self.n_docs = len(tiebreak)
+
+    # ---------- construction ----------
+
+    @classmethod
+    def build(cls, docs, k1: float = 1.2, b: float = 0.75, seed: int = 42) -> "BM25Index":
+        """
+        docs: iterable of document strings, one per row id (0..n-1).
+        Ties in top_k are broken by a fixed random permutation (seed), so
+        equally scored rows come out in a stable but unbiased order.
+        """
+        vocab = {}
+        term_ids, doc_ids, doc_len = [], [], []
+
+        for doc_id, text in enumerate(docs):
+            tokens = tokenize(text)
+            doc_len.append(len(tokens))
+            for tok in tokens:
+                term_ids.append(vocab.setdefault(tok, len(vocab)))
+                doc_ids.append(doc_id)
+
+        n_docs = len(doc_len)
+        n_terms = len(vocab)
+        doc_len = np.asarray(doc_len, dtype=np.float64)
+
+        # term frequencies: count each (term, doc) pair once, sorted by term
+        pairs = np.asarray(term_ids, dtype=np.int64) * max(n_docs, 1) + np.asarray(doc_ids, dtype=np.int64)
+        pairs, tf = np.unique(pairs, return_counts=True)
+        post_terms = pairs // max(n_docs, 1)
+        post_docs = pairs % max(n_docs, 1)
+
+        indptr = np.searchsorted(post_terms, np.arange(n_terms + 1))
+
+        df = np.diff(indptr).astype(np.float64)
+        idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+        avgdl = doc_len.mean() if n_docs else 0.0
+        norm = k1 * (1.0 - b + b * doc_len[post_docs] / max(avgdl, 1e-9))
+        weights = idf[post_terms] * tf * (k1 + 1.0) / (tf + norm)
+
+        tiebreak = np.random.RandomState(seed).permutation(n_docs)
+        return cls(vocab, indptr, post_docs.astype(np.int64), weights, tiebreak)
+
+    @classmethod
+    def open(cls, path: str, mmap: bool = True) -> "BM25Index":
+        """Index saved by save() into directory `path` (normally the store)."""
+        with open(os.path.join(path, INDEX_META), encoding="utf-8") as f:
+            terms = json.load(f)["terms"]
+        arrays = [_load_array(os.path.join(path, f"bm25.{name}.npy"), mmap) for name in INDEX_ARRAYS]
+        return cls({term: t for t, term in enumerate(terms)}, *arrays)
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for name in INDEX_ARRAYS:
+            np.save(os.path.join(path, f"bm25.{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        terms = sorted(self.vocab, key=self.vocab.get)
+        with open(os.path.join(path, INDEX_META), "w", encoding="utf-8") as f:
+            json.dump({"n_docs": self.n_docs, "terms": terms}, f)
+
+    # ---------- queries ----------
+
+    def score(self, query: str) -> np.ndarray:
+        """BM25 score of every document for the query."""
+        scores = np.zeros(self.n_docs, dtype=np.float64)
+        for tok in set(tokenize(query)):
+            t = self.vocab.get(tok)
+            if t is None:
+                continue
+            lo, hi = self.indptr[t], self.indptr[t + 1]
+            # doc ids are unique within one term's postings
+            scores[self.doc_ids[lo:hi]] += self.weights[lo:hi]
+        return scores
+
+    def top_k(self, query: str, k: int, rows=None) -> np.ndarray:
+        """
+        Row ids of the k best-scoring documents, best first.
+        If rows is given, only those row ids are considered.
+        """
+        scores = self.score(query)
+        if rows is None:
+            rows = np.arange(self.n_docs, dtype=np.int64)
+        rows = np.asarray(rows, dtype=np.int64)
+
+        order = np.lexsort((self.tiebreak[rows], -scores[rows]))
+        return rows[order[:k]]
@@ -0,0 +1,12 @@
+"""
+Shared setup: ollama_model.py loads the dataset relative to the working
+directory (DATA_PATH, STORE_PATH), so the tests run from Approach 1/.
+"""
+
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+sys.path.insert(0, APP_DIR)
+os.chdir(APP_DIR)
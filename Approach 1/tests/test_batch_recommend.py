@@ -0,0 +1,48 @@
+"""
+batch_recommend.py without Ollama: rejected queries and a query that fails
+in the process pool are written as records, and a re-run resumes.
+
+    python -m pytest tests
+"""
+
+import json
+
+import batch_recommend
+
+
+def test_failed_query_is_recorded_and_the_run_resumes(tmp_path):
+    queries = tmp_path / "queries.jsonl"
+    queries.write_text("\n".join(json.dumps(q) for q in [
+        {"id": "a", "query": "how do I renew my passport"},
+        {"id": "bad", "query": None},
+        {"id": "c", "query": "what time is it"},
+    ]) + "\n")
+    results = tmp_path / "results.jsonl"
+
+    summary = batch_recommend.run_batch(str(queries), str(results), workers=1, concurrency=1)
+    assert (summary["total"], summary["rejected"], summary["failed"], summary["errors"]) == (3, 2, 1, 1)
+
+    records = {r["id"]: r for r in map(json.loads, results.read_text().splitlines())}
+    assert records["a"]["route"] == records["c"]["route"] == "rejected"
+    assert records["bad"]["route"] == "failed"
+    assert "AttributeError" in records["bad"]["error"]
+
+    summary = batch_recommend.run_batch(str(queries), str(results), workers=1, concurrency=1)
+    assert (summary["skipped"], summary["total"]) == (3, 0)
+
+
+def test_skipped_counts_only_input_queries(tmp_path):
+    queries = tmp_path / "queries.jsonl"
+    queries.write_text(json.dumps({"id": "a", "query": "how do I renew my passport"}) + "\n")
+    results = tmp_path / "results.jsonl"
+    # ids from an older or different input file are not skipped queries
+    results.write_text('{"id": "old-1"}\n{"id": "old-2"}\n')
+
+    summary = batch_recommend.run_batch(str(queries), str(results), workers=1, concurrency=1)
+    assert (summary["skipped"], summary["total"]) == (0, 1)
+
+
+def test_finished_ids_ignores_a_torn_last_line(tmp_path):
+    results = tmp_path / "results.jsonl"
+    results.write_text('{"id": "1"}\n{"id": "2"}\n{"id": "3", "que')
+    assert batch_recommend.finished_ids(str(results)) == {"1", "2"}
@@ -0,0 +1,47 @@
+"""
+ollama_model.py candidate indexes: cuisine -> row ids, built once at load
+time, give the same rows as filtering the DataFrame.
+
+    python -m pytest tests
+"""
+
+import numpy as np
+
+import ollama_model
+
+
+def test_group_rows_lists_every_row_under_its_category():
+    codes = np.array([2, 0, 2, 1, 0, 2])
+    groups = ollama_model.group_rows(codes, np.array(["a", "b", "c"], dtype=object))
+    assert {k: v.tolist() for k, v in groups.items()} == {"a": [1, 4], "b": [3], "c": [0, 2, 5]}
+
+
+def test_union_rows():
+    assert ollama_model.union_rows([np.array([1, 5]), np.array([], dtype=np.int64), np.array([2, 5])]).tolist() == [1, 2, 5]
+    assert len(ollama_model.union_rows([])) == 0
+
+
+def test_cuisine_rows_match_the_dataset():
+    cuisines = ollama_model.store.column("CUISINE_DESCRIPTION")
+    assert sum(len(rows) for rows in ollama_model.CUISINE_ROWS.values()) == len(ollama_model.store)
+    chinese = ollama_model.CUISINE_ROWS["Chinese"]
+    assert np.array_equal(chinese, np.nonzero(cuisines == "Chinese")[0])
+
+
+def test_cuisine_query_keeps_only_that_cuisine():
+    candidates = ollama_model.filter_candidates("any good thai food?", max_candidates=40)
+    assert len(candidates) == 40
+    assert set(candidates["CUISINE_DESCRIPTION"]) == {"Thai"}
+
+
+def test_sparse_neighborhood_widens_until_enough_candidates():
+    query = "mexican restaurant in harlem"
+    parsed = ollama_model.parse_query(query)
+    _, lat, lng = parsed.location
+    mexican = ollama_model.CUISINE_ROWS["Mexican"]
+    in_radius = np.intersect1d(mexican, ollama_model.GEO_INDEX.query_radius(lat, lng, parsed.radius_miles))
+    assert 0 < len(in_radius) < ollama_model.FAST_PATH_TOP_N
+
+    candidates = ollama_model.filter_candidates(query)
+    assert len(candidates) >= ollama_model.FAST_PATH_TOP_N
+    assert set(candidates["CUISINE_DESCRIPTION"]) == {"Mexican"}
@@ -0,0 +1,87 @@
+"""
+Deterministic fast path: only queries whose top picks stand out from the
+rest (or with no more candidates than picks) skip the LLM, and the route
+bookkeeping stays bounded.
+
+    python -m pytest tests
+"""
+
+import numpy as np
+
+import ollama_model
+from ollama_model import FAST_PATH_TOP_N, fast_path_recommendations, filter_candidates, rank_candidates
+
+QUERY = "thai food in hells kitchen"
+
+
+def margin(query: str) -> float:
+    scores = rank_candidates(query, filter_candidates(query))["score"].to_numpy()
+    return scores[FAST_PATH_TOP_N - 1] - scores[FAST_PATH_TOP_N]
+
+
+def test_cuisine_and_place_alone_do_not_skip_the_llm():
+    candidates = filter_candidates(QUERY)
+    assert rank_candidates(QUERY, candidates)["score"].iloc[FAST_PATH_TOP_N - 1] > ollama_model.CUISINE_WEIGHT
+    assert margin(QUERY) < ollama_model.FAST_PATH_MIN_MARGIN
+    assert fast_path_recommendations(QUERY, candidates) is None
+
+
+def test_clear_top_picks_take_the_fast_path(monkeypatch):
+    monkeypatch.setattr(ollama_model, "FAST_PATH_MIN_MARGIN", margin(QUERY) / 2)
+    ranked = fast_path_recommendations(QUERY, filter_candidates(QUERY))
+    assert len(ranked) == FAST_PATH_TOP_N
+    assert list(ranked["score"]) == sorted(ranked["score"], reverse=True)
+
+
+def test_query_without_a_place_goes_to_the_llm(monkeypatch):
+    monkeypatch.setattr(ollama_model, "FAST_PATH_MIN_MARGIN", 0.0)
+    assert fast_path_recommendations("thai food please", filter_candidates("thai food please")) is None
+
+
+def test_route_latencies_are_bounded(monkeypatch, capsys):
+    monkeypatch.setattr(ollama_model, "FAST_PATH_MIN_MARGIN", 0.0)
+    fast_before = ollama_model.ROUTE_COUNTS["fast"]
+    for _ in range(3):
+        ollama_model.recommend_restaurants(QUERY)
+    assert "Great, here are the top 5" in capsys.readouterr().out
+
+    report = ollama_model.route_report()
+    assert ollama_model.ROUTE_COUNTS["fast"] == fast_before + 3
+    assert report["queries"] >= 3 and "fast_p50_ms" in report
+    assert ollama_model.ROUTE_LATENCIES["fast"].maxlen == ollama_model.ROUTE_LATENCY_WINDOW
+
+
+def test_few_candidates_leave_nothing_to_choose():
+    query = "mexican restaurant in harlem"
+    candidates = filter_candidates(query).iloc[: FAST_PATH_TOP_N - 2]
+    ranked = fast_path_recommendations(query, candidates)
+    assert len(ranked) == FAST_PATH_TOP_N - 2
+
+
+def test_proximity_uses_the_widened_radius():
+    query = "mexican restaurant in harlem"
+    parsed = ollama_model.parse_query(query)
+    candidates = filter_candidates(query)
+    assert candidates.attrs["radius_miles"] > parsed.radius_miles
+
+    _, lat, lng = parsed.location
+    rows = candidates.index.to_numpy()
+    dist = ollama_model.distance_miles(lat, lng, ollama_model.ROW_LAT[rows], ollama_model.ROW_LNG[rows])
+    beyond = rows[dist > parsed.radius_miles]
+    assert len(beyond)
+
+    # scored against the query's own radius, every row beyond it would get no proximity credit
+    unwidened = candidates.copy()
+    unwidened.attrs = {}
+    widened_scores = rank_candidates(query, candidates)["score"]
+    unwidened_scores = rank_candidates(query, unwidened)["score"]
+    assert np.all(widened_scores[beyond] > unwidened_scores[beyond])
+
+
+def test_dense_area_goes_to_the_llm():
+    query = "chinese near times square"
+    candidates = filter_candidates(query)
+    scores = rank_candidates(query, candidates)["score"].to_numpy()
+    assert len(candidates) > FAST_PATH_TOP_N
+    assert scores[0] - scores[FAST_PATH_TOP_N] < ollama_model.FAST_PATH_MIN_MARGIN
+    assert fast_path_recommendations(query, candidates) is None
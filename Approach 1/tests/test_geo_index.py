@@ -0,0 +1,55 @@
+"""
+geo_index.py radius search, and filter_candidates' location filter when
+the named place has no restaurant within the requested radius.
+
+    python -m pytest tests
+"""
+
+import numpy as np
+import pytest
+
+import ollama_model
+from geo_index import GridIndex, distance_miles, parse_radius_miles
+
+
+@pytest.mark.parametrize("query, miles", [
+    ("within 5 blocks of times square", 0.25),
+    ("2 miles from soho", 2.0),
+    ("within 1.5 km", 1.5 * 0.621371),
+    ("near chinatown", 0.75),
+])
+def test_parse_radius(query, miles):
+    assert parse_radius_miles(query) == pytest.approx(miles)
+
+
+def test_query_radius_matches_brute_force():
+    rng = np.random.RandomState(0)
+    lat = rng.uniform(40.70, 40.88, 5000)
+    lng = rng.uniform(-74.02, -73.91, 5000)
+    lat[::50] = np.nan
+    index = GridIndex(lat, lng)
+
+    for lat0, lng0, miles in ((40.758, -73.9855, 0.25), (40.72, -74.0, 1.0), (40.80, -73.95, 3.0)):
+        expected = np.nonzero(distance_miles(lat0, lng0, lat, lng) <= miles)[0]
+        assert index.query_radius(lat0, lng0, miles).tolist() == expected.tolist()
+    assert len(index.query_radius(41.5, -73.0, 1.0)) == 0
+
+
+def test_small_radius_widens_instead_of_dropping_the_cuisine():
+    # no ZIP centroid lies within 5 blocks of Times Square
+    _, lat, lng = ollama_model.parse_query("times square").location
+    assert not len(ollama_model.GEO_INDEX.query_radius(lat, lng, 0.25))
+
+    candidates = ollama_model.filter_candidates("chinese food within 5 blocks of times square")
+    assert len(candidates)
+    assert set(candidates["CUISINE_DESCRIPTION"]) == {"Chinese"}
+    # the closest rows, not all of Manhattan
+    wider = ollama_model.filter_candidates("Chinese near Times Square")
+    assert set(candidates["ZIPCODE"]) <= set(wider["ZIPCODE"])
+
+
+def test_nothing_nearby_keeps_the_cuisine_rows(monkeypatch):
+    monkeypatch.setattr(ollama_model, "MAX_SEARCH_RADIUS_MILES", 0.1)
+    candidates = ollama_model.filter_candidates("chinese food within 1 block of times square")
+    assert len(candidates) == 40
+    assert set(candidates["CUISINE_DESCRIPTION"]) == {"Chinese"}
@@ -0,0 +1,83 @@
+"""
+ingest_inspections.py on a small raw feed: one row per Manhattan CAMIS,
+chunk boundaries do not change the result, and a re-run only processes
+inspections newer than the watermark.
+
+    python -m pytest tests
+"""
+
+import json
+
+import pandas as pd
+
+from ingest_inspections import STATE_SUFFIX, ingest
+
+RAW_HEADER = ["CAMIS", "DBA", "BORO", "BUILDING", "STREET", "ZIPCODE", "PHONE", "CUISINE DESCRIPTION",
+              "INSPECTION DATE", "CRITICAL FLAG", "Latitude", "Longitude"]
+
+
+def violation(camis, date, flag, name="PLACE", boro="Manhattan"):
+    return [camis, f"{name} {camis}", boro, "1", "BROADWAY", "10004", "2125550000", "American",
+            date, flag, "40.70", "-74.01"]
+
+
+FIRST_FEED = [
+    violation(1, "01/10/2024", "Critical"),
+    violation(1, "03/05/2024", "Not Critical"),
+    violation(1, "03/05/2024", "Critical"),        # same inspection, next chunk
+    violation(2, "02/01/2024", "Not Critical"),
+    violation(3, "02/01/2024", "Critical", boro="Brooklyn"),
+    violation(2, "not a date", "Critical"),
+]
+NEWER_ROWS = [
+    violation(2, "06/01/2024", "Critical", name="RENAMED"),
+    violation(1, "01/01/2024", "Critical"),        # before the watermark: ignored
+]
+
+
+def write_raw(path, rows):
+    pd.DataFrame(rows, columns=RAW_HEADER).to_csv(path, index=False)
+
+
+def read_output(path):
+    return pd.read_csv(path, dtype=str).set_index("CAMIS")
+
+
+def test_full_ingest_reduces_to_one_row_per_restaurant(tmp_path):
+    raw, out = tmp_path / "raw.csv", tmp_path / "restaurants.csv"
+    write_raw(raw, FIRST_FEED)
+
+    stats = ingest(str(raw), str(out), chunk_rows=2)
+    assert stats == {"raw_rows": 6, "manhattan_rows": 5, "new_rows": 4, "restaurants": 2, "watermark": "2024-03-05"}
+
+    df = read_output(out)
+    assert df.loc["1", ["CRITICALFLAG", "INSPECTION_DATE", "CRITICAL_VIOLATIONS", "LAST_CRITICAL_DATE"]].tolist() == \
+        ["Critical", "2024-03-05", "2", "2024-03-05"]
+    assert df.loc["2", "CRITICALFLAG"] == "Not Critical"
+    assert pd.isna(df.loc["2", "LAST_CRITICAL_DATE"])
+
+    # chunking does not change the result
+    whole = tmp_path / "whole.csv"
+    ingest(str(raw), str(whole), chunk_rows=100)
+    assert whole.read_text() == out.read_text()
+
+
+def test_rerun_only_processes_rows_after_the_watermark(tmp_path):
+    raw, out = tmp_path / "raw.csv", tmp_path / "restaurants.csv"
+    write_raw(raw, FIRST_FEED)
+    ingest(str(raw), str(out))
+
+    write_raw(raw, FIRST_FEED + NEWER_ROWS)
+    stats = ingest(str(raw), str(out))
+    assert stats["new_rows"] == 1
+    assert stats["watermark"] == "2024-06-01"
+    assert json.loads((tmp_path / ("restaurants.csv" + STATE_SUFFIX)).read_text())["watermark"] == "2024-06-01"
+
+    df = read_output(out)
+    assert df.loc["2", ["RESTAURANT", "CRITICALFLAG", "CRITICAL_VIOLATIONS"]].tolist() == ["RENAMED 2", "Critical", "1"]
+    # untouched by the re-run, including the ignored older row
+    assert df.loc["1", ["CRITICALFLAG", "CRITICAL_VIOLATIONS"]].tolist() == ["Critical", "2"]
+
+    # --full rebuilds and does count the older row
+    ingest(str(raw), str(out), full=True)
+    assert read_output(out).loc["1", "CRITICAL_VIOLATIONS"] == "3"
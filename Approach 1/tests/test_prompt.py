@@ -0,0 +1,40 @@
+"""
+Token-budgeted prompt builder: the static prefix comes first and
+candidates are packed in order until the budget is used.
+
+    python -m pytest tests
+"""
+
+import ollama_model
+from ollama_model import PROMPT_PREFIX, build_prompt_with_stats, estimate_tokens
+
+
+def candidates(n=40):
+    return ollama_model.filter_candidates("italian food in soho", max_candidates=n).reset_index(drop=True)
+
+
+def test_prompt_fits_the_budget_and_keeps_candidate_order():
+    rows = candidates()
+    prompt, stats = build_prompt_with_stats("italian food in soho", rows, token_budget=600)
+
+    assert prompt.startswith(PROMPT_PREFIX)
+    assert stats["prompt_tokens"] <= 600
+    assert stats["candidates_used"] + stats["candidates_dropped"] == len(rows)
+    assert 0 < stats["candidates_used"] < len(rows)
+    assert estimate_tokens(prompt) <= stats["prompt_tokens"] + stats["candidates_used"]
+
+    lines = prompt.splitlines()[-stats["candidates_used"]:]
+    for i, line in enumerate(lines):
+        assert line.startswith(f"- ID {i}: {rows['RESTAURANT'].iloc[i]} | Cuisine: ")
+
+
+def test_at_least_one_candidate_is_always_included():
+    _, stats = build_prompt_with_stats("italian food in soho", candidates(5), token_budget=1)
+    assert stats["candidates_used"] == 1
+
+
+def test_everything_fits_in_the_default_budget_for_a_small_list():
+    rows = candidates(5)
+    prompt, stats = build_prompt_with_stats("italian food in soho", rows)
+    assert stats["candidates_dropped"] == 0
+    assert prompt == ollama_model.build_prompt("italian food in soho", rows)
@@ -0,0 +1,54 @@
+"""
+query_parser.py PatternMatcher (Aho-Corasick) and the single-pass
+parse_query built on it.
+
+    python -m pytest tests
+"""
+
+import pytest
+
+import ollama_model
+from query_parser import PatternMatcher, on_word_boundaries
+
+
+def test_matcher_reports_overlapping_matches_in_end_order():
+    matcher = PatternMatcher()
+    for word in ("he", "she", "his", "hers"):
+        matcher.add(word, word)
+    assert matcher.find("ushers") == [(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")]
+
+
+def test_matcher_agrees_with_naive_search():
+    patterns = ["dim sum", "sum", "midtown", "midtown east", "east", "a", "aa"]
+    text = "dim sum in midtown east, aaa"
+    matcher = PatternMatcher()
+    for p in patterns:
+        matcher.add(p, p)
+    expected = sorted(
+        (i, i + len(p), p) for p in patterns for i in range(len(text)) if text.startswith(p, i)
+    )
+    assert sorted(matcher.find(text)) == expected
+
+
+def test_adding_after_build_rebuilds():
+    matcher = PatternMatcher()
+    matcher.add("thai", 1)
+    assert matcher.find("thai") == [(0, 4, 1)]
+    matcher.add("ai", 2)
+    assert matcher.find("thai") == [(0, 4, 1), (2, 4, 2)]
+
+
+def test_word_boundaries():
+    assert on_word_boundaries("near les", 5, 8)
+    assert not on_word_boundaries("5 miles", 4, 7)
+
+
+def test_parse_query_in_one_pass():
+    parsed = ollama_model.parse_query("Sushi or dim sum in Midtown East within 3 blocks?")
+    assert parsed.cuisines == {"Japanese", "Chinese"}
+    assert "sushi" in parsed.intent_words
+    assert parsed.location[0] == ollama_model.NEIGHBORHOODS["midtown east"][0]
+    assert parsed.radius_miles == pytest.approx(0.15)
+    # "les" (Lower East Side) inside "miles" is not a place
+    assert ollama_model.parse_query("pizza within 2 miles").location is None
+    assert not ollama_model.looks_like_restaurant_query("how do I renew my passport")
@@ -0,0 +1,44 @@
+"""
+restaurant_store.py: a converted, memory-mapped store holds the same data
+as the cleaned CSV.
+
+    python -m pytest tests
+"""
+
+import numpy as np
+import pandas as pd
+
+from restaurant_store import DATA_PATH, RestaurantStore, convert_csv, load_store, read_clean_csv
+
+
+def test_store_round_trip_matches_the_csv(tmp_path):
+    df = read_clean_csv(DATA_PATH)
+    store_path = str(tmp_path / "restaurants.store")
+    convert_csv(DATA_PATH, store_path)
+
+    store = RestaurantStore.open(store_path)
+    assert len(store) == len(df)
+    assert isinstance(store.codes("ZIPCODE"), np.memmap)
+
+    rows = [0, 17, len(df) - 1]
+    pd.testing.assert_frame_equal(
+        store.take(rows).astype(str),
+        df.iloc[rows].set_axis(pd.Index(rows)).astype(str),
+    )
+    assert list(store.column("RESTAURANT")) == [str(v) for v in df["RESTAURANT"]]
+
+
+def test_convert_replaces_an_existing_store(tmp_path):
+    csv_path = tmp_path / "small.csv"
+    read_clean_csv(DATA_PATH).head(3).to_csv(csv_path, index=False)
+    store_path = str(tmp_path / "restaurants.store")
+
+    convert_csv(DATA_PATH, store_path)
+    convert_csv(str(csv_path), store_path)
+    assert len(load_store(str(csv_path), store_path)) == 3
+    assert [p.name for p in tmp_path.iterdir() if ".store" in p.name] == ["restaurants.store"]
+
+
+def test_load_store_falls_back_to_the_csv(tmp_path):
+    store = load_store(DATA_PATH, str(tmp_path / "missing.store"))
+    assert len(store) == len(read_clean_csv(DATA_PATH))
@@ -0,0 +1,50 @@
+"""
+retrieval.py: BM25 top_k over a small corpus, and an index saved with the
+store gives the same scores when memory-mapped back.
+
+    python -m pytest tests
+"""
+
+import numpy as np
+
+from restaurant_store import DATA_PATH, RestaurantStore, convert_csv
+from retrieval import BM25Index, store_documents
+
+DOCS = [
+    "JOE'S PIZZA Pizza CARMINE STREET",
+    "NOM WAH TEA PARLOR Chinese DOYERS STREET",
+    "JOE'S SHANGHAI Chinese PELL STREET",
+    "PIZZA SUPREME Pizza 8 AVENUE",
+    "KATZ'S DELICATESSEN Jewish/Kosher EAST HOUSTON STREET",
+]
+
+
+def test_top_k_ranks_by_bm25():
+    index = BM25Index.build(DOCS)
+    assert index.top_k("chinese", 2).tolist() in ([1, 2], [2, 1])
+    assert index.top_k("joe's shanghai", 1).tolist() == [2]
+    # rarer terms weigh more: "doyers" beats the very common "street"
+    assert index.top_k("doyers street", 1).tolist() == [1]
+
+
+def test_top_k_within_rows_and_stable_ties():
+    index = BM25Index.build(DOCS)
+    assert index.top_k("pizza", 5, rows=[0, 1, 2]).tolist()[0] == 0
+    assert set(index.top_k("pizza", 5, rows=[1, 2, 4]).tolist()) == {1, 2, 4}
+    # unmatched rows tie at 0 and come out in the same order every time
+    assert index.top_k("sushi", 5).tolist() == BM25Index.build(DOCS).top_k("sushi", 5).tolist()
+
+
+def test_index_is_saved_with_the_store_and_memory_mapped(tmp_path):
+    store_path = str(tmp_path / "restaurants.store")
+    convert_csv(DATA_PATH, store_path)
+    store = RestaurantStore.open(store_path)
+
+    mapped = BM25Index.open(store.path)
+    assert isinstance(mapped.weights, np.memmap)
+    assert mapped.n_docs == len(store)
+
+    built = BM25Index.build(store_documents(store))
+    for query in ("dim sum near chinatown", "pizza broadway", "zzz"):
+        assert np.allclose(mapped.score(query), built.score(query))
+        assert mapped.top_k(query, 20).tolist() == built.top_k(query, 20).tolist()
@@ -0,0 +1,64 @@
+"""
+Streamed recommendations: IncrementalJSONArrayParser returns each object as
+soon as it closes, and stream_recommendations never prints a restaurant
+twice when it has to fall back to a second, non-streamed answer.
+
+    python -m pytest tests
+"""
+
+import json
+
+import pytest
+
+import ollama_model
+from ollama_model import IncrementalJSONArrayParser
+
+ANSWER = '```json\n[\n  {"id": 0, "name": "A {curly} \\"quoted\\" name"},\n  {"id": 1, "name": "B", "tags": ["x]"]}\n]\n```'
+
+
+def test_parser_returns_objects_as_they_close():
+    parser = IncrementalJSONArrayParser()
+    items = []
+    for i in range(0, len(ANSWER), 7):
+        items.extend(parser.feed(ANSWER[i:i + 7]))
+    assert items == json.loads(ANSWER.split("\n", 1)[1].rsplit("```", 1)[0])
+    assert parser.done and not parser.failed
+    assert parser.text == ANSWER
+
+
+def test_parser_flags_an_object_that_does_not_decode():
+    parser = IncrementalJSONArrayParser()
+    assert parser.feed('[{"id": 0}, {"id": 1,}, {"id": 2}]') == [{"id": 0}]
+    assert parser.failed and parser.done
+
+
+@pytest.fixture
+def candidates():
+    return ollama_model.filter_candidates("chinese food near chinatown", max_candidates=10).reset_index(drop=True)
+
+
+def printed_names(out: str) -> list:
+    return [line[:-1] for line in out.splitlines()[1:] if line and not line.startswith(" ") and line.endswith(":")]
+
+
+def test_dropped_stream_is_completed_without_repeats(candidates, monkeypatch, capsys):
+    def broken_stream(prompt):
+        yield '[{"id": 3, "name": "three"}, {"id": 1, "name": "one"}, {"id": 7'
+        raise ValueError("Ollama stream error: connection reset")
+
+    # the second generation picks differently and repeats one of the printed restaurants
+    second = [{"id": i, "name": f"r{i}"} for i in (1, 4, 3, 5, 6, 8)]
+    monkeypatch.setattr(ollama_model, "stream_ollama_chat", broken_stream)
+    monkeypatch.setattr(ollama_model, "call_ollama_chat", lambda prompt: json.dumps(second))
+
+    ollama_model.stream_recommendations("prompt", candidates)
+    assert printed_names(capsys.readouterr().out) == ["three", "one", "r4", "r5", "r6"]
+
+
+def test_unparseable_answer_says_so(candidates, monkeypatch, capsys):
+    def chatty_stream(prompt):
+        yield "Sorry, no idea."
+
+    monkeypatch.setattr(ollama_model, "stream_ollama_chat", chatty_stream)
+    ollama_model.stream_recommendations("prompt", candidates)
+    assert "couldn't parse" in capsys.readouterr().out
@@ -1,24 +1,282 @@
+import json
+import logging
+import math
 import os
+import threading
+import time
+from collections import deque
 import requests
-from urllib.parse import quote_plus
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from urllib.parse import quote, quote_plus, urlencode
 
-from flask import Flask, render_template, request
+from flask import Flask, Response, jsonify, render_template, request, stream_with_context
 from dotenv import load_dotenv
+import openai
 from openai import OpenAI
 
+from cache import MISSING, TieredCache, normalize_address
+from singleflight import SingleFlight
+from resilience import CircuitBreaker, CircuitOpenError, Deadline, DeadlineExceeded, Hedger, stage_timeout
+from ratelimit import RateLimited, RateLimiter, key_fingerprint, parse_duration
+from safety_index import refresh_safety_index, safety_index
+from metrics import (
+    DISH_CARDS,
+    LAZY_DISH_LOADS,
+    LLM_EMPTY,
+    LLM_RETRIES,
+    LLM_TOKENS,
+    LOG_LEVEL,
+    SAFETY_MATCHES,
+    SEARCH_SECONDS,
+    STAGE_SECONDS,
+    UPSTREAM_ERRORS,
+    debug_log,
+    debug_sampled,
+    log,
+    metrics_payload,
+    register_stats_source,
+    stage_timer,
+)
+
 # ==========================
 # Load environment variables
 # ==========================
 load_dotenv()
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+# httpx (under the OpenAI client) logs every request at INFO
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+# ==========================
+# Upstream time budgets (see resilience.py)
+# ==========================
+# A search gets SEARCH_BUDGET_SECONDS in total. Each upstream call (geocode,
+# places, details, dishes) is capped at its own timeout and at what is left
+# of that budget, queueing for a rate-limit token included; enrichment gets
+# at most the rest.
+SEARCH_BUDGET_SECONDS = float(os.getenv("SEARCH_BUDGET_SECONDS", "25"))
+GEOCODE_TIMEOUT_SECONDS = float(os.getenv("GEOCODE_TIMEOUT_SECONDS", "4"))
+PLACES_TIMEOUT_SECONDS = float(os.getenv("PLACES_TIMEOUT_SECONDS", "5"))
+DETAILS_TIMEOUT_SECONDS = float(os.getenv("DETAILS_TIMEOUT_SECONDS", "3"))
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "20"))
+
+# After BREAKER_FAILURE_THRESHOLD consecutive failures an upstream is skipped
+# for BREAKER_RESET_SECONDS (cached or degraded output instead of waiting)
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+geocode_breaker = CircuitBreaker("geocode", BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+places_breaker = CircuitBreaker("places", BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+details_breaker = CircuitBreaker("place_details", BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+openai_breaker = CircuitBreaker("openai", BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+
+# Places search / details calls slower than their recent p95 get a second,
+# identical call; the first answer wins
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.95"))
+places_hedger = Hedger("places", quantile=HEDGE_QUANTILE, default_after=2.0)
+details_hedger = Hedger("place_details", quantile=HEDGE_QUANTILE, default_after=1.0)
+hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge")
+
+# Upstream quotas in requests per second per API key, shared by every worker
+# process through the cache file and adapted to 429s and rate-limit headers
+# (see ratelimit.py). High-priority calls queue for a token (Google calls for
+# up to their stage timeout, OpenAI for OPENAI_QUEUE_MAX_WAIT_SECONDS); the
+# dish retry and batch re-ask are low priority and are shed instead.
+GEOCODE_RATE_LIMIT = float(os.getenv("GEOCODE_RATE_LIMIT", "50"))
+PLACES_RATE_LIMIT = float(os.getenv("PLACES_RATE_LIMIT", "10"))
+DETAILS_RATE_LIMIT = float(os.getenv("DETAILS_RATE_LIMIT", "10"))
+OPENAI_RATE_LIMIT = float(os.getenv("OPENAI_RATE_LIMIT", "8"))
+OPENAI_QUEUE_MAX_WAIT_SECONDS = float(os.getenv("OPENAI_QUEUE_MAX_WAIT_SECONDS", "10"))
+
+geocode_limiter = RateLimiter(f"geocode:{key_fingerprint(GOOGLE_API_KEY)}", GEOCODE_RATE_LIMIT)
+places_limiter = RateLimiter(f"places:{key_fingerprint(GOOGLE_API_KEY)}", PLACES_RATE_LIMIT)
+details_limiter = RateLimiter(f"place_details:{key_fingerprint(GOOGLE_API_KEY)}", DETAILS_RATE_LIMIT)
+openai_limiter = RateLimiter(f"openai:{key_fingerprint(OPENAI_API_KEY)}", OPENAI_RATE_LIMIT)
+
+# no SDK retries: backoff is openai_limiter's job (a 429 throttles the shared
+# bucket), and the only re-asks are the low-priority dish retries
+client = OpenAI(api_key=OPENAI_API_KEY, timeout=OPENAI_TIMEOUT_SECONDS, max_retries=0)
 
 app = Flask(__name__)
 
 MILES_TO_METERS = 1609.34
+# search radius choices (miles) offered by the form; warmup.py warms each one
+RADIUS_OPTIONS = (1, 3, 5, 10)
+DEFAULT_RADIUS_MILES = 3
+
+# Upstream endpoints (overridable to point at local stubs, see bench/stub_upstreams.py;
+# the OpenAI client reads OPENAI_BASE_URL itself)
+GEOCODE_URL = os.getenv("GOOGLE_GEOCODE_URL", "https://maps.googleapis.com/maps/api/geocode/json")
+PLACES_BASE_URL = os.getenv("GOOGLE_PLACES_BASE_URL", "https://places.googleapis.com/v1")
+
+# Per-restaurant enrichment (details + dish LLM) runs concurrently on a shared,
+# bounded pool; a search waits at most ENRICH_DEADLINE_SECONDS for it
+ENRICH_MAX_WORKERS = int(os.getenv("ENRICH_MAX_WORKERS", "16"))
+ENRICH_DEADLINE_SECONDS = float(os.getenv("ENRICH_DEADLINE_SECONDS", "25"))
+
+enrich_executor = ThreadPoolExecutor(
+    max_workers=ENRICH_MAX_WORKERS, thread_name_prefix="enrich"
+)
+
+# Dish generation: "batched" = one structured-JSON completion for all
+# restaurants of a search (re-asking only for missing ids);
+# "per_restaurant" = one completion (+ simplified retry) per restaurant.
+DISH_MODE = os.getenv("DISH_MODE", "batched")
+
+# Dish loading: "eager" = every search generates dishes for all its cards;
+# "lazy" = cards come back at once and /dishes/<place_id> generates one
+# card's dishes when it is expanded (DISH_LAZY_TRIGGER=visible: when it is
+# scrolled into view). The DISH_PREFETCH_TOP best-rated cards of a lazy page
+# are requested right after it loads.
+DISH_LOADING = os.getenv("DISH_LOADING", "eager")
+DISH_LAZY_TRIGGER = os.getenv("DISH_LAZY_TRIGGER", "expand")
+DISH_PREFETCH_TOP = int(os.getenv("DISH_PREFETCH_TOP", "1"))
+LAZY_DISH_TRIGGERS = ("expand", "visible", "prefetch")
+
+DISH_BATCH_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "dish_recommendations",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "restaurants": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "string"},
+                            "dishes": {
+                                "type": "array",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "name": {"type": "string"},
+                                        "description": {"type": "string"},
+                                    },
+                                    "required": ["name", "description"],
+                                    "additionalProperties": False,
+                                },
+                            },
+                        },
+                        "required": ["id", "dishes"],
+                        "additionalProperties": False,
+                    },
+                }
+            },
+            "required": ["restaurants"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+DISH_LLM_STATS = {
+    mode: {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "llm_seconds": 0.0}
+    for mode in ("per_restaurant", "batched")
+}
+dish_llm_lock = threading.Lock()
+
+# (seconds to first card, seconds to complete page) of recent searches per route;
+# for the blocking /search both are the same
+SEARCH_TIMINGS = {"search": deque(maxlen=1000), "stream": deque(maxlen=1000), "lazy": deque(maxlen=1000)}
+
+# Geocode cache: in-process LRU + SQLite file (CACHE_DB_PATH), shared across restarts.
+# Addresses Google definitively could not resolve are cached for a shorter time.
+GEOCODE_CACHE_TTL_SECONDS = float(os.getenv("GEOCODE_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+GEOCODE_NEGATIVE_TTL_SECONDS = float(os.getenv("GEOCODE_NEGATIVE_TTL_SECONDS", "3600"))
+GEOCODE_NEGATIVE_STATUSES = {"ZERO_RESULTS", "INVALID_REQUEST"}
+
+geocode_cache = TieredCache(
+    "geocode",
+    ttl=GEOCODE_CACHE_TTL_SECONDS,
+    negative_ttl=GEOCODE_NEGATIVE_TTL_SECONDS,
+    maxsize=4096,
+)
+
+# Places text-search cache: all 20 raw places per (grid cell, cuisine, radius
+# bucket). PLACES_CELL_DEG of latitude is ~220 m; pages of RESULTS_PAGE_SIZE
+# ("show more") are sliced from the cached list.
+PLACES_CELL_DEG = float(os.getenv("PLACES_CELL_DEG", "0.002"))
+PLACES_RADIUS_BUCKET_METERS = 500
+PLACES_CACHE_TTL_SECONDS = float(os.getenv("PLACES_CACHE_TTL_SECONDS", str(6 * 3600)))
+# expired lists are kept this much longer, served only while Places is failing
+PLACES_CACHE_STALE_SECONDS = float(os.getenv("PLACES_CACHE_STALE_SECONDS", str(7 * 24 * 3600)))
+RESULTS_PAGE_SIZE = 5
+
+places_cache = TieredCache(
+    "places",
+    ttl=PLACES_CACHE_TTL_SECONDS,
+    stale_ttl=PLACES_CACHE_STALE_SECONDS,
+    maxsize=512,
+    max_entries=20_000,
+)
+
+# Long-lived per-place store: details by place_id, dish text by place_id + cuisine.
+# Entries are served fresh for *_TTL, then served stale while a background
+# refresh (on refresh_executor) replaces them, for up to *_STALE seconds more.
+DETAILS_CACHE_TTL_SECONDS = float(os.getenv("DETAILS_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+DETAILS_CACHE_STALE_SECONDS = float(os.getenv("DETAILS_CACHE_STALE_SECONDS", str(30 * 24 * 3600)))
+DISH_CACHE_TTL_SECONDS = float(os.getenv("DISH_CACHE_TTL_SECONDS", str(14 * 24 * 3600)))
+DISH_CACHE_STALE_SECONDS = float(os.getenv("DISH_CACHE_STALE_SECONDS", str(60 * 24 * 3600)))
+
+details_cache = TieredCache(
+    "place_details",
+    ttl=DETAILS_CACHE_TTL_SECONDS,
+    stale_ttl=DETAILS_CACHE_STALE_SECONDS,
+    maxsize=4096,
+)
+dish_cache = TieredCache(
+    "dishes",
+    ttl=DISH_CACHE_TTL_SECONDS,
+    stale_ttl=DISH_CACHE_STALE_SECONDS,
+    maxsize=4096,
+)
+# what /dishes needs to know about a card a lazy search showed (name,
+# address, rating, city), so it only generates dishes for real search results
+DISH_CARD_TTL_SECONDS = float(os.getenv("DISH_CARD_TTL_SECONDS", str(24 * 3600)))
+DISH_CARD_FIELDS = ("name", "address", "rating", "user_ratings_total", "place_id")
+dish_card_cache = TieredCache("dish_cards", ttl=DISH_CARD_TTL_SECONDS, maxsize=4096)
+refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="refresh")
+# the inspection index loads in the background; searches until then show no flags
+refresh_safety_index()
+
+# Concurrent identical upstream calls (same stage, same inputs) share one request
+geocode_flight = SingleFlight("geocode")
+places_flight = SingleFlight("places")
+details_flight = SingleFlight("place_details")
+dish_flight = SingleFlight("dishes")
+dish_batch_flight = SingleFlight("dish_batches")
+# low-priority callers (warm-up) can be shed by the limiters, so they never
+# lead or join a flight live requests are waiting on
+low_priority_flights = {
+    f.name: SingleFlight(f"{f.name}_low")
+    for f in (geocode_flight, places_flight, details_flight, dish_flight, dish_batch_flight)
+}
+
+
+def flight_for(flight: SingleFlight, priority: str) -> SingleFlight:
+    return flight if priority == "high" else low_priority_flights[flight.name]
+
+
+# Cache, single-flight, breaker and hedge counters are exported on /metrics
+register_stats_source(
+    caches=(geocode_cache, places_cache, details_cache, dish_cache, dish_card_cache),
+    flights=(
+        geocode_flight,
+        places_flight,
+        details_flight,
+        dish_flight,
+        dish_batch_flight,
+        *low_priority_flights.values(),
+    ),
+    breakers=(geocode_breaker, places_breaker, details_breaker, openai_breaker),
+    hedgers=(places_hedger, details_hedger),
+    limiters=(geocode_limiter, places_limiter, details_limiter, openai_limiter),
+)
 
 # Cuisine keyword mapping for Google Places text search
 CUISINE_KEYWORDS = {
@@ -47,21 +305,72 @@ CUISINE_LABELS = {
 # =====================================
 # 1. Geocoding
 # =====================================
-def geocode_address(address: str):
-    url = "https://maps.googleapis.com/maps/api/geocode/json"
-    params = {"address": address, "key": GOOGLE_API_KEY}
+def google_request(
+    breaker: CircuitBreaker,
+    limiter: RateLimiter,
+    method: str,
+    url: str,
+    timeout: float,
+    priority: str = "high",
+    **kwargs,
+):
+    """
+    requests call through limiter and breaker, all within timeout seconds:
+    time spent queueing for a token is taken off the HTTP timeout (a
+    priority="low" call is shed instead of queueing). 5xx and transport
+    errors count as breaker failures; a 429 slows the limiter down instead;
+    other HTTP errors are just raised.
+    """
+    budget = Deadline(timeout)
+    limiter.acquire(priority, max_wait=timeout)
+    http_timeout = budget.timeout(timeout)
+
+    def send():
+        resp = requests.request(method, url, timeout=http_timeout, **kwargs)
+        if resp.status_code >= 500:
+            resp.raise_for_status()
+        return resp
+
+    return settle_google_response(limiter, breaker.call(send))
+
+
+def settle_google_response(limiter: RateLimiter, resp):
+    """Limiter bookkeeping for a Google response (requests or httpx), then raise_for_status."""
+    if resp.status_code == 429:
+        limiter.record_throttle(parse_duration(resp.headers.get("Retry-After")))
+    else:
+        limiter.observe_headers(resp.headers)
+        limiter.record_success()
+    resp.raise_for_status()
+    return resp
+
+
+def record_google_error(breaker: CircuitBreaker, error: Exception):
+    """Log and count a failed Google call (the breaker name is its upstream label)."""
+    log.warning("%s request failed: %r", breaker.name, error)
+    UPSTREAM_ERRORS.labels(upstream=breaker.name).inc()
 
+
+def google_json(stage: str, breaker: CircuitBreaker, limiter: RateLimiter, method: str, url: str, **kwargs):
+    """google_request timed as `stage` -> response JSON, or None when the call failed or was skipped."""
     try:
-        resp = requests.get(url, params=params, timeout=8)
-        resp.raise_for_status()
+        with stage_timer(stage):
+            resp = google_request(breaker, limiter, method, url, **kwargs)
+        return resp.json()
+    except (CircuitOpenError, RateLimited, DeadlineExceeded):
+        return None
     except Exception as e:
-        print("Geocoding request failed:", repr(e))
-        return None, None, None
+        record_google_error(breaker, e)
+        return None
 
-    data = resp.json()
+
+def parse_geocode(data: dict):
+    """Geocoding API JSON -> ((lat, lng, city), definitive), see fetch_geocode."""
     if data.get("status") != "OK":
-        print("Geocoding error:", data)
-        return None, None, None
+        log.warning("Geocoding error: %s", data)
+        if data.get("status") != "ZERO_RESULTS":
+            UPSTREAM_ERRORS.labels(upstream="geocode").inc()
+        return (None, None, None), data.get("status") in GEOCODE_NEGATIVE_STATUSES
 
     result = data["results"][0]
     loc = result["geometry"]["location"]
@@ -73,16 +382,89 @@ def geocode_address(address: str):
             city = comp.get("long_name")
             break
 
+    return (lat, lng, city), True
+
+
+def fetch_geocode(address: str, timeout: float = GEOCODE_TIMEOUT_SECONDS, priority: str = "high"):
+    """
+    One Geocoding API call -> ((lat, lng, city), definitive).
+    definitive is True when Google answered and the address simply did not
+    resolve (worth a negative cache entry), False for transport errors.
+    """
+    data = google_json(
+        "geocode",
+        geocode_breaker,
+        geocode_limiter,
+        "GET",
+        GEOCODE_URL,
+        params=geocode_params(address),
+        timeout=timeout,
+        priority=priority,
+    )
+    if data is None:
+        return (None, None, None), False
+    return parse_geocode(data)
+
+
+def geocode_params(address: str) -> dict:
+    return {"address": address, "key": GOOGLE_API_KEY}
+
+
+def store_geocode(key: str, result: tuple, definitive: bool, seconds: float):
+    """Cache one geocode answer (negatively when Google definitively had none) -> (lat, lng, city)."""
+    geocode_cache.record_upstream(seconds)
+    lat, lng, city = result
+    if lat is not None:
+        geocode_cache.set(key, [lat, lng, city])
+    elif definitive:
+        geocode_cache.set_negative(key)
     return lat, lng, city
 
 
+def geocode_and_store(key: str, address: str, timeout: float = GEOCODE_TIMEOUT_SECONDS, priority: str = "high"):
+    t0 = time.perf_counter()
+    result, definitive = fetch_geocode(address, timeout, priority)
+    return store_geocode(key, result, definitive, time.perf_counter() - t0)
+
+
+def geocode_address(address: str, deadline: Deadline | None = None, priority: str = "high"):
+    key = normalize_address(address)
+    cached = geocode_cache.get(key)
+    if cached is not MISSING:
+        return tuple(cached) if cached else (None, None, None)
+
+    def call():
+        # timed when it runs: a follower that stopped waiting has less budget left
+        return geocode_and_store(key, address, stage_timeout(deadline, GEOCODE_TIMEOUT_SECONDS), priority)
+
+    try:
+        flight = flight_for(geocode_flight, priority)
+        return flight.do(key, call, timeout=stage_timeout(deadline, GEOCODE_TIMEOUT_SECONDS))
+    except DeadlineExceeded:
+        return None, None, None
+
+
 # =====================================
 # 2. Google Places (v1) Text Search
 # =====================================
-def search_restaurants(lat, lng, cuisine_key, radius_meters):
+def places_cache_key(lat, lng, cuisine_key, radius_meters):
+    """
+    (key, cell-center lat, cell-center lng, bucketed radius). Every point in
+    a grid cell searches from the cell center, so they can share one result.
+    """
+    row = math.floor(lat / PLACES_CELL_DEG)
+    col = math.floor(lng / PLACES_CELL_DEG)
+    radius_bucket = math.ceil(radius_meters / PLACES_RADIUS_BUCKET_METERS) * PLACES_RADIUS_BUCKET_METERS
+    center_lat = (row + 0.5) * PLACES_CELL_DEG
+    center_lng = (col + 0.5) * PLACES_CELL_DEG
+    return f"{row}:{col}:{cuisine_key}:{radius_bucket}", center_lat, center_lng, radius_bucket
+
+
+def places_search_request(lat, lng, cuisine_key, radius_meters):
+    """(url, json body, headers) of a places:searchText call."""
     keyword = CUISINE_KEYWORDS.get(cuisine_key, "")
 
-    url = "https://places.googleapis.com/v1/places:searchText"
+    url = f"{PLACES_BASE_URL}/places:searchText"
 
     body = {
         "textQuery": keyword,
@@ -103,22 +485,43 @@ def search_restaurants(lat, lng, cuisine_key, radius_meters):
             "places.userRatingCount,places.formattedAddress,places.photos"
         ),
     }
+    return url, body, headers
 
-    try:
-        resp = requests.post(url, json=body, headers=headers, timeout=10)
-        resp.raise_for_status()
-    except Exception as e:
-        print("Places Text Search error:", repr(e))
-        return []
 
-    data = resp.json()
+def parse_places(data: dict):
+    """places:searchText JSON -> list of raw places, or None on an API error."""
     if "error" in data:
-        print("Places Text Search API error:", data["error"])
-        return []
+        log.warning("Places Text Search API error: %s", data["error"])
+        UPSTREAM_ERRORS.labels(upstream="places").inc()
+        return None
+
+    return data.get("places", [])
+
 
+def fetch_places(
+    lat, lng, cuisine_key, radius_meters, timeout: float = PLACES_TIMEOUT_SECONDS, priority: str = "high"
+):
+    """One places:searchText call -> list of raw v1 place objects, or None on error."""
+    url, body, headers = places_search_request(lat, lng, cuisine_key, radius_meters)
+    data = google_json(
+        "places_search",
+        places_breaker,
+        places_limiter,
+        "POST",
+        url,
+        json=body,
+        headers=headers,
+        timeout=timeout,
+        priority=priority,
+    )
+    return None if data is None else parse_places(data)
+
+
+def rank_places(places):
+    """Raw v1 places -> restaurant dicts, best rated first."""
     restaurants = []
 
-    for p in data.get("places", []):
+    for p in places:
         name_obj = p.get("displayName") or {}
         name_text = name_obj.get("text") or ""
 
@@ -138,7 +541,7 @@ def search_restaurants(lat, lng, cuisine_key, radius_meters):
             photo_name = photos[0].get("name")
             if photo_name:
                 photo_url = (
-                    f"https://places.googleapis.com/v1/{photo_name}/media"
+                    f"{PLACES_BASE_URL}/{photo_name}/media"
                     f"?maxWidthPx=800&key={GOOGLE_API_KEY}"
                 )
 
@@ -160,41 +563,91 @@ def search_restaurants(lat, lng, cuisine_key, radius_meters):
     restaurants.sort(
         key=lambda x: (x["rating"], x["user_ratings_total"]), reverse=True
     )
-    return restaurants[:5]
+    return restaurants
 
 
-# =====================================
-# 3. Google Places Details: extra context
-# =====================================
-def fetch_place_context(place_id: str) -> dict:
+def annotate_safety(restaurants: list) -> list:
     """
-    Fetch extra context for a restaurant from Google Places Details API (v1).
-    We use types and editorial summary when available.
+    Set r["safety"] from the local inspection index (safety_index.py):
+    {"flag", "inspection_date", "match"} of the matching DOHMH record, or None.
+    In-memory lookups only; the index is never loaded on this thread.
     """
-    if not place_id:
-        return {}
+    index = safety_index()
+    for r in restaurants:
+        record, match = index.lookup(r["name"], r["address"])
+        SAFETY_MATCHES.labels(match=match or "none").inc()
+        r["safety"] = None if record is None else {
+            "flag": record["flag"],
+            "inspection_date": record["inspection_date"],
+            "match": match,
+        }
+    return restaurants
+
+
+def search_restaurants(
+    lat, lng, cuisine_key, radius_meters, deadline: Deadline | None = None, priority: str = "high"
+):
+    """
+    All (up to 20) restaurants for a search, served from the places cache
+    when possible, with their inspection flags (annotate_safety). If Places
+    fails (or its breaker is open, or the search is out of time) an expired
+    list for the same cell is served instead, when there is one.
+    """
+    key, center_lat, center_lng, radius_bucket = places_cache_key(lat, lng, cuisine_key, radius_meters)
+
+    places = places_cache.get(key)
+    if places is MISSING:
+        def fetch_and_store():
+            timeout = stage_timeout(deadline, PLACES_TIMEOUT_SECONDS)
+            t0 = time.perf_counter()
+            fetched = places_hedger.call(
+                lambda: fetch_places(center_lat, center_lng, cuisine_key, radius_bucket, timeout, priority),
+                hedge_executor,
+                timeout=timeout,
+            )
+            places_cache.record_upstream(time.perf_counter() - t0)
+            if fetched is not None:
+                places_cache.set(key, fetched)
+            return fetched
+
+        try:
+            places = flight_for(places_flight, priority).do(
+                key, fetch_and_store, timeout=stage_timeout(deadline, PLACES_TIMEOUT_SECONDS)
+            )
+        except DeadlineExceeded:
+            places = None
+        if places is None:
+            stale = places_cache.get_entry(key, allow_stale=True)
+            if stale is None:
+                return []
+            log.info("Places unavailable, serving a stale list for %s", key)
+            places = stale.value
+
+    return annotate_safety(rank_places(places))
 
+
+# =====================================
+# 3. Google Places Details: extra context
+# =====================================
+def place_details_request(place_id: str):
+    """(url, params, headers) of a Places Details (v1) call."""
     if not place_id.startswith("places/"):
         place_path = f"places/{place_id}"
     else:
         place_path = place_id
 
-    url = f"https://places.googleapis.com/v1/{place_path}"
+    url = f"{PLACES_BASE_URL}/{place_path}"
     params = {
         "fields": "types,primaryType,primaryTypeDisplayName,editorialSummary"
     }
     headers = {
         "X-Goog-Api-Key": GOOGLE_API_KEY,
     }
+    return url, params, headers
 
-    try:
-        resp = requests.get(url, params=params, headers=headers, timeout=6)
-        resp.raise_for_status()
-    except Exception as e:
-        print("Places details error:", repr(e))
-        return {}
 
-    data = resp.json() or {}
+def parse_place_details(data: dict) -> dict:
+    data = data or {}
     ctx = {}
 
     ctx["types"] = data.get("types", [])
@@ -208,21 +661,131 @@ def fetch_place_context(place_id: str) -> dict:
     return ctx
 
 
+def fetch_place_details(place_id: str, timeout: float = DETAILS_TIMEOUT_SECONDS, priority: str = "high"):
+    """
+    Fetch extra context for a restaurant from Google Places Details API (v1).
+    We use types and editorial summary when available. None on failure.
+    """
+    url, params, headers = place_details_request(place_id)
+    data = google_json(
+        "place_details",
+        details_breaker,
+        details_limiter,
+        "GET",
+        url,
+        params=params,
+        headers=headers,
+        timeout=timeout,
+        priority=priority,
+    )
+    return None if data is None else parse_place_details(data)
+
+
+def fetch_place_context(place_id: str, deadline: Deadline | None = None, priority: str = "high") -> dict:
+    """
+    Place details from the long-lived store, refreshed in the background
+    when stale. Empty when the deadline runs out before they are fetched.
+    """
+    if not place_id:
+        return {}
+
+    def compute():
+        timeout = stage_timeout(deadline, DETAILS_TIMEOUT_SECONDS)
+        return details_hedger.call(
+            lambda: fetch_place_details(place_id, timeout, priority), hedge_executor, timeout=timeout
+        )
+
+    try:
+        ctx = details_cache.get_or_compute(
+            place_id,
+            compute,
+            refresh_executor=refresh_executor,
+            flight=flight_for(details_flight, priority),
+            timeout=stage_timeout(deadline, DETAILS_TIMEOUT_SECONDS),
+        )
+    except DeadlineExceeded:
+        return {}
+    return ctx or {}
+
+
 # =====================================
 # 4. AI Recommended Dishes with context (gpt-5-mini)
 # =====================================
-def generate_dish_recommendations_for_restaurant(
-    restaurant: dict,
-    cuisine_label: str,
-    city: str | None = None,
+DISH_FAILED_MESSAGE = "AI dish recommendation failed. Please try again later."
+DISH_EMPTY_MESSAGE = "(Model returned empty content for this restaurant, even after retry.)"
+DISH_UNAVAILABLE_MESSAGE = "AI dish recommendations are paused for a moment. Please search again shortly."
+
+
+def dish_cache_key(place_id: str, cuisine_label: str) -> str:
+    return f"{place_id}|{cuisine_label}"
+
+
+def record_dish_llm_call(mode: str, completion, seconds: float):
+    """Count one dish completion (request, tokens, wall time) under DISH_LLM_STATS[mode]."""
+    usage = getattr(completion, "usage", None)
+    with dish_llm_lock:
+        stats = DISH_LLM_STATS[mode]
+        stats["requests"] += 1
+        stats["llm_seconds"] += seconds
+        stats["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+        stats["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+    LLM_TOKENS.labels(mode=mode, kind="prompt").inc(getattr(usage, "prompt_tokens", 0) or 0)
+    LLM_TOKENS.labels(mode=mode, kind="completion").inc(getattr(usage, "completion_tokens", 0) or 0)
+
+
+def create_dish_completion(
+    mode: str, stage: str, messages: list, priority: str = "high", deadline: Deadline | None = None, **kwargs
 ):
+    """
+    One gpt-5-mini call for dish generation, timed as `stage` and counted
+    under `mode`. Raises RateLimited when no quota is left for it (at once
+    for priority="low", after OPENAI_QUEUE_MAX_WAIT_SECONDS otherwise), and
+    DeadlineExceeded when the deadline runs out first; queueing and the call
+    itself both stay within what is left of the deadline.
+    """
+    openai_limiter.acquire(priority, max_wait=stage_timeout(deadline, OPENAI_QUEUE_MAX_WAIT_SECONDS))
+    timeout = stage_timeout(deadline, OPENAI_TIMEOUT_SECONDS)
+    t0 = time.perf_counter()
+    try:
+        raw = openai_breaker.call(
+            lambda: client.chat.completions.with_raw_response.create(
+                model="gpt-5-mini", messages=messages, timeout=timeout, **kwargs
+            ),
+            ignore=(openai.RateLimitError,),
+        )
+    except Exception as e:
+        record_openai_error(e)
+        raise
+    finally:
+        STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - t0)
+    return settle_dish_completion(mode, raw, time.perf_counter() - t0)
+
+
+def record_openai_error(error: Exception):
+    """Count a failed OpenAI call; a 429 also slows the limiter down. Skipped calls are not counted."""
+    if isinstance(error, CircuitOpenError):
+        return
+    UPSTREAM_ERRORS.labels(upstream="openai").inc()
+    if isinstance(error, openai.RateLimitError):
+        openai_limiter.record_throttle(parse_duration(error.response.headers.get("retry-after")))
+
+
+def settle_dish_completion(mode: str, raw, seconds: float):
+    """Raw OpenAI response -> parsed completion, after the limiter and usage bookkeeping."""
+    openai_limiter.observe_headers(raw.headers)
+    openai_limiter.record_success()
+    completion = raw.parse()
+    record_dish_llm_call(mode, completion, seconds)
+    return completion
+
+
+def describe_restaurant(restaurant: dict, city: str | None, place_ctx: dict) -> str:
+    """One-paragraph description of a restaurant for the dish prompts."""
     name = restaurant.get("name", "this restaurant")
     address = restaurant.get("address", "")
     rating = restaurant.get("rating", None)
     reviews = restaurant.get("user_ratings_total", None)
-    place_id = restaurant.get("place_id")
 
-    place_ctx = fetch_place_context(place_id)
     types = place_ctx.get("types", [])
     primary_type = place_ctx.get("primary_type")
     primary_display = place_ctx.get("primary_type_display")
@@ -257,11 +820,36 @@ def generate_dish_recommendations_for_restaurant(
     if editorial:
         editorial_str = f' Google describes it as: "{editorial}"'
 
-    restaurant_desc = (
+    return (
         f"The restaurant is called '{name}', located in {location_str}. "
         f"{rating_str} {type_str} {editorial_str}"
     )
 
+
+def extract_text_from_completion(comp):
+    msg = comp.choices[0].message
+    content = msg.content
+
+    if isinstance(content, str):
+        return content.strip()
+
+    if isinstance(content, list):
+        parts = []
+        for c in content:
+            t = getattr(c, "text", None)
+            if t is None and isinstance(c, dict):
+                t = c.get("text")
+            if t:
+                parts.append(t)
+        return "\n".join(parts).strip()
+
+    return ""
+
+
+DISH_SYSTEM_MESSAGE = "You are an expert food and restaurant recommendation assistant."
+
+
+def dish_messages(restaurant_desc: str, cuisine_label: str) -> list:
     base_instruction = (
         "You are a foodie and menu expert.\n\n"
         "I will describe a real restaurant and the user's cuisine preference. "
@@ -279,88 +867,520 @@ def generate_dish_recommendations_for_restaurant(
         + "Return your answer as a short bullet list. Each line should be:\n"
         + "Dish name – one-sentence description."
     )
+    return [
+        {"role": "system", "content": DISH_SYSTEM_MESSAGE},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def simple_dish_messages(name: str, cuisine_label: str) -> list:
+    """Retry prompt for when the full prompt came back empty."""
+    simple_prompt = (
+        f"Suggest 3 signature dishes for a {cuisine_label} restaurant "
+        f"called '{name}'. Return a bullet list; each line is "
+        "Dish name – one-sentence description."
+    )
+    return [
+        {"role": "system", "content": DISH_SYSTEM_MESSAGE},
+        {"role": "user", "content": simple_prompt},
+    ]
+
+
+def batch_dish_messages(descriptions: dict, cuisine_label: str) -> list:
+    """Prompt for the batched mode; descriptions: id -> restaurant description."""
+    listing = "\n\n".join(f"id: {rid}\n{desc}" for rid, desc in descriptions.items())
+    user_prompt = (
+        "You are a foodie and menu expert.\n\n"
+        "Below are several real restaurants and the user's cuisine preference. "
+        "For EACH restaurant, based on its description and your knowledge of "
+        "typical menus for this style of restaurant, suggest 3 likely signature "
+        "dishes that a user should try. You may approximate based on common "
+        "patterns for that cuisine and type, but avoid contradicting the "
+        "description.\n\n"
+        f"User cuisine preference: {cuisine_label}.\n\n"
+        f"Restaurants:\n{listing}\n\n"
+        "Answer with one entry per restaurant id; each description is one sentence."
+    )
+    return [
+        {"role": "system", "content": DISH_SYSTEM_MESSAGE},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def request_dish_recommendations(
+    restaurant: dict,
+    cuisine_label: str,
+    city: str | None = None,
+    deadline: Deadline | None = None,
+    priority: str = "high",
+):
+    """
+    Ask gpt-5-mini for 3 dishes (with one simplified retry). Returns the
+    text, or None when the model returned nothing; API errors propagate.
+    """
+    if openai_breaker.state == "open":
+        raise CircuitOpenError(openai_breaker.name)
+    name = restaurant.get("name", "this restaurant")
+    place_ctx = fetch_place_context(restaurant.get("place_id"), deadline, priority)
+    restaurant_desc = describe_restaurant(restaurant, city, place_ctx)
+
+    sampled = debug_sampled()
+    if sampled:
+        debug_log.debug("Dish prompt for %r: %s", name, restaurant_desc)
+
+    attempts = dish_attempts(restaurant_desc, name, cuisine_label, priority)
+    for attempt, (stage, messages, priority) in enumerate(attempts):
+        if attempt:
+            LLM_RETRIES.labels(mode="per_restaurant").inc()
+            log.info("Empty dish completion for %r, retrying with simplified prompt", name)
+        try:
+            completion = create_dish_completion("per_restaurant", stage, messages, priority=priority, deadline=deadline)
+        except RateLimited:
+            if not attempt:
+                raise
+            return None
+        text = dish_attempt_text(completion, stage, name, sampled)
+        if text:
+            return text
+    return None
+
+
+def dish_attempts(restaurant_desc: str, name: str, cuisine_label: str, priority: str = "high"):
+    """
+    (stage, messages, priority) of the full prompt and of the simplified
+    retry sent when it came back empty; the retry is always low priority.
+    No max_completion_tokens: the model gets its default room to answer.
+    """
+    return (
+        ("llm_full_prompt", dish_messages(restaurant_desc, cuisine_label), priority),
+        ("llm_simple_prompt", simple_dish_messages(name, cuisine_label), "low"),
+    )
+
 
-    print("=== OpenAI dish debug ===")
-    print("OPENAI_API_KEY prefix:", (OPENAI_API_KEY or "")[:12])
-    print("Model: gpt-5-mini")
-    print("Restaurant desc for model:", restaurant_desc)
+def dish_attempt_text(completion, stage: str, name: str, sampled: bool) -> str:
+    """Text of one per-restaurant completion; empty answers are counted."""
+    text = extract_text_from_completion(completion)
+    if sampled:
+        debug_log.debug("RAW completion (%s) for %r: %s", stage, name, completion)
+    if not text:
+        LLM_EMPTY.labels(mode="per_restaurant").inc()
+    return text
 
-    def extract_text_from_completion(comp):
-        msg = comp.choices[0].message
-        content = msg.content
-        print("message.content type:", type(content))
-        print("message.content raw:", repr(content))
 
-        if isinstance(content, str):
-            return content.strip()
+def dish_fallback_message(error: Exception) -> str:
+    """What a card shows when its dish generation raised error."""
+    if isinstance(error, (CircuitOpenError, RateLimited, DeadlineExceeded)):
+        return DISH_UNAVAILABLE_MESSAGE
+    log.warning("OpenAI dish error: %r", error)
+    return DISH_FAILED_MESSAGE
 
-        if isinstance(content, list):
-            parts = []
-            for c in content:
-                t = getattr(c, "text", None)
-                if t is None and isinstance(c, dict):
-                    t = c.get("text")
-                if t:
-                    parts.append(t)
-            return "\n".join(parts).strip()
 
-        return ""
+def generate_dish_recommendations_for_restaurant(
+    restaurant: dict,
+    cuisine_label: str,
+    city: str | None = None,
+    deadline: Deadline | None = None,
+    priority: str = "high",
+):
+    """
+    Dish text for one restaurant from the long-lived store (keyed by
+    place_id + cuisine), refreshed in the background when stale. Only real
+    model output is stored; the fallback messages below never are. The
+    calls made for it stay within the deadline.
+    """
+    place_id = restaurant.get("place_id")
+
+    def compute():
+        return request_dish_recommendations(restaurant, cuisine_label, city, deadline, priority)
 
     try:
-        # First attempt: full prompt with context
-        completion = client.chat.completions.create(
-            model="gpt-5-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert food and restaurant recommendation assistant.",
-                },
-                {"role": "user", "content": user_prompt},
-            ],
-            # no max_completion_tokens here – use default so model has room to speak
-        )
-        print("RAW completion object (full prompt):", completion)
-        text = extract_text_from_completion(completion)
-        print("Final extracted text (full prompt):", repr(text))
+        if place_id:
+            text = dish_cache.get_or_compute(
+                dish_cache_key(place_id, cuisine_label),
+                compute,
+                refresh_executor=refresh_executor,
+                flight=flight_for(dish_flight, priority),
+                timeout=None if deadline is None else deadline.remaining(),
+            )
+        else:
+            text = compute()
+    except Exception as e:
+        return dish_fallback_message(e)
 
-        if text:
-            return text
+    return text or DISH_EMPTY_MESSAGE
 
-        # Retry with simplified prompt if first attempt was empty
-        print(">>> First call returned empty text. Retrying with simplified prompt...")
-        simple_prompt = (
-            f"Suggest 3 signature dishes for a {cuisine_label} restaurant "
-            f"called '{name}'. Return a bullet list; each line is "
-            "Dish name – one-sentence description."
-        )
 
-        completion2 = client.chat.completions.create(
-            model="gpt-5-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert food and restaurant recommendation assistant.",
-                },
-                {"role": "user", "content": simple_prompt},
-            ],
+def format_dish_lines(dishes: list) -> str:
+    return "\n".join(f"- {d['name'].strip()} – {d['description'].strip()}" for d in dishes)
+
+
+def valid_dish_entry(entry) -> bool:
+    dishes = entry.get("dishes") if isinstance(entry, dict) else None
+    return (
+        isinstance(dishes, list)
+        and len(dishes) > 0
+        and all(
+            isinstance(d, dict)
+            and str(d.get("name") or "").strip()
+            and isinstance(d.get("description"), str)
+            for d in dishes
         )
-        print("RAW completion object (simple prompt):", completion2)
-        text2 = extract_text_from_completion(completion2)
-        print("Final extracted text (simple prompt):", repr(text2))
+    )
+
+
+def parse_dish_batch(text: str, pending) -> dict:
+    """Batched model output -> id -> dish text, for the valid entries whose id is in pending."""
+    try:
+        data = json.loads(text or "{}")
+    except ValueError as e:
+        log.warning("Batched dish JSON error: %r", e)
+        return {}
+
+    found = {}
+    for entry in data.get("restaurants", []) if isinstance(data, dict) else []:
+        rid = entry.get("id") if isinstance(entry, dict) else None
+        if rid in pending and rid not in found and valid_dish_entry(entry):
+            found[rid] = format_dish_lines(entry["dishes"])
+    return found
+
+
+def request_dish_recommendations_batch(
+    descriptions: dict, cuisine_label: str, deadline: Deadline | None = None, priority: str = "high"
+) -> dict:
+    """
+    One structured-output call for several restaurants.
+    descriptions: id -> restaurant description. Returns id -> dish text for
+    every id the model answered validly; ids it skipped or garbled are
+    re-asked once, in a second call with only those ids. API errors propagate.
+    """
+    results = {}
+    pending = dict(descriptions)
+
+    for attempt in range(2):
+        if not pending:
+            break
+
+        try:
+            completion = create_dish_completion(
+                "batched",
+                "llm_batch",
+                batch_dish_messages(pending, cuisine_label),
+                priority=priority if attempt == 0 else "low",
+                deadline=deadline,
+                response_format=DISH_BATCH_RESPONSE_FORMAT,
+            )
+        except RateLimited:
+            if attempt == 0:
+                raise
+            break
+        take_dish_batch_answer(completion, pending, results, attempt)
+
+    return results
+
+
+def take_dish_batch_answer(completion, pending: dict, results: dict, attempt: int):
+    """Move the ids one batched completion answered validly from pending to results; count the rest."""
+    if debug_sampled():
+        debug_log.debug("RAW batched completion for %s: %s", list(pending), completion)
+
+    found = parse_dish_batch(extract_text_from_completion(completion), pending)
+    results.update(found)
+    for rid in found:
+        del pending[rid]
+
+    if pending:
+        LLM_EMPTY.labels(mode="batched").inc(len(pending))
+        if attempt == 0:
+            LLM_RETRIES.labels(mode="batched").inc()
+            log.info("Batched dish call missed ids %s, re-asking", list(pending))
+
+
+def describe_restaurants(
+    restaurants: dict, city: str | None, deadline: Deadline | None = None, priority: str = "high"
+) -> dict:
+    """id -> description, with place details fetched concurrently (missing ones left out of the text)."""
+    futures = {
+        rid: enrich_executor.submit(fetch_place_context, r.get("place_id"), deadline, priority)
+        for rid, r in restaurants.items()
+    }
+    wait(futures.values(), timeout=None if deadline is None else deadline.remaining())
+
+    descriptions = {}
+    for rid, fut in futures.items():
+        place_ctx = {}
+        if fut.done() and fut.exception() is None:
+            place_ctx = fut.result()
+        descriptions[rid] = describe_restaurant(restaurants[rid], city, place_ctx)
+    return descriptions
+
+
+def store_dish_batch(
+    restaurants: dict,
+    cuisine_label: str,
+    descriptions: dict,
+    deadline: Deadline | None = None,
+    priority: str = "high",
+) -> dict:
+    """Batched dish call for restaurants (id -> restaurant); stores each valid answer."""
+    t0 = time.perf_counter()
+    texts = request_dish_recommendations_batch(descriptions, cuisine_label, deadline, priority)
+    store_dish_texts(restaurants, cuisine_label, texts, time.perf_counter() - t0)
+    return texts
+
+
+def store_dish_texts(restaurants: dict, cuisine_label: str, texts: dict, seconds: float):
+    """Cache the dish texts of one batched call (seconds split evenly over its restaurants)."""
+    per_restaurant = seconds / max(len(restaurants), 1)
+    for rid, r in restaurants.items():
+        dish_cache.record_upstream(per_restaurant)
+        if texts.get(rid) and r.get("place_id"):
+            dish_cache.set(dish_cache_key(r["place_id"], cuisine_label), texts[rid])
+
+
+def dish_batch_key(restaurants: dict, cuisine_label: str) -> str:
+    """Single-flight key of a batched dish call: its ids and the dish keys behind them."""
+    return "\n".join(
+        f"{rid}={dish_cache_key(r.get('place_id'), cuisine_label)}"
+        for rid, r in sorted(restaurants.items())
+    )
+
+
+def refresh_dish_batch(restaurants: dict, cuisine_label: str, city: str | None, priority: str = "high"):
+    """Background refresh of stale dish entries (already claimed with begin_refresh)."""
+    try:
+        descriptions = describe_restaurants(restaurants, city, priority=priority)
+        store_dish_batch(restaurants, cuisine_label, descriptions, priority=priority)
+    except Exception as e:
+        log.warning("Dish batch refresh failed: %r", e)
+    finally:
+        for r in restaurants.values():
+            dish_cache.end_refresh(dish_cache_key(r["place_id"], cuisine_label))
 
-        if text2:
-            return text2
 
-        return "(Model returned empty content for this restaurant, even after retry.)"
+# =====================================
+# 5. Concurrent enrichment for one search
+# =====================================
+def enrich_restaurants(
+    restaurants: list,
+    cuisine_label: str,
+    city: str | None = None,
+    deadline_seconds: float = ENRICH_DEADLINE_SECONDS,
+    mode: str | None = None,
+    priority: str = "high",
+):
+    """
+    Fill r["dish_recs"] for every restaurant (DISH_MODE unless mode is given).
+    Restaurants not done by the deadline get dish_recs=None and
+    dish_timed_out=True, and the page renders a placeholder for them.
+    """
+    for _ in iter_enrich_restaurants(restaurants, cuisine_label, city, deadline_seconds, mode, priority):
+        pass
+
+
+def iter_enrich_restaurants(
+    restaurants: list,
+    cuisine_label: str,
+    city: str | None = None,
+    deadline_seconds: float = ENRICH_DEADLINE_SECONDS,
+    mode: str | None = None,
+    priority: str = "high",
+):
+    """Like enrich_restaurants, but yields (index, restaurant) as each one is final."""
+    if (mode or DISH_MODE) == "batched":
+        return iter_enrich_batched(restaurants, cuisine_label, city, deadline_seconds, priority)
+    return iter_enrich_individually(restaurants, cuisine_label, city, deadline_seconds, priority)
+
+
+def iter_enrich_individually(restaurants, cuisine_label, city, deadline_seconds, priority="high"):
+    """One dish task per restaurant, all at once on the shared pool."""
+    deadline = Deadline(deadline_seconds)
+    for r in restaurants:
+        r["dish_recs"] = None
+        r["dish_timed_out"] = False
+
+    futures = {
+        enrich_executor.submit(
+            generate_dish_recommendations_for_restaurant,
+            restaurant=r,
+            cuisine_label=cuisine_label,
+            city=city,
+            deadline=deadline,
+            priority=priority,
+        ): i
+        for i, r in enumerate(restaurants)
+    }
 
+    try:
+        for fut in as_completed(futures, timeout=deadline_seconds):
+            r = restaurants[futures[fut]]
+            try:
+                r["dish_recs"] = fut.result()
+            except Exception as e:
+                log.warning("Enrichment error: %r", e)
+            yield futures[fut], r
+    except FuturesTimeoutError:
+        for fut, i in futures.items():
+            if not fut.done():
+                fut.cancel()
+                restaurants[i]["dish_timed_out"] = True
+                yield i, restaurants[i]
+
+
+def iter_enrich_batched(restaurants, cuisine_label, city, deadline_seconds, priority="high"):
+    """
+    Cached dish texts are used as-is (stale ones are refreshed together in
+    the background); all remaining restaurants share one batched call.
+    """
+    deadline = Deadline(deadline_seconds)
+    ready, missing, stale = split_cached_dishes(restaurants, cuisine_label)
+    yield from ready
+
+    if stale:
+        refresh_executor.submit(refresh_dish_batch, stale, cuisine_label, city, priority)
+    if not missing:
+        return
+    if openai_breaker.state == "open":
+        settle_dish_batch(missing, None, CircuitOpenError(openai_breaker.name))
+        yield from batch_items(missing)
+        return
+
+    descriptions = describe_restaurants(missing, city, deadline, priority)
+    # identical concurrent searches share one batched call; whichever search
+    # started it, the call ends with that search's deadline
+    fut = enrich_executor.submit(
+        flight_for(dish_batch_flight, priority).do,
+        dish_batch_key(missing, cuisine_label),
+        lambda: store_dish_batch(missing, cuisine_label, descriptions, deadline, priority),
+    )
+    texts, error = None, None
+    try:
+        texts = fut.result(timeout=deadline.remaining())
+    except FuturesTimeoutError:
+        for r in missing.values():
+            r["dish_timed_out"] = True
     except Exception as e:
-        print("OpenAI dish error:", repr(e))
-        return "AI dish recommendation failed. Please try again later."
+        error = e
+    settle_dish_batch(missing, texts, error)
+    yield from batch_items(missing)
+
+
+def split_cached_dishes(restaurants: list, cuisine_label: str):
+    """
+    Reset each restaurant's dish fields and look its dishes up ->
+    (ready [(index, restaurant)], missing {rid: r}, stale {rid: r}). Stale
+    ones are served and already claimed for a background refresh.
+    """
+    ready, missing, stale = [], {}, {}
+    for i, r in enumerate(restaurants):
+        rid = f"r{i}"
+        r["dish_recs"] = None
+        r["dish_timed_out"] = False
+
+        key = dish_cache_key(r.get("place_id"), cuisine_label)
+        entry = dish_cache.get_entry(key, allow_stale=True) if r.get("place_id") else None
+        if entry is None:
+            missing[rid] = r
+            continue
+        r["dish_recs"] = entry.value
+        if not entry.fresh and dish_cache.begin_refresh(key):
+            stale[rid] = r
+        ready.append((i, r))
+    return ready, missing, stale
+
+
+def settle_dish_batch(missing: dict, texts: dict | None, error: Exception | None):
+    """Final dish_recs of a batch's restaurants: their texts, or the fallback message for error."""
+    if texts is not None:
+        for rid, r in missing.items():
+            r["dish_recs"] = texts.get(rid) or DISH_EMPTY_MESSAGE
+    elif error is not None:
+        message = dish_fallback_message(error)
+        for r in missing.values():
+            r["dish_recs"] = message
+
+
+def batch_items(restaurants: dict):
+    """(index, restaurant) pairs of a batch keyed by "r<index>"."""
+    return [(int(rid[1:]), r) for rid, r in restaurants.items()]
+
+
+def prepare_lazy_dishes(restaurants: list, cuisine: str, cuisine_label: str, city: str | None):
+    """
+    Lazy loading: cards with fresh cached dishes show them right away; the
+    others get r["dish_url"] (their /dishes handle) and are remembered in
+    dish_card_cache. The first DISH_PREFETCH_TOP of those get dish_prefetch.
+    """
+    prefetch = DISH_PREFETCH_TOP
+    for r in restaurants:
+        r["dish_recs"] = None
+        r["dish_timed_out"] = False
+        place_id = r.get("place_id")
+        if not place_id:
+            continue
+        key = dish_cache_key(place_id, cuisine_label)
+        cached = dish_cache.get(key)
+        if cached is not MISSING:
+            r["dish_recs"] = cached
+            continue
+
+        dish_card_cache.set(key, {"restaurant": {f: r.get(f) for f in DISH_CARD_FIELDS}, "city": city})
+        r["dish_url"] = f"/dishes/{quote(place_id, safe='/')}?{urlencode({'cuisine': cuisine})}"
+        r["dish_prefetch"] = prefetch > 0
+        prefetch -= 1
+
+
+def lazy_dish_card(place_id: str, cuisine_label: str):
+    """(restaurant dict, city) a lazy search stored for this card, or None."""
+    card = dish_card_cache.get(dish_cache_key(place_id, cuisine_label))
+    if card is MISSING:
+        return None
+    return dict(card["restaurant"]), card["city"]
+
+
+def record_lazy_dish_load(trigger: str, restaurant: dict | None, was_cached: bool):
+    if restaurant is None:
+        result = "unknown"
+    elif was_cached:
+        result = "cached"
+    elif restaurant["dish_recs"] in (DISH_FAILED_MESSAGE, DISH_EMPTY_MESSAGE, DISH_UNAVAILABLE_MESSAGE):
+        result = "failed"
+    else:
+        result = "generated"
+    LAZY_DISH_LOADS.labels(trigger=trigger, result=result).inc()
+
+
+def load_lazy_dishes(place_id: str, cuisine_label: str, trigger: str):
+    """
+    Restaurant dict with dish_recs for one lazily loaded card, None if no
+    search showed it. Generation gets the same ENRICH_DEADLINE_SECONDS as a
+    search's dishes, so one card never holds a worker for longer.
+    """
+    card = lazy_dish_card(place_id, cuisine_label)
+    if card is None:
+        record_lazy_dish_load(trigger, None, False)
+        return None
+    restaurant, city = card
+    was_cached = dish_cache.get_entry(dish_cache_key(place_id, cuisine_label), allow_stale=True) is not None
+    with stage_timer("lazy_dishes"):
+        restaurant["dish_recs"] = generate_dish_recommendations_for_restaurant(
+            restaurant, cuisine_label, city, Deadline(ENRICH_DEADLINE_SECONDS)
+        )
+    record_lazy_dish_load(trigger, restaurant, was_cached)
+    return restaurant
 
 
 # =====================================
-# 5. Flask Routes
+# 6. Flask Routes
 # =====================================
+@app.context_processor
+def template_settings():
+    return {
+        "radius_options": RADIUS_OPTIONS,
+        "dish_loading": DISH_LOADING,
+        "dish_trigger": DISH_LAZY_TRIGGER,
+    }
+
+
 @app.route("/", methods=["GET"])
 def index():
     return render_template(
@@ -369,48 +1389,245 @@ def index():
         error=None,
         address="",
         cuisine="",
-        radius=3,
+        radius=DEFAULT_RADIUS_MILES,
     )
 
 
+def prepare_search(form, deadline: Deadline | None = None):
+    """
+    Geocode + Places for a submitted search form -> (template context, city).
+    context["error"] is set when the address could not be geocoded;
+    restaurants in context["results"] are not enriched yet.
+    """
+    context = search_context(form)
+    lat, lng, city = geocode_address(context["address"], deadline)
+    if lat is None:
+        return geocode_failed(context), None
+
+    ranked = search_restaurants(lat, lng, context["cuisine"], context["radius"] * MILES_TO_METERS, deadline)
+    return results_page(context, ranked), city
+
+
+def search_context(form) -> dict:
+    """Template context of a submitted search form, before any lookups."""
+    return {
+        "address": form.get("address", "").strip(),
+        "cuisine": form.get("cuisine", ""),
+        "radius": form_radius(form.get("radius")),
+        "offset": form_offset(form.get("offset")),
+        "error": None,
+    }
+
+
+def form_radius(value) -> float:
+    """The RADIUS_OPTIONS entry closest to a submitted radius; DEFAULT_RADIUS_MILES if it is not a number."""
+    try:
+        miles = float(value)
+    except (TypeError, ValueError):
+        return DEFAULT_RADIUS_MILES
+    if not math.isfinite(miles):
+        return DEFAULT_RADIUS_MILES
+    return min(RADIUS_OPTIONS, key=lambda option: abs(option - miles))
+
+
+def form_offset(value) -> int:
+    """A submitted results offset; 0 if it is missing, negative or not an integer."""
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def geocode_failed(context: dict) -> dict:
+    context["results"] = []
+    if geocode_breaker.state == "open":
+        context["error"] = "Location search is temporarily unavailable. Please try again in a minute."
+    else:
+        context["error"] = "Unable to parse address. Please try another location."
+    return context
+
+
+def results_page(context: dict, ranked: list) -> dict:
+    """One RESULTS_PAGE_SIZE page of the ranked list, from context["offset"]."""
+    offset = context["offset"]
+    context["results"] = ranked[offset:offset + RESULTS_PAGE_SIZE]
+    context["next_offset"] = offset + RESULTS_PAGE_SIZE if len(ranked) > offset + RESULTS_PAGE_SIZE else None
+    return context
+
+
+def cuisine_label_for(cuisine: str) -> str:
+    return CUISINE_LABELS.get(cuisine, "this cuisine style")
+
+
+def lazy_dish_trigger(trigger: str | None) -> str:
+    """?trigger= of a /dishes request, "expand" unless it is a known one."""
+    return trigger if trigger in LAZY_DISH_TRIGGERS else "expand"
+
+
+def enrich_wait_seconds(deadline: Deadline) -> float:
+    """How long a search still waits for dishes: the rest of its budget, at most ENRICH_DEADLINE_SECONDS."""
+    return min(ENRICH_DEADLINE_SECONDS, deadline.remaining())
+
+
+def record_search_timing(route: str, first_card_seconds: float, complete_seconds: float):
+    SEARCH_TIMINGS[route].append((first_card_seconds, complete_seconds))
+    SEARCH_SECONDS.labels(route=route, milestone="first_card").observe(first_card_seconds)
+    SEARCH_SECONDS.labels(route=route, milestone="complete").observe(complete_seconds)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def script_json(value) -> str:
+    """JSON literal that is safe to embed inside a <script> element."""
+    return json.dumps(value).replace("</", "<\\/")
+
+
 @app.route("/search", methods=["POST"])
 def search():
-    address = request.form.get("address", "").strip()
-    cuisine = request.form.get("cuisine", "")
-    radius = float(request.form.get("radius", 3))
+    t0 = time.perf_counter()
+    deadline = Deadline(SEARCH_BUDGET_SECONDS)
+    context, city = prepare_search(request.form, deadline)
+    if context["error"]:
+        return render_template("index.html", **context)
 
-    lat, lng, city = geocode_address(address)
-    if lat is None:
-        return render_template(
-            "index.html",
-            results=[],
-            error="Unable to parse address. Please try another location.",
-            address=address,
-            cuisine=cuisine,
-            radius=radius,
-        )
+    cuisine_label = cuisine_label_for(context["cuisine"])
+    DISH_CARDS.labels(loading=DISH_LOADING).inc(len(context["results"]))
 
-    restaurants = search_restaurants(lat, lng, cuisine, radius * MILES_TO_METERS)
+    if DISH_LOADING == "lazy":
+        prepare_lazy_dishes(context["results"], context["cuisine"], cuisine_label, city)
+    else:
+        enrich_restaurants(context["results"], cuisine_label, city, enrich_wait_seconds(deadline))
 
-    cuisine_label = CUISINE_LABELS.get(cuisine, "this cuisine style")
+    with stage_timer("render"):
+        page = render_template("index.html", **context)
+    elapsed = time.perf_counter() - t0
+    record_search_timing("lazy" if DISH_LOADING == "lazy" else "search", elapsed, elapsed)
+    return page
 
-    for r in restaurants:
-        r["dish_recs"] = generate_dish_recommendations_for_restaurant(
-            restaurant=r,
-            cuisine_label=cuisine_label,
-            city=city,
-        )
 
-    return render_template(
-        "index.html",
-        results=restaurants,
-        error=None,
-        address=address,
-        cuisine=cuisine,
-        radius=radius,
+@app.route("/search/stream", methods=["POST"])
+def search_stream():
+    """
+    Progressive /search: the page with every card (dishes pending) is sent as
+    soon as the Places search returns, then one <script>fillDishes(...)</script>
+    chunk per restaurant as its dishes finish. Needs JS; /search stays the
+    plain-HTML path. With lazy dish loading there is nothing to stream, so
+    this is just /search.
+    """
+    if DISH_LOADING == "lazy":
+        return search()
+    t0 = time.perf_counter()
+    deadline = Deadline(SEARCH_BUDGET_SECONDS)
+    context, city = prepare_search(request.form, deadline)
+    restaurants = context["results"]
+    if context["error"] or not restaurants:
+        return render_template("index.html", **context)
+
+    cuisine_label = cuisine_label_for(context["cuisine"])
+    DISH_CARDS.labels(loading=DISH_LOADING).inc(len(restaurants))
+    for r in restaurants:
+        r["dish_pending"] = True
+    with stage_timer("render"):
+        head, tail = render_template("index.html", **context).rsplit("</body>", 1)
+
+    def generate():
+        yield head
+        first_card = time.perf_counter() - t0
+
+        for i, r in iter_enrich_restaurants(restaurants, cuisine_label, city, enrich_wait_seconds(deadline)):
+            r["dish_pending"] = False
+            box = render_template("dish_box.html", restaurant=r)
+            yield f"<script>fillDishes({i}, {script_json(box)});</script>\n"
+
+        record_search_timing("stream", first_card, time.perf_counter() - t0)
+        yield "</body>" + tail
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/html",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
+@app.route("/dishes/<path:place_id>", methods=["GET"])
+def dishes(place_id):
+    """
+    One card's dish box (HTML fragment) for lazy searches; the page asks for
+    it when the card is expanded, scrolled into view or prefetched
+    (?trigger=, counted in restaurant_lazy_dish_loads_total).
+    """
+    cuisine_label = cuisine_label_for(request.args.get("cuisine", ""))
+    trigger = lazy_dish_trigger(request.args.get("trigger"))
+
+    restaurant = load_lazy_dishes(place_id, cuisine_label, trigger)
+    if restaurant is None:
+        return render_template("dish_box.html", restaurant={}), 404
+    return render_template("dish_box.html", restaurant=restaurant)
+
+
+def search_timings_snapshot() -> dict:
+    """p50/p95 seconds to the first rendered card and to the complete page, per route."""
+    out = {}
+    for route, samples in SEARCH_TIMINGS.items():
+        samples = list(samples)
+        out[route] = {
+            "count": len(samples),
+            "first_card_p50": percentile([s[0] for s in samples], 0.5),
+            "first_card_p95": percentile([s[0] for s in samples], 0.95),
+            "complete_p50": percentile([s[1] for s in samples], 0.5),
+            "complete_p95": percentile([s[1] for s in samples], 0.95),
+        }
+    return out
+
+
+def cache_stats_snapshot() -> dict:
+    return {
+        "geocode": geocode_cache.stats(),
+        "places": places_cache.stats(),
+        "place_details": details_cache.stats(),
+        "dishes": dish_cache.stats(),
+        "dish_cards": dish_card_cache.stats(),
+        "dish_llm": DISH_LLM_STATS,
+        "singleflight": {
+            f.name: f.stats()
+            for f in (
+                geocode_flight,
+                places_flight,
+                details_flight,
+                dish_flight,
+                dish_batch_flight,
+                *low_priority_flights.values(),
+            )
+        },
+        "breakers": {b.name: b.stats() for b in (geocode_breaker, places_breaker, details_breaker, openai_breaker)},
+        "hedging": {h.name: h.stats() for h in (places_hedger, details_hedger)},
+        "rate_limits": {
+            lim.name: lim.stats() for lim in (geocode_limiter, places_limiter, details_limiter, openai_limiter)
+        },
+    }
+
+
+@app.route("/search/timings", methods=["GET"])
+def search_timings():
+    return jsonify(search_timings_snapshot())
+
+
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    return jsonify(cache_stats_snapshot())
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    body, content_type = metrics_payload()
+    return Response(body, content_type=content_type)
+
+
 # =====================================
 # Run App
 # =====================================
@@ -0,0 +1,620 @@
+"""
+ASGI version of app.py: same pages, prompts and caches, but every upstream
+call is awaited on one event loop, so a single worker process serves many
+concurrent searches instead of blocking a thread per search.
+
+    uvicorn async_app:app --port 5001
+    # or: hypercorn async_app:app --bind 127.0.0.1:5001
+
+- Google calls share one httpx.AsyncClient per worker (keep-alive pool,
+  HTTP/2 when the server offers it), so repeat calls skip the TLS handshake
+- dish generation uses AsyncOpenAI over its own pooled HTTP/2 client
+- request building, response parsing, ranking, prompts, result handling
+  and the geocode/places/details/dish caches are app.py's; this module
+  only awaits the calls in between
+- cache reads are answered from the in-process LRU tier inline; SQLite
+  reads and writes (and limiter bookkeeping) run via asyncio.to_thread, so
+  they never block the event loop
+
+Compare with the Flask path: python bench/compare_sync_async.py
+"""
+
+import asyncio
+import os
+import time
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+from quart import Quart, Response, jsonify, render_template, request, stream_with_context
+
+import app as sync_app
+from cache import MISSING, normalize_address
+from singleflight import AsyncSingleFlight
+from resilience import CircuitOpenError, Deadline, DeadlineExceeded, stage_timeout
+from ratelimit import RateLimited
+from metrics import (
+    DISH_CARDS,
+    LLM_RETRIES,
+    STAGE_SECONDS,
+    debug_log,
+    debug_sampled,
+    log,
+    metrics_payload,
+    register_stats_source,
+    stage_timer,
+)
+
+app = Quart(__name__)
+
+HTTP_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+# httpcore's pool bookkeeping grows with pool size; in load tests ~32
+# connections per client beat 64+ (requests beyond it queue for a connection)
+HTTP_MAX_CONNECTIONS = int(os.getenv("ASYNC_HTTP_MAX_CONNECTIONS", "32"))
+HTTP_LIMITS = httpx.Limits(
+    max_connections=HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+    keepalive_expiry=60,
+)
+
+# created per worker once its event loop runs (see open_clients)
+http_client: httpx.AsyncClient | None = None
+openai_client: AsyncOpenAI | None = None
+
+# single-flight per stage, keyed like app.py's
+geocode_flight = AsyncSingleFlight("geocode")
+places_flight = AsyncSingleFlight("places")
+details_flight = AsyncSingleFlight("place_details")
+dish_flight = AsyncSingleFlight("dishes")
+dish_batch_flight = AsyncSingleFlight("dish_batches")
+register_stats_source(
+    flights=(geocode_flight, places_flight, details_flight, dish_flight, dish_batch_flight),
+)
+
+# strong references to fire-and-forget tasks (cache refreshes, late dish calls)
+background_tasks = set()
+
+
+@app.before_serving
+async def open_clients():
+    global http_client, openai_client
+    http_client = httpx.AsyncClient(http2=True, timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS)
+    openai_client = AsyncOpenAI(
+        api_key=sync_app.OPENAI_API_KEY,
+        timeout=sync_app.OPENAI_TIMEOUT_SECONDS,
+        max_retries=0,  # see app.client
+        http_client=httpx.AsyncClient(http2=True, timeout=sync_app.OPENAI_TIMEOUT_SECONDS, limits=HTTP_LIMITS),
+    )
+
+
+@app.after_serving
+async def close_clients():
+    await http_client.aclose()
+    await openai_client.close()
+
+
+def spawn(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+# =====================================
+# 1-3. Google calls
+# =====================================
+async def google_request(breaker, limiter, method: str, url: str, timeout: float, **kwargs):
+    """Async counterpart of app.google_request (breakers and limiters are shared with app.py)."""
+    budget = Deadline(timeout)
+    await limiter.acquire_async(max_wait=timeout)
+    http_timeout = budget.timeout(timeout)
+
+    async def send():
+        resp = await http_client.request(method, url, timeout=http_timeout, **kwargs)
+        if resp.status_code >= 500:
+            resp.raise_for_status()
+        return resp
+
+    resp = await breaker.call_async(send)
+    return await asyncio.to_thread(sync_app.settle_google_response, limiter, resp)
+
+
+async def google_json(stage: str, breaker, limiter, method: str, url: str, **kwargs):
+    """Async counterpart of app.google_json."""
+    try:
+        with stage_timer(stage):
+            resp = await google_request(breaker, limiter, method, url, **kwargs)
+        return resp.json()
+    except (CircuitOpenError, RateLimited, DeadlineExceeded):
+        return None
+    except (httpx.HTTPError, ValueError) as e:
+        sync_app.record_google_error(breaker, e)
+        return None
+
+
+async def geocode_and_store(key: str, address: str, timeout: float = sync_app.GEOCODE_TIMEOUT_SECONDS):
+    t0 = time.perf_counter()
+    data = await google_json(
+        "geocode",
+        sync_app.geocode_breaker,
+        sync_app.geocode_limiter,
+        "GET",
+        sync_app.GEOCODE_URL,
+        params=sync_app.geocode_params(address),
+        timeout=timeout,
+    )
+    result, definitive = ((None, None, None), False) if data is None else sync_app.parse_geocode(data)
+    return await asyncio.to_thread(sync_app.store_geocode, key, result, definitive, time.perf_counter() - t0)
+
+
+async def geocode_address(address: str, deadline: Deadline | None = None):
+    key = normalize_address(address)
+    cached = await sync_app.geocode_cache.get_async(key)
+    if cached is not MISSING:
+        return tuple(cached) if cached else (None, None, None)
+
+    def call():
+        # timed when it runs: a follower that stopped waiting has less budget left
+        return geocode_and_store(key, address, stage_timeout(deadline, sync_app.GEOCODE_TIMEOUT_SECONDS))
+
+    try:
+        return await geocode_flight.do(key, call, timeout=stage_timeout(deadline, sync_app.GEOCODE_TIMEOUT_SECONDS))
+    except DeadlineExceeded:
+        return None, None, None
+
+
+async def fetch_places(lat, lng, cuisine_key, radius_meters, timeout: float = sync_app.PLACES_TIMEOUT_SECONDS):
+    url, body, headers = sync_app.places_search_request(lat, lng, cuisine_key, radius_meters)
+    data = await google_json(
+        "places_search",
+        sync_app.places_breaker,
+        sync_app.places_limiter,
+        "POST",
+        url,
+        json=body,
+        headers=headers,
+        timeout=timeout,
+    )
+    return None if data is None else sync_app.parse_places(data)
+
+
+async def search_restaurants(lat, lng, cuisine_key, radius_meters, deadline: Deadline | None = None):
+    """See app.search_restaurants (hedged, with the stale-list fallback)."""
+    key, center_lat, center_lng, radius_bucket = sync_app.places_cache_key(lat, lng, cuisine_key, radius_meters)
+    cache = sync_app.places_cache
+
+    places = await cache.get_async(key)
+    if places is MISSING:
+        async def fetch_and_store():
+            timeout = stage_timeout(deadline, sync_app.PLACES_TIMEOUT_SECONDS)
+            t0 = time.perf_counter()
+            fetched = await sync_app.places_hedger.call_async(
+                lambda: fetch_places(center_lat, center_lng, cuisine_key, radius_bucket, timeout),
+                timeout=timeout,
+            )
+            cache.record_upstream(time.perf_counter() - t0)
+            if fetched is not None:
+                await cache.set_async(key, fetched)
+            return fetched
+
+        try:
+            places = await places_flight.do(
+                key, fetch_and_store, timeout=stage_timeout(deadline, sync_app.PLACES_TIMEOUT_SECONDS)
+            )
+        except DeadlineExceeded:
+            places = None
+        if places is None:
+            stale = await cache.get_entry_async(key, allow_stale=True)
+            if stale is None:
+                return []
+            log.info("Places unavailable, serving a stale list for %s", key)
+            places = stale.value
+
+    return sync_app.annotate_safety(sync_app.rank_places(places))
+
+
+async def fetch_place_details(place_id: str, timeout: float = sync_app.DETAILS_TIMEOUT_SECONDS):
+    url, params, headers = sync_app.place_details_request(place_id)
+    data = await google_json(
+        "place_details",
+        sync_app.details_breaker,
+        sync_app.details_limiter,
+        "GET",
+        url,
+        params=params,
+        headers=headers,
+        timeout=timeout,
+    )
+    return None if data is None else sync_app.parse_place_details(data)
+
+
+async def fetch_place_context(place_id: str, deadline: Deadline | None = None) -> dict:
+    """See app.fetch_place_context."""
+    if not place_id:
+        return {}
+
+    def compute():
+        timeout = stage_timeout(deadline, sync_app.DETAILS_TIMEOUT_SECONDS)
+        return sync_app.details_hedger.call_async(lambda: fetch_place_details(place_id, timeout), timeout=timeout)
+
+    try:
+        ctx = await sync_app.details_cache.get_or_compute_async(
+            place_id,
+            compute,
+            spawn=spawn,
+            flight=details_flight,
+            timeout=stage_timeout(deadline, sync_app.DETAILS_TIMEOUT_SECONDS),
+        )
+    except DeadlineExceeded:
+        return {}
+    return ctx or {}
+
+
+# =====================================
+# 4. AI Recommended Dishes
+# =====================================
+async def create_completion(
+    mode: str, stage: str, messages: list, priority: str = "high", deadline: Deadline | None = None, **kwargs
+):
+    """Async counterpart of app.create_dish_completion."""
+    max_wait = stage_timeout(deadline, sync_app.OPENAI_QUEUE_MAX_WAIT_SECONDS)
+    await sync_app.openai_limiter.acquire_async(priority, max_wait=max_wait)
+    timeout = stage_timeout(deadline, sync_app.OPENAI_TIMEOUT_SECONDS)
+    t0 = time.perf_counter()
+    try:
+        raw = await sync_app.openai_breaker.call_async(
+            lambda: openai_client.chat.completions.with_raw_response.create(
+                model="gpt-5-mini", messages=messages, timeout=timeout, **kwargs
+            ),
+            ignore=(openai.RateLimitError,),
+        )
+    except Exception as e:
+        await asyncio.to_thread(sync_app.record_openai_error, e)
+        raise
+    finally:
+        STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - t0)
+    return await asyncio.to_thread(sync_app.settle_dish_completion, mode, raw, time.perf_counter() - t0)
+
+
+async def request_dish_recommendations(
+    restaurant: dict, cuisine_label: str, city: str | None = None, deadline: Deadline | None = None
+):
+    """See app.request_dish_recommendations."""
+    if sync_app.openai_breaker.state == "open":
+        raise CircuitOpenError(sync_app.openai_breaker.name)
+    name = restaurant.get("name", "this restaurant")
+    place_ctx = await fetch_place_context(restaurant.get("place_id"), deadline)
+    restaurant_desc = sync_app.describe_restaurant(restaurant, city, place_ctx)
+
+    sampled = debug_sampled()
+    if sampled:
+        debug_log.debug("Dish prompt for %r: %s", name, restaurant_desc)
+
+    attempts = sync_app.dish_attempts(restaurant_desc, name, cuisine_label)
+    for attempt, (stage, messages, priority) in enumerate(attempts):
+        if attempt:
+            LLM_RETRIES.labels(mode="per_restaurant").inc()
+            log.info("Empty dish completion for %r, retrying with simplified prompt", name)
+        try:
+            completion = await create_completion(
+                "per_restaurant", stage, messages, priority=priority, deadline=deadline
+            )
+        except RateLimited:
+            if not attempt:
+                raise
+            return None
+        text = sync_app.dish_attempt_text(completion, stage, name, sampled)
+        if text:
+            return text
+    return None
+
+
+async def generate_dish_recommendations_for_restaurant(
+    restaurant: dict, cuisine_label: str, city: str | None = None, deadline: Deadline | None = None
+):
+    place_id = restaurant.get("place_id")
+
+    def compute():
+        return request_dish_recommendations(restaurant, cuisine_label, city, deadline)
+
+    try:
+        if place_id:
+            text = await sync_app.dish_cache.get_or_compute_async(
+                sync_app.dish_cache_key(place_id, cuisine_label),
+                compute,
+                spawn=spawn,
+                flight=dish_flight,
+                timeout=None if deadline is None else deadline.remaining(),
+            )
+        else:
+            text = await compute()
+    except Exception as e:
+        return sync_app.dish_fallback_message(e)
+
+    return text or sync_app.DISH_EMPTY_MESSAGE
+
+
+async def request_dish_recommendations_batch(
+    descriptions: dict, cuisine_label: str, deadline: Deadline | None = None
+) -> dict:
+    """Same contract as app.request_dish_recommendations_batch."""
+    results = {}
+    pending = dict(descriptions)
+
+    for attempt in range(2):
+        if not pending:
+            break
+        try:
+            completion = await create_completion(
+                "batched",
+                "llm_batch",
+                sync_app.batch_dish_messages(pending, cuisine_label),
+                priority="high" if attempt == 0 else "low",
+                deadline=deadline,
+                response_format=sync_app.DISH_BATCH_RESPONSE_FORMAT,
+            )
+        except RateLimited:
+            if attempt == 0:
+                raise
+            break
+        sync_app.take_dish_batch_answer(completion, pending, results, attempt)
+
+    return results
+
+
+async def store_dish_batch(
+    restaurants: dict, cuisine_label: str, city: str | None, deadline: Deadline | None = None
+) -> dict:
+    contexts = await asyncio.gather(
+        *(fetch_place_context(r.get("place_id"), deadline) for r in restaurants.values())
+    )
+    descriptions = {
+        rid: sync_app.describe_restaurant(r, city, ctx)
+        for (rid, r), ctx in zip(restaurants.items(), contexts)
+    }
+
+    t0 = time.perf_counter()
+    texts = await request_dish_recommendations_batch(descriptions, cuisine_label, deadline)
+    await asyncio.to_thread(sync_app.store_dish_texts, restaurants, cuisine_label, texts, time.perf_counter() - t0)
+    return texts
+
+
+async def refresh_dish_batch(restaurants: dict, cuisine_label: str, city: str | None):
+    try:
+        await store_dish_batch(restaurants, cuisine_label, city)
+    except Exception as e:
+        log.warning("Dish batch refresh failed: %r", e)
+    finally:
+        for r in restaurants.values():
+            sync_app.dish_cache.end_refresh(sync_app.dish_cache_key(r["place_id"], cuisine_label))
+
+
+# =====================================
+# 5. Concurrent enrichment for one search
+# =====================================
+async def iter_enrich_restaurants(
+    restaurants: list,
+    cuisine_label: str,
+    city: str | None = None,
+    deadline_seconds: float = sync_app.ENRICH_DEADLINE_SECONDS,
+    mode: str | None = None,
+):
+    """
+    Async generator of (index, restaurant) as each restaurant's dish_recs is
+    final; see app.iter_enrich_restaurants. Every call made for it stays
+    within deadline_seconds.
+    """
+    if (mode or sync_app.DISH_MODE) == "batched":
+        gen = iter_enrich_batched(restaurants, cuisine_label, city, deadline_seconds)
+    else:
+        gen = iter_enrich_individually(restaurants, cuisine_label, city, deadline_seconds)
+    async for item in gen:
+        yield item
+
+
+async def iter_enrich_individually(restaurants, cuisine_label, city, deadline_seconds):
+    deadline = Deadline(deadline_seconds)
+    for r in restaurants:
+        r["dish_recs"] = None
+        r["dish_timed_out"] = False
+
+    async def one(i, r):
+        return i, await generate_dish_recommendations_for_restaurant(r, cuisine_label, city, deadline)
+
+    tasks = [spawn(one(i, r)) for i, r in enumerate(restaurants)]
+    finished = set()
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=deadline_seconds):
+            i, text = await next_done
+            restaurants[i]["dish_recs"] = text
+            finished.add(i)
+            yield i, restaurants[i]
+    except asyncio.TimeoutError:
+        for i, r in enumerate(restaurants):
+            if i not in finished:
+                r["dish_timed_out"] = True
+                yield i, r
+
+
+async def iter_enrich_batched(restaurants, cuisine_label, city, deadline_seconds):
+    deadline = Deadline(deadline_seconds)
+    ready, missing, stale = await asyncio.to_thread(sync_app.split_cached_dishes, restaurants, cuisine_label)
+    for item in ready:
+        yield item
+
+    if stale:
+        spawn(refresh_dish_batch(stale, cuisine_label, city))
+    if not missing:
+        return
+    if sync_app.openai_breaker.state == "open":
+        sync_app.settle_dish_batch(missing, None, CircuitOpenError(sync_app.openai_breaker.name))
+        for item in sync_app.batch_items(missing):
+            yield item
+        return
+
+    task = spawn(dish_batch_flight.do(
+        sync_app.dish_batch_key(missing, cuisine_label),
+        lambda: store_dish_batch(missing, cuisine_label, city, deadline),
+    ))
+    texts, error = None, None
+    try:
+        texts = await asyncio.wait_for(asyncio.shield(task), deadline.remaining())
+    except asyncio.TimeoutError:
+        for r in missing.values():
+            r["dish_timed_out"] = True
+    except Exception as e:
+        error = e
+    sync_app.settle_dish_batch(missing, texts, error)
+    for item in sync_app.batch_items(missing):
+        yield item
+
+
+async def load_lazy_dishes(place_id: str, cuisine_label: str, trigger: str):
+    """Async counterpart of app.load_lazy_dishes."""
+    card = await asyncio.to_thread(sync_app.lazy_dish_card, place_id, cuisine_label)
+    if card is None:
+        sync_app.record_lazy_dish_load(trigger, None, False)
+        return None
+    restaurant, city = card
+    key = sync_app.dish_cache_key(place_id, cuisine_label)
+    was_cached = await sync_app.dish_cache.get_entry_async(key, allow_stale=True) is not None
+    with stage_timer("lazy_dishes"):
+        restaurant["dish_recs"] = await generate_dish_recommendations_for_restaurant(
+            restaurant, cuisine_label, city, Deadline(sync_app.ENRICH_DEADLINE_SECONDS)
+        )
+    sync_app.record_lazy_dish_load(trigger, restaurant, was_cached)
+    return restaurant
+
+
+# =====================================
+# 6. Routes (same as app.py)
+# =====================================
+async def prepare_search(form, deadline: Deadline | None = None):
+    """Async counterpart of app.prepare_search."""
+    context = sync_app.search_context(form)
+    lat, lng, city = await geocode_address(context["address"], deadline)
+    if lat is None:
+        return sync_app.geocode_failed(context), None
+
+    ranked = await search_restaurants(
+        lat, lng, context["cuisine"], context["radius"] * sync_app.MILES_TO_METERS, deadline
+    )
+    return sync_app.results_page(context, ranked), city
+
+
+@app.context_processor
+async def template_settings():
+    return sync_app.template_settings()
+
+
+@app.route("/", methods=["GET"])
+async def index():
+    return await render_template(
+        "index.html",
+        results=None,
+        error=None,
+        address="",
+        cuisine="",
+        radius=3,
+    )
+
+
+@app.route("/search", methods=["POST"])
+async def search():
+    t0 = time.perf_counter()
+    deadline = Deadline(sync_app.SEARCH_BUDGET_SECONDS)
+    context, city = await prepare_search(await request.form, deadline)
+    if context["error"]:
+        return await render_template("index.html", **context)
+
+    cuisine_label = sync_app.cuisine_label_for(context["cuisine"])
+    DISH_CARDS.labels(loading=sync_app.DISH_LOADING).inc(len(context["results"]))
+
+    lazy = sync_app.DISH_LOADING == "lazy"
+    if lazy:
+        await asyncio.to_thread(
+            sync_app.prepare_lazy_dishes, context["results"], context["cuisine"], cuisine_label, city
+        )
+    else:
+        wait_seconds = sync_app.enrich_wait_seconds(deadline)
+        async for _ in iter_enrich_restaurants(context["results"], cuisine_label, city, wait_seconds):
+            pass
+
+    with stage_timer("render"):
+        page = await render_template("index.html", **context)
+    elapsed = time.perf_counter() - t0
+    sync_app.record_search_timing("lazy" if lazy else "search", elapsed, elapsed)
+    return page
+
+
+@app.route("/search/stream", methods=["POST"])
+async def search_stream():
+    """See app.search_stream."""
+    if sync_app.DISH_LOADING == "lazy":
+        return await search()
+    t0 = time.perf_counter()
+    deadline = Deadline(sync_app.SEARCH_BUDGET_SECONDS)
+    context, city = await prepare_search(await request.form, deadline)
+    restaurants = context["results"]
+    if context["error"] or not restaurants:
+        return await render_template("index.html", **context)
+
+    cuisine_label = sync_app.cuisine_label_for(context["cuisine"])
+    DISH_CARDS.labels(loading=sync_app.DISH_LOADING).inc(len(restaurants))
+    for r in restaurants:
+        r["dish_pending"] = True
+    with stage_timer("render"):
+        head, tail = (await render_template("index.html", **context)).rsplit("</body>", 1)
+
+    @stream_with_context
+    async def generate():
+        yield head
+        first_card = time.perf_counter() - t0
+
+        wait_seconds = sync_app.enrich_wait_seconds(deadline)
+        async for i, r in iter_enrich_restaurants(restaurants, cuisine_label, city, wait_seconds):
+            r["dish_pending"] = False
+            box = await render_template("dish_box.html", restaurant=r)
+            yield f"<script>fillDishes({i}, {sync_app.script_json(box)});</script>\n"
+
+        sync_app.record_search_timing("stream", first_card, time.perf_counter() - t0)
+        yield "</body>" + tail
+
+    return Response(
+        generate(),
+        mimetype="text/html",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/dishes/<path:place_id>", methods=["GET"])
+async def dishes(place_id):
+    """See app.dishes."""
+    cuisine_label = sync_app.cuisine_label_for(request.args.get("cuisine", ""))
+    trigger = sync_app.lazy_dish_trigger(request.args.get("trigger"))
+
+    restaurant = await load_lazy_dishes(place_id, cuisine_label, trigger)
+    if restaurant is None:
+        return await render_template("dish_box.html", restaurant={}), 404
+    return await render_template("dish_box.html", restaurant=restaurant)
+
+
+@app.route("/search/timings", methods=["GET"])
+async def search_timings():
+    return jsonify(sync_app.search_timings_snapshot())
+
+
+@app.route("/cache/stats", methods=["GET"])
+async def cache_stats():
+    stats = sync_app.cache_stats_snapshot()
+    stats["singleflight"] = {
+        f.name: f.stats()
+        for f in (geocode_flight, places_flight, details_flight, dish_flight, dish_batch_flight)
+    }
+    return jsonify(stats)
+
+
+@app.route("/metrics", methods=["GET"])
+async def metrics():
+    body, content_type = metrics_payload()
+    return Response(body, content_type=content_type)
@@ -0,0 +1,80 @@
+"""
+Compare the two dish-generation modes of app.py on the same restaurants:
+requests, tokens and wall time.
+
+    python bench/compare_dish_modes.py --address "Times Square" --cuisine chinese --runs 3
+
+Uses whatever upstreams app.py is configured for (real keys, or the stubs
+from bench/stub_upstreams.py via the env vars documented there). Place
+details are fetched once up front so both modes only differ in LLM calls;
+dish entries are dropped from the cache before every run.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+MODES = ("per_restaurant", "batched")
+
+
+def run_mode(mode, restaurants, cuisine_label, city):
+    for r in restaurants:
+        app.dish_cache.delete(app.dish_cache_key(r["place_id"], cuisine_label))
+
+    before = dict(app.DISH_LLM_STATS[mode])
+    t0 = time.perf_counter()
+    app.enrich_restaurants(restaurants, cuisine_label, city, mode=mode)
+    wall = time.perf_counter() - t0
+    after = app.DISH_LLM_STATS[mode]
+
+    result = {k: after[k] - before[k] for k in before}
+    result["wall_seconds"] = wall
+    result["with_dishes"] = sum(
+        1 for r in restaurants
+        if r.get("dish_recs") not in (None, app.DISH_FAILED_MESSAGE, app.DISH_EMPTY_MESSAGE)
+    )
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--address", default="Times Square, New York")
+    parser.add_argument("--cuisine", default="chinese", choices=sorted(app.CUISINE_KEYWORDS))
+    parser.add_argument("--radius-miles", type=float, default=1.0)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    lat, lng, city = app.geocode_address(args.address)
+    if lat is None:
+        sys.exit(f"Could not geocode {args.address!r}")
+    restaurants = app.search_restaurants(lat, lng, args.cuisine, args.radius_miles * app.MILES_TO_METERS)
+    restaurants = restaurants[:app.RESULTS_PAGE_SIZE]
+    cuisine_label = app.CUISINE_LABELS[args.cuisine]
+
+    for r in restaurants:
+        app.fetch_place_context(r["place_id"])
+
+    totals = {mode: [] for mode in MODES}
+    for _ in range(args.runs):
+        for mode in MODES:
+            totals[mode].append(run_mode(mode, [dict(r) for r in restaurants], cuisine_label, city))
+
+    print(f"{len(restaurants)} restaurants, {args.runs} runs per mode (mean per search)")
+    print(f"{'mode':>15} {'requests':>9} {'prompt tok':>11} {'compl tok':>10} {'wall s':>8} {'with dishes':>12}")
+    summary = {}
+    for mode, runs in totals.items():
+        mean = {k: sum(r[k] for r in runs) / len(runs) for k in runs[0]}
+        summary[mode] = mean
+        print(f"{mode:>15} {mean['requests']:9.1f} {mean['prompt_tokens']:11.0f} "
+              f"{mean['completion_tokens']:10.0f} {mean['wall_seconds']:8.2f} {mean['with_dishes']:12.1f}")
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Concurrent-user throughput of the Flask app (app.py, threaded dev server)
+against the ASGI app (async_app.py under uvicorn), both talking to the
+local stub upstreams.
+
+    python bench/compare_sync_async.py --latency-ms 300 --users 1 8 32 64
+
+Each server runs in its own process with a fresh cache file. By default
+every cache TTL is 0, so each search makes its full set of upstream calls
+(geocode, places, details, dishes); pass --warm to measure with caches on.
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+from stub_upstreams import serve  # noqa: E402
+
+CACHE_TTL_ENV = [
+    "GEOCODE_CACHE_TTL_SECONDS",
+    "PLACES_CACHE_TTL_SECONDS",
+    "DETAILS_CACHE_TTL_SECONDS",
+    "DETAILS_CACHE_STALE_SECONDS",
+    "DISH_CACHE_TTL_SECONDS",
+    "DISH_CACHE_STALE_SECONDS",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_command(kind: str, port: int) -> list:
+    if kind == "sync":
+        return [sys.executable, "-c",
+                f"import app; app.app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    return [sys.executable, "-m", "uvicorn", "async_app:app",
+            "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+
+
+def start_server(kind: str, stub_url: str, warm: bool, cache_dir: str):
+    port = free_port()
+    env = dict(
+        os.environ,
+        GOOGLE_GEOCODE_URL=f"{stub_url}/maps/api/geocode/json",
+        GOOGLE_PLACES_BASE_URL=f"{stub_url}/v1",
+        OPENAI_BASE_URL=f"{stub_url}/v1",
+        OPENAI_API_KEY="stub",
+        GOOGLE_MAPS_API_KEY="stub",
+        CACHE_DB_PATH=os.path.join(cache_dir, f"{kind}.sqlite3"),
+    )
+    if not warm:
+        env.update({name: "0" for name in CACHE_TTL_ENV})
+
+    proc = subprocess.Popen(
+        server_command(kind, port), cwd=APP_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(base + "/", timeout=1)
+            return proc, base
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{kind} server did not start")
+
+
+async def run_load(base: str, users: int, searches_per_user: int) -> dict:
+    latencies, errors = [], 0
+    form = {"address": "Times Square, New York", "cuisine": "chinese", "radius": "1"}
+
+    async def user(client):
+        nonlocal errors
+        for _ in range(searches_per_user):
+            t0 = time.perf_counter()
+            try:
+                resp = await client.post(base + "/search", data=form)
+                resp.raise_for_status()
+                latencies.append(time.perf_counter() - t0)
+            except httpx.HTTPError:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(user(client) for _ in range(users)))
+        wall = time.perf_counter() - t0
+
+    latencies.sort()
+
+    def pct(q):
+        return latencies[min(int(q * len(latencies)), len(latencies) - 1)] if latencies else float("nan")
+
+    return {
+        "searches": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / wall if wall else 0.0,
+        "p50": pct(0.5),
+        "p95": pct(0.95),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="stub latency per upstream call")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--searches-per-user", type=int, default=3)
+    parser.add_argument("--warm", action="store_true", help="keep the caches on")
+    args = parser.parse_args(argv)
+
+    stub = serve(port=free_port(), latency_ms=args.latency_ms)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    stub_url = f"http://127.0.0.1:{stub.server_address[1]}"
+
+    print(f"stub latency {args.latency_ms:.0f} ms, caches {'on' if args.warm else 'off'}")
+    print(f"{'server':>6} {'users':>6} {'searches':>9} {'errors':>7} {'search/s':>9} {'p50 s':>7} {'p95 s':>7}")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for kind in ("sync", "async"):
+            proc, base = start_server(kind, stub_url, args.warm, cache_dir)
+            try:
+                for users in args.users:
+                    r = asyncio.run(run_load(base, users, args.searches_per_user))
+                    print(f"{kind:>6} {users:6d} {r['searches']:9d} {r['errors']:7d} "
+                          f"{r['throughput']:9.2f} {r['p50']:7.2f} {r['p95']:7.2f}")
+            finally:
+                proc.terminate()
+                proc.wait()
+
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+"""
+End-to-end load test of both approaches against the local stub upstreams
+(bench/stub_upstreams.py): concurrent synthetic users, throughput and
+p50/p95/p99 per stage.
+
+    python bench/load_test.py --users 1 8 32 --duration 20 --profile realistic
+    python bench/load_test.py --target recommend --users 4 --stream
+    python bench/load_test.py --error-rate all=0.02 --json results.json
+    python bench/load_test.py --quota chat_completions=5 --users 16
+    python bench/load_test.py --target search --dish-loading lazy --open-cards 1
+    python bench/load_test.py --baseline results.json --max-regression 0.25
+
+Targets:
+- search: app.py (or async_app.py with --server async) in its own process,
+  driven over HTTP on /search. end_to_end is measured by the client; the
+  other stages (geocode, places_search, place_details, llm_*, render) come
+  from the app's restaurant_stage_seconds histograms on /metrics, so their
+  percentiles are interpolated within the histogram buckets.
+- recommend: Approach 1's ollama_model.recommend_restaurants, in this
+  process on one thread per user, against the stub's Ollama /api/chat.
+  Stages: prepare (filtering, ranking, prompt), llm (the Ollama call, or the
+  whole streamed answer with --stream) and total.
+
+With --dish-loading lazy the app returns cards without dishes; each user
+then loads the prefetched card's dishes and --open-cards other cards', as a
+browser would (the lazy_dishes stage). The llm_* stage counts show the
+OpenAI calls either way.
+
+Every user runs searches back to back for --duration seconds per user
+count. By default the app's caches are off, so every search makes its full
+set of upstream calls; --warm keeps them on.
+
+With --baseline, a stage whose p95 grew (or a throughput that dropped) by
+more than --max-regression compared with an earlier --json run is reported
+and the exit status is 1.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html import unescape
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+APPROACH1_DIR = os.path.join(os.path.dirname(os.path.dirname(APP_DIR)), "Approach 1")
+sys.path.insert(0, HERE)
+
+from compare_sync_async import free_port, start_server  # noqa: E402
+from stub_upstreams import PROFILES, parse_route_values, serve  # noqa: E402
+
+SEARCH_ADDRESSES = [
+    "Times Square, New York",
+    "350 5th Ave, New York, NY",
+    "Washington Square Park",
+    "Columbia University",
+    "SoHo, Manhattan",
+    "Grand Central Terminal",
+    "Chelsea Market",
+    "Lower East Side, NY",
+]
+SEARCH_CUISINES = ["chinese", "french", "southeast_asian", "japanese", "korean", "spanish", "mexican", "italian"]
+SEARCH_RADII = ["1", "3", "5"]
+
+RECOMMEND_QUERIES = [
+    "I'm near Times Square and want some Chinese food",
+    "I'm in SoHo looking for a casual Italian restaurant",
+    "Any good Japanese sushi places in the East Village?",
+    "Looking for Mexican food near Union Square",
+    "Cheap Korean BBQ in Koreatown",
+    "I'm in Harlem and want soul food",
+    "Vegetarian-friendly Indian restaurant near Murray Hill",
+    "Pizza within 1 mile of Washington Square Park",
+    "French bistro on the Upper West Side",
+    "Thai food in Hell's Kitchen",
+]
+
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+# =====================================
+# Percentiles
+# =====================================
+def percentile(sorted_values, q):
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def summarize(samples) -> dict:
+    samples = sorted(samples)
+    out = {"count": len(samples)}
+    for q in PERCENTILES:
+        out[f"p{int(q * 100)}"] = percentile(samples, q) if samples else None
+    return out
+
+
+def stage_buckets(metrics_text: str) -> dict:
+    """stage -> {upper bound: cumulative count} of restaurant_stage_seconds."""
+    out = {}
+    for family in text_string_to_metric_families(metrics_text):
+        if family.name != "restaurant_stage_seconds":
+            continue
+        for sample in family.samples:
+            if sample.name.endswith("_bucket"):
+                out.setdefault(sample.labels["stage"], {})[float(sample.labels["le"])] = sample.value
+    return out
+
+
+def histogram_quantile(q: float, buckets: dict):
+    """Prometheus-style quantile: linear interpolation inside the bucket holding rank q."""
+    total = buckets.get(float("inf"), 0)
+    if total <= 0:
+        return None
+    rank = q * total
+    prev_bound, prev_count = 0.0, 0.0
+    for bound in sorted(buckets):
+        count = buckets[bound]
+        if count >= rank:
+            if bound == float("inf"):
+                return prev_bound
+            if count == prev_count:
+                return bound
+            return prev_bound + (bound - prev_bound) * (rank - prev_count) / (count - prev_count)
+        prev_bound, prev_count = bound, count
+    return prev_bound
+
+
+def summarize_histograms(before: dict, after: dict) -> dict:
+    """Per-stage count and percentiles of the observations made between two scrapes."""
+    out = {}
+    for stage, buckets in after.items():
+        delta = {le: n - before.get(stage, {}).get(le, 0) for le, n in buckets.items()}
+        count = int(delta.get(float("inf"), 0))
+        if not count:
+            continue
+        out[stage] = {"count": count}
+        for q in PERCENTILES:
+            out[stage][f"p{int(q * 100)}"] = histogram_quantile(q, delta)
+    return out
+
+
+# =====================================
+# search: app.py / async_app.py over HTTP
+# =====================================
+LAZY_DISH_BOX = re.compile(r'data-dish-url="([^"]+)"\s*(data-prefetch="1")?')
+
+
+def lazy_dish_urls(page: str, open_cards: int, rng) -> list:
+    """/dishes URLs a browser would load for a lazy page: prefetched cards plus open_cards others."""
+    boxes = [(unescape(url), bool(prefetch)) for url, prefetch in LAZY_DISH_BOX.findall(page)]
+    prefetched = [url + "&trigger=prefetch" for url, prefetch in boxes if prefetch]
+    others = [url + "&trigger=expand" for url, prefetch in boxes if not prefetch]
+    return prefetched + rng.sample(others, min(open_cards, len(others)))
+
+
+async def run_search_load(base: str, users: int, duration: float, seed: int, open_cards: int = 0) -> dict:
+    latencies, errors = [], 0
+    rng = random.Random(seed)
+
+    async def user(client, user_rng):
+        nonlocal errors
+        stop_at = time.perf_counter() + duration
+        while time.perf_counter() < stop_at:
+            form = {
+                "address": user_rng.choice(SEARCH_ADDRESSES),
+                "cuisine": user_rng.choice(SEARCH_CUISINES),
+                "radius": user_rng.choice(SEARCH_RADII),
+            }
+            t0 = time.perf_counter()
+            try:
+                resp = await client.post(base + "/search", data=form)
+                resp.raise_for_status()
+                latencies.append(time.perf_counter() - t0)
+                urls = lazy_dish_urls(resp.text, open_cards, user_rng)
+                for box in await asyncio.gather(*(client.get(base + url) for url in urls)):
+                    box.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        before = stage_buckets((await client.get(base + "/metrics")).text)
+        t0 = time.perf_counter()
+        await asyncio.gather(*(user(client, random.Random(rng.random())) for _ in range(users)))
+        wall = time.perf_counter() - t0
+        after = stage_buckets((await client.get(base + "/metrics")).text)
+
+    stages = {"end_to_end": summarize(latencies)}
+    stages.update(summarize_histograms(before, after))
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / wall if wall else 0.0,
+        "stages": stages,
+    }
+
+
+def bench_search(args, stub_url: str) -> dict:
+    results = {}
+    os.environ["DISH_LOADING"] = args.dish_loading
+    with tempfile.TemporaryDirectory() as cache_dir:
+        proc, base = start_server(args.server, stub_url, args.warm, cache_dir)
+        try:
+            for users in args.users:
+                results[str(users)] = asyncio.run(
+                    run_search_load(base, users, args.duration, args.seed, args.open_cards)
+                )
+        finally:
+            proc.terminate()
+            proc.wait()
+    return results
+
+
+# =====================================
+# recommend: Approach 1 in-process
+# =====================================
+def load_ollama_model(stub_url: str):
+    """Import Approach 1's ollama_model pointed at the stub (its data paths are relative to its folder)."""
+    os.environ["OLLAMA_URL"] = f"{stub_url}/api/chat"
+    sys.path.insert(0, APPROACH1_DIR)
+    cwd = os.getcwd()
+    os.chdir(APPROACH1_DIR)
+    try:
+        import ollama_model
+    finally:
+        os.chdir(cwd)
+    ollama_model.OLLAMA_URL = os.environ["OLLAMA_URL"]
+    return ollama_model
+
+
+@contextlib.contextmanager
+def timed_stages(module, stage_names: dict, samples: dict, lock: threading.Lock):
+    """Temporarily wrap module functions (name -> stage) to record their wall time."""
+    originals = {name: getattr(module, name) for name in stage_names}
+
+    def wrap(name, fn):
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with lock:
+                    samples.setdefault(stage_names[name], []).append(time.perf_counter() - t0)
+        return timed
+
+    for name, fn in originals.items():
+        setattr(module, name, wrap(name, fn))
+    try:
+        yield
+    finally:
+        for name, fn in originals.items():
+            setattr(module, name, fn)
+
+
+def run_recommend_load(ollama_model, users: int, duration: float, stream: bool, seed: int) -> dict:
+    samples, lock = {}, threading.Lock()
+    counts = {"requests": 0, "errors": 0}
+    rng = random.Random(seed)
+    stage_names = {
+        "prepare_recommendation": "prepare",
+        "stream_recommendations" if stream else "call_ollama_chat": "llm",
+    }
+
+    def user(user_rng):
+        stop_at = time.perf_counter() + duration
+        while time.perf_counter() < stop_at:
+            t0 = time.perf_counter()
+            try:
+                ollama_model.recommend_restaurants(user_rng.choice(RECOMMEND_QUERIES), stream=stream)
+            except Exception:
+                with lock:
+                    counts["errors"] += 1
+                continue
+            with lock:
+                counts["requests"] += 1
+                samples.setdefault("total", []).append(time.perf_counter() - t0)
+
+    with timed_stages(ollama_model, stage_names, samples, lock), \
+            open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=users) as pool:
+            list(pool.map(user, [random.Random(rng.random()) for _ in range(users)]))
+        wall = time.perf_counter() - t0
+
+    return {
+        "requests": counts["requests"],
+        "errors": counts["errors"],
+        "throughput": counts["requests"] / wall if wall else 0.0,
+        "stages": {stage: summarize(values) for stage, values in samples.items()},
+    }
+
+
+def bench_recommend(args, stub_url: str) -> dict:
+    ollama_model = load_ollama_model(stub_url)
+    return {
+        str(users): run_recommend_load(ollama_model, users, args.duration, args.stream, args.seed)
+        for users in args.users
+    }
+
+
+# =====================================
+# Report / baseline
+# =====================================
+def print_report(target: str, results: dict):
+    for users, r in results.items():
+        print(f"\n{target}: {users} users, {r['requests']} requests, {r['errors']} errors, "
+              f"{r['throughput']:.2f} req/s")
+        print(f"  {'stage':<18} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for stage, s in r["stages"].items():
+            cells = " ".join(
+                f"{s[f'p{int(q * 100)}'] * 1000:9.1f}" if s[f"p{int(q * 100)}"] is not None else f"{'-':>9}"
+                for q in PERCENTILES
+            )
+            print(f"  {stage:<18} {s['count']:7d} {cells}")
+
+
+def find_regressions(results: dict, baseline: dict, max_regression: float, floor_seconds: float = 0.005) -> list:
+    """Human-readable lines for every stage p95 / throughput worse than baseline by more than max_regression."""
+    problems = []
+    for target, by_users in baseline.items():
+        for users, base in by_users.items():
+            current = results.get(target, {}).get(users)
+            if current is None:
+                continue
+            if current["throughput"] < base["throughput"] * (1 - max_regression):
+                problems.append(f"{target}/{users} users: throughput {base['throughput']:.2f} -> "
+                                f"{current['throughput']:.2f} req/s")
+            for stage, s in base["stages"].items():
+                now = current["stages"].get(stage, {}).get("p95")
+                was = s.get("p95")
+                if now is None or was is None:
+                    continue
+                if now > was * (1 + max_regression) and now - was > floor_seconds:
+                    problems.append(f"{target}/{users} users: {stage} p95 {was * 1000:.1f} -> {now * 1000:.1f} ms")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["search", "recommend", "all"], default="all")
+    parser.add_argument("--server", choices=["sync", "async"], default="sync", help="app for the search target")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per user count")
+    parser.add_argument("--stream", action="store_true", help="recommend target: streamed Ollama answers")
+    parser.add_argument("--warm", action="store_true", help="search target: keep the app's caches on")
+    parser.add_argument("--dish-loading", choices=["eager", "lazy"], default="eager", help="search target: app's DISH_LOADING")
+    parser.add_argument("--open-cards", type=int, default=1, help="lazy: cards per search a user opens besides the prefetch")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="realistic", help="stub latency profile")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="stub latency of routes without a distribution")
+    parser.add_argument("--latency", action="append", default=[], metavar="ROUTE=SPEC")
+    parser.add_argument("--error-rate", action="append", default=[], metavar="ROUTE=RATE")
+    parser.add_argument("--quota", action="append", default=[], metavar="ROUTE=RPS", help="stub 429s over this rate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", metavar="PATH", help="write the results here")
+    parser.add_argument("--baseline", metavar="PATH", help="compare with an earlier --json run")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    stub = serve(
+        port=free_port(),
+        latency_ms=args.latency_ms,
+        profile=args.profile,
+        latencies=parse_route_values(args.latency, str),
+        error_rates=parse_route_values(args.error_rate, float),
+        quotas=parse_route_values(args.quota, float),
+        seed=args.seed,
+    )
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    stub_url = f"http://127.0.0.1:{stub.server_address[1]}"
+
+    results = {}
+    try:
+        if args.target in ("search", "all"):
+            results["search"] = bench_search(args, stub_url)
+            print_report("search", results["search"])
+        if args.target in ("recommend", "all"):
+            results["recommend"] = bench_recommend(args, stub_url)
+            print_report("recommend", results["recommend"])
+    finally:
+        stub.shutdown()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = find_regressions(results, json.load(f), args.max_regression)
+        if problems:
+            print("\nRegressions against", args.baseline)
+            for line in problems:
+                print("  " + line)
+            sys.exit(1)
+        print("\nNo regressions against", args.baseline)
+
+
+if __name__ == "__main__":
+    main()
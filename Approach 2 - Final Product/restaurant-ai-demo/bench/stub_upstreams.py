@@ -0,0 +1,461 @@
+"""
+Local stand-ins for the upstream APIs app.py and Approach 1's ollama_model.py
+call, for timing runs without real keys, network or a GPU.
+
+    python bench/stub_upstreams.py --port 8765 --latency-ms 800
+    python bench/stub_upstreams.py --profile realistic --error-rate all=0.02
+
+Then start the app against it:
+
+    GOOGLE_GEOCODE_URL=http://127.0.0.1:8765/maps/api/geocode/json \
+    GOOGLE_PLACES_BASE_URL=http://127.0.0.1:8765/v1 \
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 \
+    OPENAI_API_KEY=stub GOOGLE_MAPS_API_KEY=stub \
+    python app.py
+
+Endpoints:
+- GET  /maps/api/geocode/json        Google Geocoding
+- POST /v1/places:searchText         Google Places (v1) text search
+- GET  /v1/places/<id>               Google Places (v1) details
+- POST /v1/chat/completions          OpenAI chat completions
+- POST /api/chat                     Ollama chat (stream true/false), for
+                                     OLLAMA_URL=http://127.0.0.1:8765/api/chat
+
+Routes: geocode, places_search, place_details, chat_completions, ollama_chat.
+
+Each route's latency is drawn from a distribution (--latency ROUTE=SPEC,
+or a --profile; see parse_latency for SPEC) and a share of its requests can
+fail with a 503 (--error-rate ROUTE=RATE, ROUTE "all" for every route).
+Deterministic faults can be injected per route from the command line
+(--fault places_search:503, --fault place_details:200:1500 for a 1.5 s
+delay) or from tests through server.faults.
+
+--quota ROUTE=RPS enforces a per-second request quota on a route: requests
+over it get a 429 with Retry-After, and every answer on that route carries
+OpenAI-style x-ratelimit-{limit,remaining,reset}-requests headers.
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+def geocode_response():
+    return {
+        "status": "OK",
+        "results": [
+            {
+                "geometry": {"location": {"lat": 40.758, "lng": -73.9855}},
+                "address_components": [
+                    {"long_name": "New York", "types": ["locality", "political"]}
+                ],
+            }
+        ],
+    }
+
+
+def places_response(count=20):
+    return {
+        "places": [
+            {
+                "id": f"stub-place-{i}",
+                "displayName": {"text": f"Stub Restaurant {i}"},
+                "rating": round(3.5 + (i % 15) / 10, 1),
+                "userRatingCount": 50 + 37 * i,
+                "formattedAddress": f"{100 + i} W {40 + i} St, New York, NY 10036, USA",
+                "photos": [],
+            }
+            for i in range(count)
+        ]
+    }
+
+
+def details_response(place_id):
+    return {
+        "types": ["restaurant", "food", "point_of_interest"],
+        "primaryType": "restaurant",
+        "primaryTypeDisplayName": {"text": "Restaurant"},
+        "editorialSummary": {"text": f"Cozy stub spot ({place_id})."},
+    }
+
+
+STUB_DISHES = [
+    {"name": "Dish One", "description": "A stub signature dish."},
+    {"name": "Dish Two", "description": "Another stub favorite."},
+    {"name": "Dish Three", "description": "The stub chef's special."},
+]
+
+
+def chat_completion_response(body, content=None):
+    """
+    content if given, else plain dish bullets, or, when a json_schema
+    response_format is requested, {"restaurants": [{"id", "dishes"}]} for
+    every "id: ..." line of the prompt. Token counts are estimated at 4
+    characters per token.
+    """
+    prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+    if content is not None:
+        pass
+    elif (body.get("response_format") or {}).get("type") == "json_schema":
+        ids = re.findall(r"^id: (\S+)$", prompt, flags=re.MULTILINE)
+        content = json.dumps({"restaurants": [{"id": rid, "dishes": STUB_DISHES} for rid in ids]})
+    else:
+        content = "\n".join(f"- {d['name']} – {d['description']}" for d in STUB_DISHES)
+
+    prompt_tokens = len(prompt) // 4
+    completion_tokens = len(content) // 4
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+ROUTES = ("geocode", "places_search", "place_details", "chat_completions", "ollama_chat")
+
+# Rough shapes of the real services (median ms, lognormal sigma): Google
+# calls in the low hundreds of ms, gpt-5-mini and a local 12B model in seconds
+PROFILES = {
+    "fixed": {},
+    "realistic": {
+        "geocode": "lognormal:120:0.4",
+        "places_search": "lognormal:350:0.5",
+        "place_details": "lognormal:180:0.5",
+        "chat_completions": "lognormal:2500:0.6",
+        "ollama_chat": "lognormal:4000:0.4",
+    },
+}
+
+
+def parse_latency(spec: str):
+    """
+    Latency spec -> function returning seconds. Times are in ms:
+    fixed:MS, uniform:LO:HI, normal:MEAN:SD (clipped at 0),
+    lognormal:MEDIAN:SIGMA (long right tail), exp:MEAN.
+    """
+    kind, *args = spec.split(":")
+    args = [float(a) for a in args]
+    if kind == "fixed":
+        return lambda rng: args[0] / 1000.0
+    if kind == "uniform":
+        return lambda rng: rng.uniform(args[0], args[1]) / 1000.0
+    if kind == "normal":
+        return lambda rng: max(rng.gauss(args[0], args[1]), 0.0) / 1000.0
+    if kind == "lognormal":
+        mu = math.log(args[0])
+        return lambda rng: rng.lognormvariate(mu, args[1]) / 1000.0
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1.0 / args[0]) / 1000.0
+    raise ValueError(f"unknown latency distribution {kind!r} in {spec!r}")
+
+
+def parse_route_values(items, convert):
+    """["route=value", ...] -> {route: convert(value)}; route "all" expands to every route."""
+    out = {}
+    for item in items:
+        route, value = item.split("=", 1)
+        for r in ROUTES if route == "all" else (route,):
+            if r not in ROUTES:
+                raise ValueError(f"unknown route {r!r}, expected one of {', '.join(ROUTES)}")
+            out[r] = convert(value)
+    return out
+
+
+def ollama_content(body):
+    """A JSON array recommending the first 5 "- ID n:" candidates of the prompt."""
+    prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+    ids = re.findall(r"^- ID (\d+): ([^|]*)", prompt, flags=re.MULTILINE)[:5]
+    return json.dumps(
+        [{"id": int(i), "name": name.strip(), "why": "A stub pick.", "address": ""} for i, name in ids],
+        indent=2,
+    )
+
+
+def ollama_response(body, content):
+    return {
+        "model": body.get("model", "stub"),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "message": {"role": "assistant", "content": content},
+        "done": True,
+        "done_reason": "stop",
+    }
+
+
+class Faults:
+    """
+    Injected failures per route, plus a count of the requests each route got.
+    A fault delays the next `count` requests (None: all of them, until
+    cleared) by delay_ms and, when status is set, answers them with that
+    HTTP status instead of the normal payload. Scripted replies replace the
+    model text of the next chat completions, one per request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rules = {}
+        self.requests = {}
+        self.replies = {}
+
+    def set(self, route, status=None, delay_ms=0.0, count=None):
+        with self._lock:
+            self.rules[route] = {"status": status, "delay_s": delay_ms / 1000.0, "count": count}
+
+    def clear(self):
+        with self._lock:
+            self.rules.clear()
+            self.requests.clear()
+            self.replies.clear()
+
+    def reply(self, route, *contents):
+        """Answer the next len(contents) requests to route with these contents, in order."""
+        with self._lock:
+            self.replies.setdefault(route, []).extend(contents)
+
+    def next_reply(self, route):
+        with self._lock:
+            queued = self.replies.get(route)
+            return queued.pop(0) if queued else None
+
+    def take(self, route):
+        """Count one request to route -> (status or None, delay seconds) to apply to it."""
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+            rule = self.rules.get(route)
+            if rule is None:
+                return None, 0.0
+            if rule["count"] is not None:
+                rule["count"] -= 1
+                if rule["count"] <= 0:
+                    del self.rules[route]
+            return rule["status"], rule["delay_s"]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    # rate-limit headers for the current request's answer (see _fault)
+    extra_headers = {}
+
+    def _send_json(self, payload, status=200):
+        out = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        for name, value in self.extra_headers.items():
+            self.send_header(name, value)
+        self.extra_headers = {}
+        self.end_headers()
+        self.wfile.write(out)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _fault(self, route) -> bool:
+        """
+        Sleep route's sampled latency and apply injected faults, the route's
+        quota and random errors; True if that already answered the request.
+        """
+        status, delay_s = self.server.faults.take(route)
+        time.sleep(self.server.sample_latency(route) + delay_s)
+        self.extra_headers, over_quota = self.server.take_quota(route)
+        if status is None and over_quota:
+            self.extra_headers["Retry-After"] = self.extra_headers["x-ratelimit-reset-requests"].rstrip("s")
+            status = 429
+        if status is None and self.server.random_error(route):
+            status = 503
+        if status is None:
+            return False
+        self._send_json({"error": {"code": status, "message": f"injected {route} fault"}}, status=status)
+        return True
+
+    def _send_ollama_stream(self, body, content, piece_chars=8):
+        """Ollama's NDJSON stream: one chunk per few characters, then a done chunk."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_chunk(payload):
+            line = (json.dumps(payload) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+
+        for i in range(0, len(content), piece_chars):
+            chunk = ollama_response(body, content[i:i + piece_chars])
+            chunk["done"] = False
+            del chunk["done_reason"]
+            write_chunk(chunk)
+        write_chunk(ollama_response(body, ""))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/maps/api/geocode/json":
+            if not self._fault("geocode"):
+                self._send_json(geocode_response())
+        elif path.startswith("/v1/places/"):
+            if not self._fault("place_details"):
+                self._send_json(details_response(path[len("/v1/places/"):]))
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        body = self._read_json()
+        path = urlparse(self.path).path
+        if path == "/v1/places:searchText":
+            if not self._fault("places_search"):
+                self._send_json(places_response(body.get("maxResultCount", 20)))
+        elif path == "/v1/chat/completions":
+            if not self._fault("chat_completions"):
+                self._send_json(chat_completion_response(body, self.server.faults.next_reply("chat_completions")))
+        elif path == "/api/chat":
+            if not self._fault("ollama_chat"):
+                content = ollama_content(body)
+                if body.get("stream", True):
+                    self._send_ollama_stream(body, content)
+                else:
+                    self._send_json(ollama_response(body, content))
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+
+class StubServer(ThreadingHTTPServer):
+    # the default listen backlog (5) drops connections under load tests
+    request_queue_size = 512
+
+    def __init__(self, *args, latencies=None, error_rates=None, quotas=None, seed=None, **kwargs):
+        """
+        latencies: route -> function(rng) -> seconds; error_rates: route ->
+        share of 503s; quotas: route -> requests per second.
+        """
+        super().__init__(*args, **kwargs)
+        self.faults = Faults()
+        self.quotas = quotas or {}
+        self._quota_lock = threading.Lock()
+        self._quota_windows = {}
+        self.latencies = latencies or {}
+        self.default_latency = parse_latency("fixed:0")
+        self.error_rates = error_rates or {}
+        self.rng = random.Random(seed)
+
+    def sample_latency(self, route) -> float:
+        return self.latencies.get(route, self.default_latency)(self.rng)
+
+    def random_error(self, route) -> bool:
+        rate = self.error_rates.get(route, 0.0)
+        return rate > 0 and self.rng.random() < rate
+
+    def take_quota(self, route):
+        """
+        Count one request against route's quota (one-second fixed windows)
+        -> (x-ratelimit-* headers, whether it is over the quota).
+        """
+        rps = self.quotas.get(route)
+        if not rps:
+            return {}, False
+        now = time.monotonic()
+        with self._quota_lock:
+            start, used = self._quota_windows.get(route, (now, 0))
+            if now - start >= 1.0:
+                start, used = now, 0
+            used += 1
+            self._quota_windows[route] = (start, used)
+        headers = {
+            "x-ratelimit-limit-requests": str(int(rps * 60)),
+            "x-ratelimit-remaining-requests": str(max(int(rps) - used, 0)),
+            "x-ratelimit-reset-requests": f"{max(start + 1.0 - now, 0.001):.3f}s",
+        }
+        return headers, used > rps
+
+    def handle_error(self, request, client_address):
+        # clients that stopped waiting (timeouts, losing hedges) close early
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+def serve(
+    host="127.0.0.1",
+    port=8765,
+    latency_ms=0.0,
+    profile="fixed",
+    latencies=None,
+    error_rates=None,
+    quotas=None,
+    seed=None,
+):
+    """
+    Every route takes latency_ms, unless the profile or latencies
+    (route -> spec string, see parse_latency) give it a distribution.
+    quotas: route -> requests per second allowed before 429s.
+    """
+    specs = dict(PROFILES[profile], **(latencies or {}))
+    server = StubServer(
+        (host, port),
+        StubHandler,
+        latencies={route: parse_latency(spec) for route, spec in specs.items()},
+        error_rates=error_rates,
+        quotas=quotas,
+        seed=seed,
+    )
+    server.default_latency = parse_latency(f"fixed:{latency_ms}")
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latency of routes without a distribution")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="fixed")
+    parser.add_argument("--latency", action="append", default=[], metavar="ROUTE=SPEC",
+                        help="latency distribution of ROUTE, e.g. places_search=lognormal:300:0.5")
+    parser.add_argument("--error-rate", action="append", default=[], metavar="ROUTE=RATE",
+                        help="share of ROUTE's requests answered with 503 (ROUTE all: every route)")
+    parser.add_argument("--quota", action="append", default=[], metavar="ROUTE=RPS",
+                        help="requests per second ROUTE accepts before answering 429 (ROUTE all: every route)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--fault", action="append", default=[], metavar="ROUTE:STATUS[:DELAY_MS]",
+        help="fail (STATUS, e.g. 503) and/or delay every request to ROUTE; STATUS 200 only delays",
+    )
+    args = parser.parse_args()
+
+    server = serve(
+        args.host,
+        args.port,
+        args.latency_ms,
+        profile=args.profile,
+        latencies=parse_route_values(args.latency, str),
+        error_rates=parse_route_values(args.error_rate, float),
+        quotas=parse_route_values(args.quota, float),
+        seed=args.seed,
+    )
+    for spec in args.fault:
+        route, status, *delay = spec.split(":")
+        server.faults.set(route, status=None if status == "200" else int(status), delay_ms=float(delay[0]) if delay else 0.0)
+    print(f"Stub upstreams on http://{args.host}:{args.port} (profile {args.profile}, default latency {args.latency_ms} ms)")
+    server.serve_forever()
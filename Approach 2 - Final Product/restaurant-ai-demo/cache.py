@@ -0,0 +1,418 @@
+"""
+Result caches for upstream API calls.
+
+TieredCache = in-process LRU tier in front of an on-disk SQLite tier, so
+entries survive restarts and are shared by every worker process on the
+machine. Each entry is fresh for `ttl` seconds and can then still be served
+as stale for `stale_ttl` more seconds (for stale-while-revalidate and for
+degraded fallbacks); after that it is gone. Failed lookups can be cached
+as negative entries (value None) with their own, shorter TTL.
+
+The *_async methods are for event-loop code (async_app.py): LRU hits are
+answered inline, SQLite reads and writes run on a worker thread.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "cache.sqlite3")
+
+# returned by TieredCache.get when nothing usable is cached
+MISSING = object()
+
+
+class CacheEntry:
+    __slots__ = ("value", "stored_at", "fresh_until", "expires_at", "clock")
+
+    def __init__(self, value, stored_at, fresh_until, expires_at, clock=time.time):
+        self.value = value
+        self.stored_at = stored_at
+        self.fresh_until = fresh_until
+        self.expires_at = expires_at
+        self.clock = clock
+
+    @property
+    def fresh(self) -> bool:
+        return self.clock() < self.fresh_until
+
+    @property
+    def age(self) -> float:
+        return self.clock() - self.stored_at
+
+
+class LRUTier:
+    """Thread-safe in-process LRU of CacheEntry objects."""
+
+    def __init__(self, maxsize: int, clock=time.time):
+        self.maxsize = maxsize
+        self.clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if self.clock() >= entry.expires_at:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, entry: CacheEntry):
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteTier:
+    """
+    One table per namespace in a shared SQLite file (WAL mode, one
+    connection per thread). Values are stored as JSON.
+    """
+
+    def __init__(self, namespace: str, db_path: str = CACHE_DB_PATH, max_entries: int = 100_000, clock=time.time):
+        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", namespace):
+            raise ValueError(f"Invalid cache namespace: {namespace!r}")
+        self.table = f"cache_{namespace}"
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.clock = clock
+        self._local = threading.local()
+        self._writes = 0
+
+        conn = self._conn()
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT,"
+            " stored_at REAL NOT NULL,"
+            " fresh_until REAL NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_expires ON {self.table} (expires_at)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            f"SELECT value, stored_at, fresh_until, expires_at FROM {self.table} WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None or self.clock() >= row[3]:
+            return None
+        return CacheEntry(json.loads(row[0]), row[1], row[2], row[3], self.clock)
+
+    def set(self, key, entry: CacheEntry):
+        conn = self._conn()
+        conn.execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, stored_at, fresh_until, expires_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (key, json.dumps(entry.value), entry.stored_at, entry.fresh_until, entry.expires_at),
+        )
+        conn.commit()
+
+        self._writes += 1
+        if self._writes % 200 == 0:
+            self.evict()
+
+    def delete(self, key):
+        conn = self._conn()
+        conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        conn.commit()
+
+    def evict(self):
+        """Drop expired rows, then the oldest rows beyond max_entries."""
+        conn = self._conn()
+        conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (self.clock(),))
+        conn.execute(
+            f"DELETE FROM {self.table} WHERE key IN ("
+            f" SELECT key FROM {self.table} ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        conn.commit()
+
+
+class TieredCache:
+    def __init__(
+        self,
+        namespace: str,
+        ttl: float,
+        stale_ttl: float = 0.0,
+        negative_ttl: float = 0.0,
+        maxsize: int = 1024,
+        db_path: str | None = CACHE_DB_PATH,
+        max_entries: int = 100_000,
+        clock=time.time,
+    ):
+        """
+        db_path=None keeps the cache in memory only.
+        negative_ttl=0 disables negative caching.
+        clock is wall-clock time (entries on disk outlive the process).
+        """
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self.memory = LRUTier(maxsize, clock)
+        self.disk = SQLiteTier(namespace, db_path, max_entries, clock) if db_path else None
+
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "stale_hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "upstream_calls": 0,
+            "upstream_seconds": 0.0,
+            "refreshes": 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def get_entry(self, key, allow_stale: bool = False):
+        """CacheEntry for key (fresh, or stale if allowed), else None. Counts hits/misses."""
+        entry = self.memory.get(key)
+        tier = "memory_hits"
+        if entry is None and self.disk is not None:
+            entry = self.disk.get(key)
+            tier = "disk_hits"
+            if entry is not None:
+                self.memory.set(key, entry)
+        return self._counted(entry, tier, allow_stale)
+
+    async def get_entry_async(self, key, allow_stale: bool = False):
+        """get_entry without blocking the event loop on the SQLite tier."""
+        entry = self.memory.get(key)
+        tier = "memory_hits"
+        if entry is None and self.disk is not None:
+            entry = await asyncio.to_thread(self.disk.get, key)
+            tier = "disk_hits"
+            if entry is not None:
+                self.memory.set(key, entry)
+        return self._counted(entry, tier, allow_stale)
+
+    def _counted(self, entry, tier: str, allow_stale: bool):
+        if entry is None or not (entry.fresh or allow_stale):
+            self._count("misses")
+            return None
+
+        self._count(tier)
+        if not entry.fresh:
+            self._count("stale_hits")
+        if entry.value is None:
+            self._count("negative_hits")
+        return entry
+
+    def get(self, key):
+        """Fresh cached value (None for a negative entry), or MISSING."""
+        entry = self.get_entry(key)
+        return MISSING if entry is None else entry.value
+
+    async def get_async(self, key):
+        entry = await self.get_entry_async(key)
+        return MISSING if entry is None else entry.value
+
+    def set(self, key, value):
+        now = self.clock()
+        self._store(key, CacheEntry(value, now, now + self.ttl, now + self.ttl + self.stale_ttl, self.clock))
+
+    def set_negative(self, key):
+        if self.negative_ttl <= 0:
+            return
+        now = self.clock()
+        self._store(key, CacheEntry(None, now, now + self.negative_ttl, now + self.negative_ttl, self.clock))
+
+    async def set_async(self, key, value):
+        await asyncio.to_thread(self.set, key, value)
+
+    async def set_negative_async(self, key):
+        await asyncio.to_thread(self.set_negative, key)
+
+    def _store(self, key, entry: CacheEntry):
+        self.memory.set(key, entry)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, entry)
+            except sqlite3.Error as e:
+                log.warning("%s cache write failed: %r", self.namespace, e)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def record_upstream(self, seconds: float):
+        """Time of one real upstream call made after a miss."""
+        with self._lock:
+            self.counters["upstream_calls"] += 1
+            self.counters["upstream_seconds"] += seconds
+
+    def get_or_compute(self, key, compute, refresh_executor=None, flight=None, timeout=None):
+        """
+        Stale-while-revalidate read.
+
+        Fresh hit -> cached value. Stale hit -> cached value, and compute() is
+        re-run on refresh_executor (at most one refresh per key at a time).
+        Miss -> compute() inline; with a SingleFlight, concurrent misses for
+        the same key share one compute() (a caller waits at most timeout
+        seconds for another's, then computes itself). Only truthy results
+        are stored, so failures (None, "", {}) are retried on the next call
+        instead of being cached.
+        """
+        entry = self.get_entry(key, allow_stale=refresh_executor is not None)
+        if entry is not None:
+            if not entry.fresh:
+                self._schedule_refresh(key, compute, refresh_executor)
+            return entry.value
+        if flight is not None:
+            return flight.do(key, lambda: self._compute_and_store(key, compute), timeout=timeout)
+        return self._compute_and_store(key, compute)
+
+    def _compute_and_store(self, key, compute):
+        t0 = time.perf_counter()
+        try:
+            value = compute()
+        finally:
+            self.record_upstream(time.perf_counter() - t0)
+        if value:
+            self.set(key, value)
+        return value
+
+    async def get_or_compute_async(self, key, compute, spawn=None, flight=None, timeout=None):
+        """
+        get_or_compute for coroutines: compute is an async callable, a stale
+        entry is refreshed in a task started with spawn(coroutine), and the
+        flight is an AsyncSingleFlight.
+        """
+        entry = await self.get_entry_async(key, allow_stale=spawn is not None)
+        if entry is not None:
+            if not entry.fresh and self.begin_refresh(key):
+                spawn(self._refresh_async(key, compute))
+            return entry.value
+        if flight is not None:
+            return await flight.do(key, lambda: self._compute_and_store_async(key, compute), timeout=timeout)
+        return await self._compute_and_store_async(key, compute)
+
+    async def _compute_and_store_async(self, key, compute):
+        t0 = time.perf_counter()
+        try:
+            value = await compute()
+        finally:
+            self.record_upstream(time.perf_counter() - t0)
+        if value:
+            await self.set_async(key, value)
+        return value
+
+    async def _refresh_async(self, key, compute):
+        try:
+            await self._compute_and_store_async(key, compute)
+        except Exception as e:
+            log.warning("%s cache refresh failed: %r", self.namespace, e)
+        finally:
+            self.end_refresh(key)
+
+    def begin_refresh(self, key) -> bool:
+        """Claim the background refresh of key; False if one is already running."""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            self.counters["refreshes"] += 1
+            return True
+
+    def end_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def _schedule_refresh(self, key, compute, executor):
+        if not self.begin_refresh(key):
+            return
+
+        def refresh():
+            try:
+                self._compute_and_store(key, compute)
+            except Exception as e:
+                log.warning("%s cache refresh failed: %r", self.namespace, e)
+            finally:
+                self.end_refresh(key)
+
+        executor.submit(refresh)
+
+    def stats(self) -> dict:
+        with self._lock:
+            c = dict(self.counters)
+        hits = c["memory_hits"] + c["disk_hits"]
+        lookups = hits + c["misses"]
+        avg_upstream = c["upstream_seconds"] / c["upstream_calls"] if c["upstream_calls"] else 0.0
+        c["hit_rate"] = hits / lookups if lookups else 0.0
+        c["avg_upstream_seconds"] = avg_upstream
+        c["saved_seconds"] = hits * avg_upstream
+        c["memory_entries"] = len(self.memory)
+        return c
+
+
+# =====================================
+# Key normalization
+# =====================================
+_ADDRESS_WORDS = {
+    "street": "st", "str": "st",
+    "avenue": "ave", "av": "ave",
+    "boulevard": "blvd",
+    "road": "rd",
+    "place": "pl",
+    "drive": "dr",
+    "lane": "ln",
+    "square": "sq",
+    "plaza": "plz",
+    "parkway": "pkwy",
+    "east": "e", "west": "w", "north": "n", "south": "s",
+    "apartment": "apt", "suite": "ste", "floor": "fl",
+    "first": "1", "second": "2", "third": "3", "fourth": "4", "fifth": "5",
+    "sixth": "6", "seventh": "7", "eighth": "8", "ninth": "9", "tenth": "10",
+}
+_ORDINAL_RE = re.compile(r"\b(\d+)(st|nd|rd|th)\b")
+_PUNCT_RE = re.compile(r"[^\w\s#]")
+
+
+def normalize_address(address: str) -> str:
+    """
+    Cache key for a free-text address: case, whitespace, punctuation,
+    ordinals and common abbreviations folded, so "350 Fifth Avenue, NY" and
+    "350 5th ave ny" share one entry.
+    """
+    s = _PUNCT_RE.sub(" ", (address or "").lower())
+    s = _ORDINAL_RE.sub(r"\1", s)
+    return " ".join(_ADDRESS_WORDS.get(w, w) for w in s.split())
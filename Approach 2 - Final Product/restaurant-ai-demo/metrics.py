@@ -0,0 +1,204 @@
+"""
+Instrumentation shared by app.py and async_app.py: Prometheus metrics
+(served on /metrics) and the loggers that replaced the old debug prints.
+
+- stage_timer("geocode") etc. observe restaurant_stage_seconds{stage=...}
+- counters for LLM retries, empty completions, tokens and upstream errors,
+  and for cards shown vs. dish boxes loaded lazily (OpenAI spend per card)
+- cache, single-flight, circuit-breaker, hedging and rate-limit stats are exported
+  from their own counters at scrape time (see register_stats_source)
+
+Verbose per-call dumps (prompts, raw completions) go to the
+"restaurant.debug" logger and only for a sample of calls:
+DEBUG_LOG_SAMPLE_RATE (default 0.01) of them, when that logger is at DEBUG.
+
+With several worker processes each one has its own registry; set
+PROMETHEUS_MULTIPROC_DIR (prometheus_client multiprocess mode) to aggregate.
+"""
+
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+from prometheus_client.core import REGISTRY, CounterMetricFamily, GaugeMetricFamily
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+DEBUG_LOG_SAMPLE_RATE = float(os.getenv("DEBUG_LOG_SAMPLE_RATE", "0.01"))
+
+log = logging.getLogger("restaurant")
+debug_log = logging.getLogger("restaurant.debug")
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+
+STAGE_SECONDS = Histogram(
+    "restaurant_stage_seconds",
+    "Wall time of one stage of a search (upstream calls, LLM attempts, rendering).",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+SEARCH_SECONDS = Histogram(
+    "restaurant_search_seconds",
+    "Time from request start to the first card / to the complete page.",
+    ["route", "milestone"],
+    buckets=STAGE_BUCKETS,
+)
+UPSTREAM_ERRORS = Counter(
+    "restaurant_upstream_errors_total",
+    "Failed upstream calls (transport errors, HTTP errors, API error payloads).",
+    ["upstream"],
+)
+LLM_RETRIES = Counter(
+    "restaurant_llm_retries_total",
+    "Extra LLM calls: simplified-prompt retries and batched re-asks.",
+    ["mode"],
+)
+LLM_EMPTY = Counter(
+    "restaurant_llm_empty_completions_total",
+    "LLM completions that came back without usable content.",
+    ["mode"],
+)
+LLM_TOKENS = Counter(
+    "restaurant_llm_tokens_total",
+    "LLM tokens used by dish generation.",
+    ["mode", "kind"],
+)
+DISH_CARDS = Counter(
+    "restaurant_dish_cards_total",
+    "Restaurant cards shown, by dish loading (eager: dishes generated for every card).",
+    ["loading"],
+)
+SAFETY_MATCHES = Counter(
+    "restaurant_safety_matches_total",
+    "Places results looked up in the inspection index, by match (exact, fuzzy, none).",
+    ["match"],
+)
+LAZY_DISH_LOADS = Counter(
+    "restaurant_lazy_dish_loads_total",
+    "Dish boxes loaded by /dishes, by trigger and result (cached, generated, failed, unknown card).",
+    ["trigger", "result"],
+)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - t0)
+
+
+def debug_sampled() -> bool:
+    """Whether this call's verbose dumps should be logged (decide once per call)."""
+    return debug_log.isEnabledFor(logging.DEBUG) and random.random() < DEBUG_LOG_SAMPLE_RATE
+
+
+class StatsCollector:
+    """
+    Exports dict counters (TieredCache.stats(), SingleFlight.stats(),
+    CircuitBreaker.stats(), Hedger.stats(), RateLimiter.stats()) at scrape time. Sources are keyed
+    by name, so async_app's flights replace the ones app.py registered on
+    import instead of being reported twice.
+    """
+
+    def __init__(self):
+        self.caches = {}
+        self.flights = {}
+        self.breakers = {}
+        self.hedgers = {}
+        self.limiters = {}
+
+    def collect(self):
+        cache_counts = CounterMetricFamily(
+            "restaurant_cache_lookups", "Cache lookups by result.", labels=["cache", "result"]
+        )
+        cache_entries = GaugeMetricFamily(
+            "restaurant_cache_memory_entries", "Entries in the in-process cache tier.", labels=["cache"]
+        )
+        saved = CounterMetricFamily(
+            "restaurant_cache_saved_seconds", "Upstream time saved by cache hits (estimated).", labels=["cache"]
+        )
+        for cache in self.caches.values():
+            s = cache.stats()
+            for result in ("memory_hits", "disk_hits", "stale_hits", "negative_hits", "misses"):
+                cache_counts.add_metric([cache.namespace, result], s[result])
+            cache_entries.add_metric([cache.namespace], s["memory_entries"])
+            saved.add_metric([cache.namespace], s["saved_seconds"])
+
+        flight_counts = CounterMetricFamily(
+            "restaurant_singleflight_calls", "Single-flight calls by outcome.", labels=["stage", "outcome"]
+        )
+        for flight in self.flights.values():
+            s = flight.stats()
+            flight_counts.add_metric([flight.name, "executed"], s["executions"])
+            # followers that stopped waiting and called upstream themselves count as "fallback"
+            flight_counts.add_metric([flight.name, "coalesced"], s["coalesced"] - s["fallbacks"])
+            flight_counts.add_metric([flight.name, "fallback"], s["fallbacks"])
+
+        breaker_state = GaugeMetricFamily(
+            "restaurant_circuit_open", "1 while an upstream's breaker is open or half-open.", labels=["upstream"]
+        )
+        breaker_counts = CounterMetricFamily(
+            "restaurant_circuit_events", "Circuit breaker events.", labels=["upstream", "event"]
+        )
+        for breaker in self.breakers.values():
+            s = breaker.stats()
+            breaker_state.add_metric([breaker.name], 0 if s["state"] == "closed" else 1)
+            for event in ("failures", "rejected", "opened"):
+                breaker_counts.add_metric([breaker.name, event], s[event])
+
+        hedge_counts = CounterMetricFamily(
+            "restaurant_hedge_calls", "Hedged upstream calls by outcome.", labels=["stage", "outcome"]
+        )
+        hedge_after = GaugeMetricFamily(
+            "restaurant_hedge_after_seconds", "Current delay before a hedge request.", labels=["stage"]
+        )
+        for hedger in self.hedgers.values():
+            s = hedger.stats()
+            for outcome in ("calls", "hedged", "hedge_wins"):
+                hedge_counts.add_metric([hedger.name, outcome], s[outcome])
+            hedge_after.add_metric([hedger.name], s["hedge_after_seconds"])
+
+        limit_counts = CounterMetricFamily(
+            "restaurant_rate_limit_events",
+            "Rate limiter events (granted, of those leased from memory, queued, shed, throttled by a 429).",
+            labels=["limiter", "event"],
+        )
+        limit_waiting = GaugeMetricFamily(
+            "restaurant_rate_limit_waiting", "Calls currently queued for a rate-limit token.", labels=["limiter"]
+        )
+        limit_rate = GaugeMetricFamily(
+            "restaurant_rate_limit_rate", "Current adaptive request rate (per second).", labels=["limiter"]
+        )
+        for limiter in self.limiters.values():
+            s = limiter.stats()
+            for event in ("granted", "leased", "queued", "shed", "throttled"):
+                limit_counts.add_metric([limiter.name, event], s[event])
+            limit_waiting.add_metric([limiter.name], s["waiting"])
+            limit_rate.add_metric([limiter.name], s["rate"])
+
+        yield from (
+            cache_counts, cache_entries, saved, flight_counts,
+            breaker_state, breaker_counts, hedge_counts, hedge_after,
+            limit_counts, limit_waiting, limit_rate,
+        )
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def register_stats_source(caches=(), flights=(), breakers=(), hedgers=(), limiters=()):
+    stats_collector.caches.update((c.namespace, c) for c in caches)
+    stats_collector.flights.update((f.name, f) for f in flights)
+    stats_collector.breakers.update((b.name, b) for b in breakers)
+    stats_collector.hedgers.update((h.name, h) for h in hedgers)
+    stats_collector.limiters.update((lim.name, lim) for lim in limiters)
+
+
+def metrics_payload():
+    """(body, content type) for a /metrics response."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,315 @@
+"""
+Per-upstream, per-API-key rate limiting shared by every worker process.
+
+Each RateLimiter is a token bucket kept in one row of a SQLite table (the
+cache file by default), so all workers on a machine draw from the same
+quota. Its refill rate adapts AIMD-style:
+
+- every successful call nudges the rate back up by `increase` (up to the
+  ceiling, which rate-limit headers can lower to the real quota)
+- a 429 halves it and pauses the bucket for Retry-After (or the reset time
+  in x-ratelimit-* headers)
+
+acquire(priority="high") queues for a token for up to max_wait seconds;
+acquire(priority="low") never waits and only proceeds while the bucket is
+more than low_reserve full, so optional work (retries, re-asks) is shed
+first and the quota goes to first attempts. Both raise RateLimited when
+they give up.
+
+Each bucket update is a SQLite write transaction, so a high-priority grant
+also leases up to lease_seconds worth of extra tokens (rate * lease_seconds,
+at least 1) to this process; the next calls take those from memory without
+touching SQLite. Leased tokens not used within lease_seconds are handed back
+on the next bucket update, and a 429 drops them.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from cache import CACHE_DB_PATH
+
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH", CACHE_DB_PATH)
+RATE_LIMIT_LEASE_SECONDS = float(os.getenv("RATE_LIMIT_LEASE_SECONDS", "0.1"))
+
+
+class RateLimited(Exception):
+    pass
+
+
+def key_fingerprint(api_key: str | None) -> str:
+    """Short, non-reversible id of an API key for bucket names."""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: str | None) -> float | None:
+    """Retry-After / x-ratelimit-reset-* value ("2", "1.5s", "6m0s", "20ms") -> seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _DURATION_SECONDS[unit] for n, unit in parts)
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: float | None = None,
+        min_rate: float | None = None,
+        increase: float | None = None,
+        low_reserve: float = 0.5,
+        lease_seconds: float = RATE_LIMIT_LEASE_SECONDS,
+        db_path: str = RATE_LIMIT_DB_PATH,
+        clock=time.time,
+    ):
+        """
+        rate: requests per second at most (the configured quota ceiling).
+        burst: bucket size, default one second of rate.
+        increase: rate added back per successful call, default 2% of rate.
+        lease_seconds: how much quota one grant may lease to this process (0: none).
+        """
+        self.name = name
+        self.ceiling = rate
+        self.burst = burst or max(rate, 1.0)
+        self.min_rate = min_rate or max(rate / 20, 0.05)
+        self.increase = increase or rate * 0.02
+        self.low_reserve = low_reserve
+        self.lease_seconds = lease_seconds
+        self.db_path = db_path
+        self.clock = clock
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._successes = 0
+        # tokens taken from the shared bucket for this process, not used yet
+        self._leased = 0
+        self._lease_expires_at = 0.0
+        # requests/second quota from the last x-ratelimit-limit-requests header
+        self._quota = None
+        self.rate = rate
+        self.counters = {"granted": 0, "queued": 0, "shed": 0, "throttled": 0, "waiting": 0, "leased": 0}
+
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            " name TEXT PRIMARY KEY,"
+            " tokens REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " rate REAL NOT NULL,"
+            " ceiling REAL NOT NULL,"
+            " paused_until REAL NOT NULL)"
+        )
+        # a restart with a new configured rate replaces the stored ceiling
+        conn.execute(
+            "INSERT INTO rate_buckets VALUES (?, ?, ?, ?, ?, 0)"
+            " ON CONFLICT(name) DO UPDATE SET ceiling = excluded.ceiling, rate = MIN(rate, excluded.ceiling)",
+            (name, self.burst, clock(), rate, rate),
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _update(self, fn):
+        """Run fn(state dict) -> result inside one write transaction on this bucket's row."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated_at, rate, ceiling, paused_until FROM rate_buckets WHERE name = ?",
+                (self.name,),
+            ).fetchone()
+            now = self.clock()
+            state = dict(zip(("tokens", "updated_at", "rate", "ceiling", "paused_until"), row))
+            with self._lock:
+                successes, self._successes = self._successes, 0
+                unused, self._leased = self._leased, 0
+                quota = self._quota
+            if quota is not None:
+                state["ceiling"] = min(self.ceiling, quota)
+            state["rate"] = min(state["ceiling"], state["rate"] + successes * self.increase)
+            refill = max(now - state["updated_at"], 0) * state["rate"]
+            state["tokens"] = min(self.burst, state["tokens"] + refill + unused)
+            state["updated_at"] = now
+
+            result = fn(state, now)
+
+            conn.execute(
+                "UPDATE rate_buckets SET tokens = ?, updated_at = ?, rate = ?, ceiling = ?, paused_until = ?"
+                " WHERE name = ?",
+                (state["tokens"], state["updated_at"], state["rate"], state["ceiling"], state["paused_until"], self.name),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.rate = state["rate"]
+        return result
+
+    def _take(self, priority: str):
+        """One attempt at a token -> seconds to wait before trying again (0: granted, None: shed)."""
+        lease = 0
+
+        def take(state, now):
+            nonlocal lease
+            if now < state["paused_until"]:
+                return None if priority == "low" else state["paused_until"] - now
+            floor = 1.0 + (self.burst * self.low_reserve if priority == "low" else 0.0)
+            if state["tokens"] >= floor:
+                state["tokens"] -= 1.0
+                if priority == "high":
+                    lease = max(min(int(state["rate"] * self.lease_seconds) - 1, int(state["tokens"])), 0)
+                    state["tokens"] -= lease
+                return 0.0
+            if priority == "low":
+                return None
+            return (1.0 - state["tokens"]) / state["rate"]
+
+        wait = self._update(take)
+        if lease:
+            with self._lock:
+                self._leased = lease
+                self._lease_expires_at = self.clock() + self.lease_seconds
+        return wait
+
+    def _take_leased(self) -> bool:
+        """Use a token this process already holds (no SQLite); False if there is none."""
+        with self._lock:
+            if self._leased <= 0 or self.clock() >= self._lease_expires_at:
+                return False
+            self._leased -= 1
+            self.counters["leased"] += 1
+            return True
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def _give_up(self):
+        self._count("shed")
+        raise RateLimited(self.name)
+
+    def acquire(self, priority: str = "high", max_wait: float | None = None):
+        """Take one token, queueing (high priority) for at most max_wait seconds."""
+        if priority == "high" and self._take_leased():
+            self._count("granted")
+            return
+        give_up_at = None if max_wait is None else time.monotonic() + max_wait
+        self._count("waiting")
+        try:
+            queued = False
+            while True:
+                wait = self._take(priority)
+                if wait == 0.0:
+                    self._count("granted")
+                    return
+                if wait is None or (give_up_at is not None and time.monotonic() + wait > give_up_at):
+                    self._give_up()
+                if not queued:
+                    queued = True
+                    self._count("queued")
+                time.sleep(wait)
+        finally:
+            self._count("waiting", -1)
+
+    async def acquire_async(self, priority: str = "high", max_wait: float | None = None):
+        """acquire for an event loop: the SQLite step runs in a thread, the wait is an asyncio.sleep."""
+        if priority == "high" and self._take_leased():
+            self._count("granted")
+            return
+        give_up_at = None if max_wait is None else time.monotonic() + max_wait
+        self._count("waiting")
+        try:
+            queued = False
+            while True:
+                wait = await asyncio.to_thread(self._take, priority)
+                if wait == 0.0:
+                    self._count("granted")
+                    return
+                if wait is None or (give_up_at is not None and time.monotonic() + wait > give_up_at):
+                    self._give_up()
+                if not queued:
+                    queued = True
+                    self._count("queued")
+                await asyncio.sleep(wait)
+        finally:
+            self._count("waiting", -1)
+
+    def record_success(self):
+        """Additive increase; applied on this process's next bucket update."""
+        with self._lock:
+            self._successes += 1
+
+    def record_throttle(self, retry_after: float | None = None):
+        """Upstream said 429: halve the rate and pause for retry_after (default one token's time)."""
+        self._count("throttled")
+        with self._lock:
+            self._leased = 0
+
+        def throttle(state, now):
+            state["rate"] = max(self.min_rate, state["rate"] / 2)
+            state["tokens"] = min(state["tokens"], 0.0)
+            pause = retry_after if retry_after is not None else 1.0 / state["rate"]
+            state["paused_until"] = max(state["paused_until"], now + pause)
+
+        self._update(throttle)
+
+    def observe_headers(self, headers):
+        """
+        Apply rate-limit response headers: x-ratelimit-limit-requests (per
+        minute) lowers the ceiling to the real quota, from this process's
+        next bucket update on (it comes with every response, so it is not
+        written by itself); remaining 0 with a reset time pauses the bucket
+        until then, at once.
+        """
+        limit = headers.get("x-ratelimit-limit-requests")
+        if limit is not None:
+            try:
+                quota = float(limit) / 60.0
+            except ValueError:
+                pass
+            else:
+                with self._lock:
+                    self._quota = quota
+        pause = None
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is not None and remaining.strip() == "0":
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                if reset is not None:
+                    pause = max(pause or 0.0, reset)
+        if pause is None:
+            return
+
+        def apply(state, now):
+            state["paused_until"] = max(state["paused_until"], now + pause)
+
+        self._update(apply)
+
+    def stats(self) -> dict:
+        with self._lock:
+            c = dict(self.counters)
+        c["rate"] = self.rate
+        return c
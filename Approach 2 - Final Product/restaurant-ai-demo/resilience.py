@@ -0,0 +1,273 @@
+"""
+Bounding how long a search can wait on its upstreams.
+
+- Deadline: one total budget per request; each stage's timeout is its own
+  cap or whatever is left of the budget, whichever is smaller
+- CircuitBreaker: after failure_threshold consecutive failures an upstream
+  is skipped (CircuitOpenError, no network call) for reset_seconds, then one
+  probe call decides whether it closes again
+- Hedger: if a call has not answered after the recent p95 latency of that
+  call, a second identical call is started and the first answer wins
+
+Like singleflight.py, each object has a name and a stats() dict that
+metrics.py exports. Hedger.call is for threads (app.py), Hedger.call_async
+for one event loop (async_app.py).
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class Deadline:
+    def __init__(self, seconds: float, clock=time.monotonic):
+        self.clock = clock
+        self.expires_at = clock() + seconds
+
+    def remaining(self) -> float:
+        return max(self.expires_at - self.clock(), 0.0)
+
+    def timeout(self, cap: float) -> float:
+        """Timeout for the next stage: cap, shortened to the remaining budget."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded()
+        return min(cap, remaining)
+
+
+def stage_timeout(deadline: Deadline | None, cap: float) -> float:
+    """deadline.timeout(cap), or just cap for calls outside a request (refreshes, warmup)."""
+    return cap if deadline is None else deadline.timeout(cap)
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30.0, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self.counters = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self.clock() - self._opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; in half-open state only one probe at a time."""
+        with self._lock:
+            state = self._state()
+            if state == "closed" or (state == "half_open" and not self._probing):
+                self._probing = state == "half_open"
+                self.counters["calls"] += 1
+                return True
+            self.counters["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.counters["failures"] += 1
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probing:
+                    self.counters["opened"] += 1
+                self._opened_at = self.clock()
+            self._probing = False
+
+    def call(self, fn, ignore=()):
+        """
+        fn() through the breaker; any exception counts as a failure and is
+        re-raised, except those in ignore (answers from a healthy upstream,
+        e.g. rate-limit errors, which ratelimit.py handles).
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        try:
+            result = fn()
+        except ignore:
+            self.record_success()
+            raise
+        except BaseException:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    async def call_async(self, coro_fn, ignore=()):
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        try:
+            result = await coro_fn()
+        except ignore:
+            self.record_success()
+            raise
+        except BaseException:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            c = dict(self.counters)
+            c["state"] = self._state()
+            c["consecutive_failures"] = self._failures
+        return c
+
+
+class Hedger:
+    def __init__(
+        self,
+        name: str,
+        quantile: float = 0.95,
+        window: int = 200,
+        min_samples: int = 20,
+        default_after: float = 1.0,
+    ):
+        """
+        Until min_samples answers have been seen the hedge goes out after
+        default_after seconds; afterwards after the quantile of the last
+        `window` latencies.
+        """
+        self.name = name
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.default_after = default_after
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.counters = {"calls": 0, "hedged": 0, "hedge_wins": 0}
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def hedge_after(self) -> float:
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < self.min_samples:
+            return self.default_after
+        return samples[min(int(self.quantile * len(samples)), len(samples) - 1)]
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _timed(self, fn):
+        t0 = time.perf_counter()
+        result = fn()
+        if result is not None:
+            self.observe(time.perf_counter() - t0)
+        return result
+
+    def call(self, fn, executor, timeout: float | None = None):
+        """
+        fn() on executor, plus a second fn() if the first is slower than
+        hedge_after(). fn returns None on failure; the first non-None result
+        is returned (None if every attempt failed or timeout ran out). Losing
+        attempts are left to finish on their own.
+        """
+        self._count("calls")
+        started = time.monotonic()
+        first = executor.submit(self._timed, fn)
+        attempts = [first]
+
+        done, _ = wait(attempts, timeout=self._wait_for(self.hedge_after(), timeout, started))
+        if not done and not self._expired(timeout, started):
+            self._count("hedged")
+            attempts.append(executor.submit(self._timed, fn))
+
+        pending = set(attempts)
+        while pending:
+            done, pending = wait(pending, timeout=self._wait_for(None, timeout, started), return_when=FIRST_COMPLETED)
+            if not done:
+                return None
+            for f in done:
+                result = f.result() if f.exception() is None else None
+                if result is not None:
+                    if f is not first:
+                        self._count("hedge_wins")
+                    return result
+        return None
+
+    async def call_async(self, coro_fn, timeout: float | None = None):
+        """Same as call, with coro_fn() run as tasks; the losing attempt is cancelled."""
+        self._count("calls")
+        started = time.monotonic()
+
+        async def timed():
+            t0 = time.perf_counter()
+            result = await coro_fn()
+            if result is not None:
+                self.observe(time.perf_counter() - t0)
+            return result
+
+        first = asyncio.ensure_future(timed())
+        attempts = [first]
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=self._wait_for(self.hedge_after(), timeout, started))
+            if not done and not self._expired(timeout, started):
+                self._count("hedged")
+                attempts.append(asyncio.ensure_future(timed()))
+
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=self._wait_for(None, timeout, started), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    return None
+                for t in done:
+                    result = t.result() if t.exception() is None else None
+                    if result is not None:
+                        if t is not first:
+                            self._count("hedge_wins")
+                        return result
+            return None
+        finally:
+            for t in attempts:
+                t.cancel()
+
+    @staticmethod
+    def _wait_for(hedge_after, timeout, started):
+        """Seconds to wait next: until the hedge point and/or what is left of timeout."""
+        left = None if timeout is None else max(timeout - (time.monotonic() - started), 0.0)
+        if hedge_after is None:
+            return left
+        return hedge_after if left is None else min(hedge_after, left)
+
+    @staticmethod
+    def _expired(timeout, started) -> bool:
+        return timeout is not None and time.monotonic() - started >= timeout
+
+    def stats(self) -> dict:
+        with self._lock:
+            c = dict(self.counters)
+        c["hedge_after_seconds"] = self.hedge_after()
+        return c
@@ -0,0 +1,315 @@
+"""
+Food-safety flags for Google Places results, from the DOHMH inspection
+dataset Approach 1 uses (manhattan_restaurants.csv: one row per CAMIS with
+its latest CRITICALFLAG; see Approach 1/ingest_inspections.py).
+
+Lookups never call a service:
+
+- exact: hash of normalized name + building + street + ZIP, so
+  "Joe's Pizza, 7 Carmine St, New York, NY 10014" finds
+  JOE'S PIZZA / 7 / CARMINE STREET / 10014
+- fuzzy fallback: restaurants in the same ZIP that share name trigrams,
+  best Dice similarity (same building as a tie-breaker), accepted above
+  SAFETY_FUZZY_MIN_SCORE
+
+The index is pickled to SAFETY_INDEX_PATH together with a fingerprint of
+every CSV row. When the CSV changes (a re-run of ingest_inspections.py)
+only added, changed and removed restaurants are re-indexed. The app loads
+and updates it on a background thread and swaps the new index in when it
+is ready, so lookups never wait for a build.
+
+    python safety_index.py                 # build / update the index
+    python safety_index.py --lookup "Joe's Pizza" "7 Carmine St, New York, NY 10014"
+"""
+
+import argparse
+import csv
+import hashlib
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+
+from metrics import log
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SAFETY_DATA_PATH = os.getenv(
+    "SAFETY_DATA_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(HERE)), "Approach 1", "manhattan_restaurants.csv"),
+)
+SAFETY_INDEX_PATH = os.getenv("SAFETY_INDEX_PATH", "safety_index.pickle")
+SAFETY_FUZZY_MIN_SCORE = float(os.getenv("SAFETY_FUZZY_MIN_SCORE", "0.6"))
+# how often (seconds) lookups have the CSV checked for a refresh
+SAFETY_CHECK_SECONDS = float(os.getenv("SAFETY_CHECK_SECONDS", "60"))
+
+INDEX_FORMAT_VERSION = 1
+# CSV column -> record field (the history columns only exist after ingest_inspections.py)
+RECORD_COLUMNS = {
+    "RESTAURANT": "name",
+    "CRITICALFLAG": "flag",
+    "INSPECTION_DATE": "inspection_date",
+    "CRITICAL_VIOLATIONS": "critical_violations",
+    "LAST_CRITICAL_DATE": "last_critical_date",
+}
+
+# Google ("W 53rd St") and DOHMH ("WEST 53 STREET") spellings -> one form
+STREET_WORDS = {
+    "WEST": "W", "EAST": "E", "NORTH": "N", "SOUTH": "S",
+    "STREET": "ST", "AVENUE": "AVE", "AV": "AVE", "PLACE": "PL", "ROAD": "RD",
+    "BOULEVARD": "BLVD", "DRIVE": "DR", "LANE": "LN", "PARKWAY": "PKWY",
+    "SQUARE": "SQ", "TERRACE": "TER", "PLAZA": "PLZ", "COURT": "CT",
+    "FIRST": "1", "SECOND": "2", "THIRD": "3", "FOURTH": "4", "FIFTH": "5",
+    "SIXTH": "6", "SEVENTH": "7", "EIGHTH": "8", "NINTH": "9", "TENTH": "10",
+}
+NAME_STOPWORDS = {"THE", "RESTAURANT", "INC", "LLC", "CORP"}
+ORDINAL = re.compile(r"\b(\d+)(ST|ND|RD|TH)\b")
+ZIP_RE = re.compile(r"\b(\d{5})(?:-\d{4})?\b")
+
+
+# =====================================
+# Normalization
+# =====================================
+def _words(text: str) -> list:
+    text = (text or "").upper().replace("&", " AND ").replace("'", "").replace("’", "")
+    return re.sub(r"[^A-Z0-9 ]+", " ", text).split()
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(w for w in _words(name) if w not in NAME_STOPWORDS)
+
+
+def normalize_street(street: str) -> str:
+    street = ORDINAL.sub(r"\1", " ".join(_words(street)))
+    return " ".join(STREET_WORDS.get(w, w) for w in street.split())
+
+
+def normalize_zip(value) -> str:
+    match = ZIP_RE.search(str(value or "").split(".")[0])
+    return match.group(1) if match else ""
+
+
+def parse_address(address: str):
+    """Google formattedAddress -> (building, street, zip); parts it cannot find are ''."""
+    parts = [p.strip() for p in (address or "").split(",")]
+    street_part = parts[0].split("#")[0] if parts else ""
+    match = re.match(r"\s*(\d+[A-Za-z]?(?:-\d+[A-Za-z]?)?)\s+(.*)", street_part)
+    building, street = (match.group(1), match.group(2)) if match else ("", street_part)
+    zips = [z for p in parts[1:] for z in ZIP_RE.findall(p)]
+    return building.upper(), normalize_street(street), zips[-1] if zips else ""
+
+
+def record_key(name: str, building: str, street: str, zipcode: str) -> str:
+    """Exact-match key of normalized name + building + street + ZIP."""
+    raw = "|".join((normalize_name(name), building.upper(), street, zipcode))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def dice(a: set, b: set) -> float:
+    return 2 * len(a & b) / (len(a) + len(b)) if a and b else 0.0
+
+
+# =====================================
+# Index
+# =====================================
+class SafetyIndex:
+    def __init__(self):
+        self.source = None       # (mtime_ns, size) of the CSV this reflects
+        self.fingerprints = {}   # CAMIS -> hash of its CSV row
+        self.records = {}        # CAMIS -> record dict
+        self.exact = {}          # record_key -> set of CAMIS
+        self.by_trigram = {}     # (zip, trigram) -> set of CAMIS
+
+    def _add(self, camis: str, row: dict):
+        building = (row.get("BUILDING") or "").strip().upper()
+        street = normalize_street(row.get("STREET"))
+        zipcode = normalize_zip(row.get("ZIPCODE"))
+        name = normalize_name(row.get("RESTAURANT"))
+        record = {field: (row.get(col) or "").strip() or None for col, field in RECORD_COLUMNS.items()}
+        record.update(camis=camis, building=building, street=street, zip=zipcode, name_trigrams=trigrams(name))
+        record["key"] = record_key(row.get("RESTAURANT"), building, street, zipcode)
+
+        self.records[camis] = record
+        self.exact.setdefault(record["key"], set()).add(camis)
+        for gram in record["name_trigrams"]:
+            self.by_trigram.setdefault((zipcode, gram), set()).add(camis)
+
+    def _remove(self, camis: str):
+        record = self.records.pop(camis)
+        self.exact[record["key"]].discard(camis)
+        if not self.exact[record["key"]]:
+            del self.exact[record["key"]]
+        for gram in record["name_trigrams"]:
+            ids = self.by_trigram[(record["zip"], gram)]
+            ids.discard(camis)
+            if not ids:
+                del self.by_trigram[(record["zip"], gram)]
+
+    def update_from_csv(self, path: str) -> dict:
+        """Bring the index in line with the CSV, re-indexing only rows that changed -> counts."""
+        stat = os.stat(path)
+        rows = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                camis = (row.get("CAMIS") or "").strip()
+                if camis:
+                    rows[camis] = row
+
+        counts = {"added": 0, "changed": 0, "removed": 0}
+        for camis in list(self.fingerprints):
+            if camis not in rows:
+                self._remove(camis)
+                del self.fingerprints[camis]
+                counts["removed"] += 1
+        for camis, row in rows.items():
+            fingerprint = hashlib.sha1(repr(sorted(row.items())).encode("utf-8")).hexdigest()
+            old = self.fingerprints.get(camis)
+            if old == fingerprint:
+                continue
+            if old is not None:
+                self._remove(camis)
+            self._add(camis, row)
+            self.fingerprints[camis] = fingerprint
+            counts["changed" if old else "added"] += 1
+
+        self.source = (stat.st_mtime_ns, stat.st_size)
+        return counts
+
+    def _latest(self, camis_ids):
+        """Several restaurants with the same key (new owners, same name): the latest inspected."""
+        return max((self.records[c] for c in camis_ids), key=lambda r: r["inspection_date"] or "")
+
+    def lookup(self, name: str, address: str):
+        """(record, "exact" | "fuzzy") for a Places result, or (None, None)."""
+        building, street, zipcode = parse_address(address)
+        ids = self.exact.get(record_key(name, building, street, zipcode))
+        if ids:
+            return self._latest(ids), "exact"
+        if not zipcode:
+            return None, None
+
+        grams = trigrams(normalize_name(name))
+        candidates = set()
+        for gram in grams:
+            candidates |= self.by_trigram.get((zipcode, gram), set())
+        best, best_score = None, 0.0
+        for camis in candidates:
+            record = self.records[camis]
+            score = dice(grams, record["name_trigrams"])
+            if building and record["building"] == building:
+                score += 0.1
+            if score > best_score:
+                best, best_score = record, score
+        if best is None or best_score < SAFETY_FUZZY_MIN_SCORE:
+            return None, None
+        return best, "fuzzy"
+
+    def save(self, path: str):
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump({"version": INDEX_FORMAT_VERSION, "index": self.__dict__}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "SafetyIndex":
+        index = cls()
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        if data.get("version") == INDEX_FORMAT_VERSION:
+            index.__dict__.update(data["index"])
+        return index
+
+
+def data_source(path: str):
+    """(mtime_ns, size) of the CSV, None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_or_build(data_path: str = SAFETY_DATA_PATH, index_path: str = SAFETY_INDEX_PATH) -> SafetyIndex:
+    """The saved index, updated (and re-saved) if the CSV changed since; empty if there is no CSV."""
+    try:
+        index = SafetyIndex.load(index_path)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        index = SafetyIndex()
+    source = data_source(data_path)
+    if source is None:
+        log.warning("Safety dataset %s not found, no inspection flags will be shown", data_path)
+        return index
+
+    if index.source != source:
+        t0 = time.perf_counter()
+        counts = index.update_from_csv(data_path)
+        log.info("Safety index updated from %s in %.2fs: %s", data_path, time.perf_counter() - t0, counts)
+        try:
+            index.save(index_path)
+        except OSError as e:
+            log.warning("Could not save safety index to %s: %r", index_path, e)
+    return index
+
+
+# empty until the first load finishes; replaced whole, never modified in place
+_index = SafetyIndex()
+_index_checked_at = None
+_index_lock = threading.Lock()
+_refreshing = False
+
+
+def _refresh():
+    global _index, _index_checked_at, _refreshing
+    try:
+        if _index_checked_at is None or _index.source != data_source(SAFETY_DATA_PATH):
+            _index = load_or_build(SAFETY_DATA_PATH, SAFETY_INDEX_PATH)
+    except Exception as e:
+        log.warning("Safety index refresh failed, keeping the current one: %r", e)
+    finally:
+        _index_checked_at = time.monotonic()
+        _refreshing = False
+
+
+def refresh_safety_index() -> threading.Thread | None:
+    """Load (or update) the index on a background thread unless one is already at it."""
+    global _refreshing
+    with _index_lock:
+        if _refreshing:
+            return None
+        _refreshing = True
+    thread = threading.Thread(target=_refresh, name="safety-index", daemon=True)
+    thread.start()
+    return thread
+
+
+def safety_index() -> SafetyIndex:
+    """
+    Process-wide index, without waiting: empty until the first load is done,
+    and checked for a refreshed CSV in the background at most every
+    SAFETY_CHECK_SECONDS.
+    """
+    if _index_checked_at is None or time.monotonic() - _index_checked_at >= SAFETY_CHECK_SECONDS:
+        refresh_safety_index()
+    return _index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=SAFETY_DATA_PATH)
+    parser.add_argument("--index", default=SAFETY_INDEX_PATH)
+    parser.add_argument("--lookup", nargs=2, metavar=("NAME", "ADDRESS"))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    idx = load_or_build(args.data, args.index)
+    print(f"{len(idx.records)} restaurants indexed")
+    if args.lookup:
+        t0 = time.perf_counter()
+        record, match = idx.lookup(*args.lookup)
+        print(f"{match or 'no match'} ({(time.perf_counter() - t0) * 1e6:.0f} µs): {record}")
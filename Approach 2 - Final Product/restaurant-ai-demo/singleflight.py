@@ -0,0 +1,119 @@
+"""
+Request coalescing ("single flight"): concurrent calls with the same key
+share one execution. The first caller runs the function; callers arriving
+while it is in flight wait for it and get the same result (or exception).
+Nothing is remembered after the call finishes; that is the caches' job.
+
+A waiting caller can bound its wait (timeout=, normally what is left of its
+request's Deadline for the stage): if the shared call has not finished by
+then, it stops waiting and calls fn() itself, so a slow or stuck leader
+never holds its followers past their own budgets.
+
+SingleFlight is for threads (app.py), AsyncSingleFlight for one event loop
+(async_app.py).
+"""
+
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class _Counters:
+    def __init__(self, name: str):
+        self.name = name
+        self.counters = {"calls": 0, "executions": 0, "coalesced": 0, "in_flight": 0, "fallbacks": 0}
+
+    def stats(self) -> dict:
+        c = dict(self.counters)
+        # every coalesced call is an upstream call that was not made,
+        # unless the caller gave up waiting and made it after all
+        c["saved_calls"] = c["coalesced"] - c["fallbacks"]
+        return c
+
+
+class SingleFlight(_Counters):
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, timeout: float | None = None):
+        """fn() shared with concurrent callers of key; a follower waits at most timeout seconds for it."""
+        with self._lock:
+            self.counters["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.counters["executions"] += 1
+                self.counters["in_flight"] += 1
+            else:
+                self.counters["coalesced"] += 1
+
+        if not leader:
+            if not call.done.wait(timeout):
+                with self._lock:
+                    self.counters["fallbacks"] += 1
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                self.counters["in_flight"] -= 1
+            call.done.set()
+        return call.value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return super().stats()
+
+
+class AsyncSingleFlight(_Counters):
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._tasks = {}
+
+    async def do(self, key, coro_fn, timeout: float | None = None):
+        """
+        coro_fn() runs as its own task, so a caller that is cancelled (e.g.
+        its client disconnected) does not cancel it for the others. A
+        follower waits at most timeout seconds for it.
+        """
+        self.counters["calls"] += 1
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_fn())
+            self._tasks[key] = task
+            self.counters["executions"] += 1
+            self.counters["in_flight"] += 1
+
+            def finished(_task, key=key):
+                self._tasks.pop(key, None)
+                self.counters["in_flight"] -= 1
+
+            task.add_done_callback(finished)
+        else:
+            self.counters["coalesced"] += 1
+            try:
+                return await asyncio.wait_for(asyncio.shield(task), timeout)
+            except asyncio.TimeoutError:
+                self.counters["fallbacks"] += 1
+                return await coro_fn()
+
+        return await asyncio.shield(task)
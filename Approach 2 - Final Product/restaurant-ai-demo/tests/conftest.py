@@ -0,0 +1,57 @@
+"""
+Shared setup: app.py is configured (at import time) to call
+bench/stub_upstreams.py on a free port, and the `stub` fixture runs it.
+"""
+
+import os
+import socket
+import sys
+import tempfile
+import threading
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.join(APP_DIR, "bench"))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+STUB_PORT = free_port()
+STUB_URL = f"http://127.0.0.1:{STUB_PORT}"
+STATE_DIR = tempfile.mkdtemp()
+
+os.environ.update(
+    GOOGLE_GEOCODE_URL=f"{STUB_URL}/maps/api/geocode/json",
+    GOOGLE_PLACES_BASE_URL=f"{STUB_URL}/v1",
+    OPENAI_BASE_URL=f"{STUB_URL}/v1",
+    OPENAI_API_KEY="stub",
+    GOOGLE_MAPS_API_KEY="stub",
+    CACHE_DB_PATH=os.path.join(STATE_DIR, "cache.sqlite3"),
+    SAFETY_INDEX_PATH=os.path.join(STATE_DIR, "safety_index.pickle"),
+    BREAKER_FAILURE_THRESHOLD="3",
+)
+
+from stub_upstreams import serve  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(scope="session")
+def stub():
+    server = serve(port=STUB_PORT)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
@@ -0,0 +1,95 @@
+"""
+async_app.py: the async cache methods keep SQLite off the event loop, and
+a search through the Quart app works end to end against the stubs.
+
+    python -m pytest tests
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+import async_app
+from cache import MISSING, TieredCache
+from conftest import FakeClock
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "cache.sqlite3")
+
+
+def test_disk_reads_run_off_the_event_loop(clock, db_path):
+    TieredCache("t", ttl=60, db_path=db_path, clock=clock).set("k", [1, 2])
+    cache = TieredCache("t", ttl=60, db_path=db_path, clock=clock)
+    disk_get = cache.disk.get
+    threads = []
+
+    def recording_get(key):
+        threads.append(threading.get_ident())
+        return disk_get(key)
+
+    cache.disk.get = recording_get
+
+    async def lookups():
+        loop_thread = threading.get_ident()
+        first = await cache.get_async("k")
+        second = await cache.get_async("k")
+        missing = await cache.get_async("other")
+        return loop_thread, first, second, missing
+
+    loop_thread, first, second, missing = asyncio.run(lookups())
+    assert first == second == [1, 2]
+    assert missing is MISSING
+    # the promoted entry is answered from memory; only the two misses touched SQLite
+    assert len(threads) == 2
+    assert loop_thread not in threads
+    assert cache.stats()["memory_hits"] == 1
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_async_stale_value_is_served_while_one_refresh_runs(clock, db_path):
+    cache = TieredCache("t", ttl=60, stale_ttl=600, db_path=db_path, clock=clock)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return f"v{len(calls)}"
+
+    async def reads():
+        tasks = []
+        assert await cache.get_or_compute_async("k", compute, spawn=tasks.append) == "v1"
+        clock.now += 61
+        assert await cache.get_or_compute_async("k", compute, spawn=tasks.append) == "v1"
+        assert await cache.get_or_compute_async("k", compute, spawn=tasks.append) == "v1"
+        assert len(tasks) == 1
+        await tasks[0]
+        return await cache.get_or_compute_async("k", compute, spawn=tasks.append)
+
+    assert asyncio.run(reads()) == "v2"
+    assert len(calls) == 2
+
+
+def test_async_search_renders_and_reuses_the_caches(stub):
+    stub.faults.clear()
+    form = {"address": "Async Avenue 7, New York", "cuisine": "japanese", "radius": "1"}
+
+    async def two_searches():
+        async with async_app.app.test_app() as test_app:
+            client = test_app.test_client()
+            first = await client.post("/search", form=form)
+            second = await client.post("/search", form=form)
+            return first.status_code, await first.get_data(as_text=True), await second.get_data(as_text=True)
+
+    status, first, second = asyncio.run(two_searches())
+    assert status == 200
+    assert "dish-list" in first
+    assert first.count("dish-list") == second.count("dish-list")
+    assert stub.faults.requests["geocode"] == 1
+    assert stub.faults.requests["places_search"] == 1
@@ -0,0 +1,169 @@
+"""
+cache.py TieredCache on a FakeClock: TTLs, negative entries, the SQLite
+tier behind the LRU and address key normalization; stale-while-revalidate
+reads; Places results cached per grid cell.
+
+    python -m pytest tests
+"""
+
+import pytest
+
+import app
+from cache import MISSING, TieredCache, normalize_address
+from conftest import FakeClock
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "cache.sqlite3")
+
+
+def test_entry_expires_after_ttl(clock, db_path):
+    cache = TieredCache("t", ttl=60, db_path=db_path, clock=clock)
+    cache.set("k", {"lat": 1})
+    clock.now += 59
+    assert cache.get("k") == {"lat": 1}
+    clock.now += 1
+    assert cache.get("k") is MISSING
+    assert cache.stats()["misses"] == 1
+
+
+def test_negative_entries_use_their_own_ttl(clock, db_path):
+    cache = TieredCache("t", ttl=600, negative_ttl=30, db_path=db_path, clock=clock)
+    cache.set_negative("nowhere")
+    assert cache.get("nowhere") is None
+    assert cache.stats()["negative_hits"] == 1
+    clock.now += 30
+    assert cache.get("nowhere") is MISSING
+
+    no_negatives = TieredCache("n", ttl=600, db_path=db_path, clock=clock)
+    no_negatives.set_negative("nowhere")
+    assert no_negatives.get("nowhere") is MISSING
+
+
+def test_disk_tier_is_shared_and_promoted_to_memory(clock, db_path):
+    TieredCache("t", ttl=60, db_path=db_path, clock=clock).set("k", [1, 2])
+
+    # another worker (or a restart) finds it on disk, then in its own LRU
+    other = TieredCache("t", ttl=60, db_path=db_path, clock=clock)
+    assert other.get("k") == [1, 2]
+    assert other.get("k") == [1, 2]
+    stats = other.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["memory_entries"]) == (1, 1, 1)
+
+    clock.now += 60
+    assert TieredCache("t", ttl=60, db_path=db_path, clock=clock).get("k") is MISSING
+
+
+def test_lru_evicts_least_recently_used(clock):
+    cache = TieredCache("t", ttl=60, maxsize=2, db_path=None, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, MISSING, 3)
+
+
+@pytest.mark.parametrize("a, b", [
+    ("350 Fifth Avenue, NY", "350 5th ave ny"),
+    ("  Times Square,   New York ", "times sq new york"),
+    ("200 West 42nd Street", "200 w 42 st"),
+])
+def test_equivalent_addresses_share_a_key(a, b):
+    assert normalize_address(a) == normalize_address(b)
+
+
+def test_different_addresses_keep_different_keys():
+    assert normalize_address("1 E 1st St") != normalize_address("1 W 1st St")
+
+
+# =====================================
+# Stale-while-revalidate
+# =====================================
+class QueuedExecutor:
+    """Runs submitted refreshes only when the test says so."""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn):
+        self.jobs.append(fn)
+
+    def run(self):
+        jobs, self.jobs = self.jobs, []
+        for fn in jobs:
+            fn()
+
+
+def test_stale_value_is_served_while_one_refresh_runs(clock, db_path):
+    cache = TieredCache("t", ttl=60, stale_ttl=600, db_path=db_path, clock=clock)
+    executor = QueuedExecutor()
+    calls = []
+
+    def compute():
+        calls.append(clock.now)
+        return f"v{len(calls)}"
+
+    assert cache.get_or_compute("k", compute, executor) == "v1"
+    clock.now += 61
+    assert cache.get_or_compute("k", compute, executor) == "v1"
+    assert cache.get_or_compute("k", compute, executor) == "v1"
+    assert len(executor.jobs) == 1 and len(calls) == 1
+
+    executor.run()
+    assert cache.get_or_compute("k", compute, executor) == "v2"
+    assert cache.stats()["refreshes"] == 1 and not executor.jobs
+
+    # past the stale window the read blocks on compute() again
+    clock.now += 61 + 600
+    assert cache.get_or_compute("k", compute, executor) == "v3"
+
+
+def test_failed_results_are_not_cached(clock, db_path):
+    cache = TieredCache("t", ttl=60, stale_ttl=600, db_path=db_path, clock=clock)
+    results = iter([None, "", "ok"])
+    assert cache.get_or_compute("k", lambda: next(results)) is None
+    assert cache.get_or_compute("k", lambda: next(results)) == ""
+    assert cache.get_or_compute("k", lambda: next(results)) == "ok"
+    assert cache.stats()["upstream_calls"] == 3
+
+
+def test_failed_refresh_keeps_the_stale_value(clock, db_path):
+    cache = TieredCache("t", ttl=60, stale_ttl=600, db_path=db_path, clock=clock)
+    executor = QueuedExecutor()
+    cache.set("k", "old")
+    clock.now += 61
+
+    def broken():
+        raise RuntimeError("upstream down")
+
+    assert cache.get_or_compute("k", broken, executor) == "old"
+    executor.run()
+    assert cache.get_or_compute("k", lambda: "new", executor) == "old"
+    executor.run()
+    assert cache.get("k") == "new"
+
+
+# =====================================
+# Places results per grid cell
+# =====================================
+def test_nearby_points_share_a_places_cell():
+    key, lat, lng, radius = app.places_cache_key(40.75801, -73.98551, "thai", 1609)
+    assert radius == 2000
+    assert app.places_cache_key(lat, lng, "thai", 1700)[0] == key
+    assert app.places_cache_key(lat + app.PLACES_CELL_DEG, lng, "thai", 1609)[0] != key
+    assert app.places_cache_key(lat, lng, "thai", 2100)[0] != key
+
+
+def test_later_pages_come_from_the_cached_list(stub):
+    app.places_breaker.record_success()
+    stub.faults.clear()
+    ranked = app.search_restaurants(40.7411, -73.9897, "italian", 1609)
+    assert len(ranked) > app.RESULTS_PAGE_SIZE
+    assert app.search_restaurants(40.74111, -73.98971, "italian", 1609) == ranked
+    assert stub.faults.requests["places_search"] == 1
@@ -0,0 +1,69 @@
+"""
+Batched dish mode against bench/stub_upstreams.py: parse_dish_batch keeps
+only valid, first-seen entries for ids that were asked for, and ids the
+model missed are re-asked exactly once, at low priority.
+
+    python -m pytest tests
+"""
+
+import json
+
+import pytest
+
+import app
+
+DISHES = [{"name": "Bibimbap", "description": "Rice bowl with vegetables."}]
+OTHER_DISHES = [{"name": "Japchae", "description": "Glass noodles."}]
+DESCRIPTIONS = {"r0": "Seoul Garden, Korean restaurant.", "r1": "Han Table, Korean restaurant."}
+
+
+@pytest.fixture
+def calls(stub, monkeypatch):
+    """(priority, ids in the prompt) of each batched completion."""
+    stub.faults.clear()
+    app.openai_breaker.record_success()
+    recorded = []
+    create = app.create_dish_completion
+
+    def recording_create(mode, stage, messages, priority="high", **kwargs):
+        ids = [rid for rid in DESCRIPTIONS if f"id: {rid}\n" in messages[-1]["content"]]
+        recorded.append((priority, ids))
+        return create(mode, stage, messages, priority, **kwargs)
+
+    monkeypatch.setattr(app, "create_dish_completion", recording_create)
+    return recorded
+
+
+def answer(*entries) -> str:
+    return json.dumps({"restaurants": list(entries)})
+
+
+def test_parse_drops_invalid_duplicate_and_unknown_entries():
+    text = answer(
+        {"id": "r0", "dishes": DISHES},
+        {"id": "r0", "dishes": OTHER_DISHES},
+        {"id": "r1", "dishes": []},
+        {"id": "r9", "dishes": DISHES},
+        "not an entry",
+    )
+    assert app.parse_dish_batch(text, DESCRIPTIONS) == {"r0": app.format_dish_lines(DISHES)}
+
+
+def test_missing_id_is_re_asked_once_at_low_priority(stub, calls):
+    stub.faults.reply(
+        "chat_completions",
+        answer({"id": "r0", "dishes": DISHES}, {"id": "r1", "dishes": [{"name": ""}]}),
+        answer({"id": "r1", "dishes": OTHER_DISHES}),
+    )
+    texts = app.request_dish_recommendations_batch(DESCRIPTIONS, "Korean")
+
+    assert texts == {"r0": app.format_dish_lines(DISHES), "r1": app.format_dish_lines(OTHER_DISHES)}
+    assert calls == [("high", ["r0", "r1"]), ("low", ["r1"])]
+    assert stub.faults.requests["chat_completions"] == 2
+
+
+def test_malformed_json_is_re_asked_once_then_given_up(stub, calls):
+    stub.faults.reply("chat_completions", '{"restaurants": [{"id": "r0",', "not json at all")
+    assert app.request_dish_recommendations_batch(DESCRIPTIONS, "Korean") == {}
+    assert calls == [("high", ["r0", "r1"]), ("low", ["r0", "r1"])]
+    assert stub.faults.requests["chat_completions"] == 2
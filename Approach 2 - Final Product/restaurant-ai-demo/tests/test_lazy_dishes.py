@@ -0,0 +1,75 @@
+"""
+Lazy dish loading (DISH_LOADING=lazy): /search returns cards without
+calling OpenAI, /dishes/<place_id> generates one card's dishes.
+
+    python -m pytest tests
+"""
+
+import re
+import time
+from html import unescape
+
+import pytest
+
+import app
+
+SEARCH_FORM = {"address": "Lazy Lane 1, New York", "cuisine": "korean", "radius": "1"}
+
+
+@pytest.fixture
+def client(stub, monkeypatch):
+    monkeypatch.setattr(app, "DISH_LOADING", "lazy")
+    stub.faults.clear()
+    app.openai_breaker.record_success()
+    return app.app.test_client()
+
+
+def dish_urls(page: str) -> list:
+    return [unescape(u) for u in re.findall(r'data-dish-url="([^"]+)"', page)]
+
+
+def test_lazy_search_returns_cards_without_llm_calls(client, stub):
+    page = client.post("/search", data=SEARCH_FORM).get_data(as_text=True)
+    assert len(dish_urls(page)) == app.RESULTS_PAGE_SIZE
+    assert page.count('data-prefetch="1"') == app.DISH_PREFETCH_TOP
+    assert 'action", "/search/stream"' not in page
+    assert stub.faults.requests.get("chat_completions", 0) == 0
+
+
+def test_dishes_endpoint_generates_once_then_serves_the_cache(client, stub):
+    page = client.post("/search", data=dict(SEARCH_FORM, cuisine="mexican")).get_data(as_text=True)
+    url = dish_urls(page)[1]
+
+    resp = client.get(url + "&trigger=expand")
+    assert resp.status_code == 200
+    assert "dish-list" in resp.get_data(as_text=True)
+    calls = stub.faults.requests["chat_completions"]
+    assert calls >= 1
+
+    assert "dish-list" in client.get(url).get_data(as_text=True)
+    assert stub.faults.requests["chat_completions"] == calls
+
+    # the next search shows that card's dishes inline
+    page = client.post("/search", data=dict(SEARCH_FORM, cuisine="mexican")).get_data(as_text=True)
+    assert url not in dish_urls(page)
+
+
+def test_unknown_card_is_not_generated(client, stub):
+    resp = client.get("/dishes/places/never-searched?cuisine=korean")
+    assert resp.status_code == 404
+    assert stub.faults.requests.get("chat_completions", 0) == 0
+
+
+def test_slow_dishes_are_cut_off_at_the_enrich_deadline(client, stub, monkeypatch):
+    page = client.post("/search", data=dict(SEARCH_FORM, cuisine="italian")).get_data(as_text=True)
+    url = dish_urls(page)[2]
+    monkeypatch.setattr(app, "ENRICH_DEADLINE_SECONDS", 0.3)
+    stub.faults.set("chat_completions", delay_ms=3000)
+
+    t0 = time.perf_counter()
+    resp = client.get(url)
+    stub.faults.clear()
+    assert time.perf_counter() - t0 < 2.0
+    assert resp.status_code == 200
+    body = unescape(resp.get_data(as_text=True))
+    assert app.DISH_FAILED_MESSAGE in body or app.DISH_UNAVAILABLE_MESSAGE in body
@@ -0,0 +1,169 @@
+"""
+Shared token buckets (ratelimit.py), and app.py's Google calls against
+bench/stub_upstreams.py answering 429s or enforcing a quota.
+
+    python -m pytest tests
+"""
+
+import pytest
+
+import app
+from conftest import FakeClock
+from ratelimit import RateLimited, RateLimiter, parse_duration
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "ratelimit.sqlite3")
+
+
+# =====================================
+# Token bucket
+# =====================================
+def test_burst_then_wait_for_refill(clock, db_path):
+    limiter = RateLimiter("t", rate=2, db_path=db_path, clock=clock)
+    assert limiter._take("high") == 0.0
+    assert limiter._take("high") == 0.0
+    assert limiter._take("high") == pytest.approx(0.5)
+    with pytest.raises(RateLimited):
+        limiter.acquire(max_wait=0.1)
+
+    clock.now += 0.5
+    limiter.acquire(max_wait=0)
+    assert limiter.stats()["granted"] == 1
+    assert limiter.stats()["shed"] == 1
+
+
+def test_low_priority_is_shed_before_the_reserve(clock, db_path):
+    limiter = RateLimiter("t", rate=4, low_reserve=0.5, db_path=db_path, clock=clock)
+    limiter.acquire("low")
+    limiter.acquire("low")
+    with pytest.raises(RateLimited):
+        limiter.acquire("low")
+    limiter.acquire("high", max_wait=0)
+    limiter.acquire("high", max_wait=0)
+    assert limiter.stats()["shed"] == 1
+
+
+def test_throttle_halves_rate_pauses_and_recovers(clock, db_path):
+    limiter = RateLimiter("t", rate=10, db_path=db_path, clock=clock)
+    limiter.record_throttle(retry_after=2)
+    assert limiter.rate == 5
+    assert limiter._take("high") == pytest.approx(2)
+    assert limiter._take("low") is None
+
+    clock.now += 2
+    for _ in range(100):
+        limiter.record_success()
+    assert limiter._take("high") == 0.0
+    assert limiter.rate == 10  # back to the ceiling, not above
+
+
+def test_processes_share_one_bucket(clock, db_path):
+    # two workers: same bucket name and database, separate objects
+    first = RateLimiter("openai:abc", rate=2, db_path=db_path, clock=clock)
+    second = RateLimiter("openai:abc", rate=2, db_path=db_path, clock=clock)
+    first.acquire(max_wait=0)
+    first.acquire(max_wait=0)
+    with pytest.raises(RateLimited):
+        second.acquire(max_wait=0)
+
+    second.record_throttle(retry_after=5)
+    clock.now += 1
+    assert first._take("high") == pytest.approx(4)
+
+
+def test_headers_lower_the_ceiling_and_pause(clock, db_path):
+    limiter = RateLimiter("t", rate=10, db_path=db_path, clock=clock)
+    updates = []
+    update = limiter._update
+    limiter._update = lambda fn: updates.append(fn) or update(fn)
+
+    # the quota comes with every response; it is applied by the next grant, not written per call
+    for _ in range(3):
+        limiter.observe_headers({"x-ratelimit-limit-requests": "120"})
+    assert updates == []
+    limiter.acquire(max_wait=0)
+    assert limiter.rate == 2
+    assert len(updates) == 1
+
+    limiter.observe_headers({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "1.5s"})
+    assert limiter._take("high") == pytest.approx(1.5)
+
+
+def test_grants_lease_tokens_to_the_process(clock, db_path):
+    limiter = RateLimiter("t", rate=50, lease_seconds=0.1, db_path=db_path, clock=clock)
+    updates = []
+    update = limiter._update
+    limiter._update = lambda fn: updates.append(fn) or update(fn)
+
+    for _ in range(10):
+        limiter.acquire(max_wait=0)
+    # 0.1 s of 50/s is 5 tokens per bucket update
+    assert len(updates) == 2
+    assert limiter.stats()["granted"] == 10
+    assert limiter.stats()["leased"] == 8
+
+
+def test_unused_lease_goes_back_to_the_shared_bucket(clock, db_path):
+    first = RateLimiter("shared", rate=50, burst=5, db_path=db_path, clock=clock)
+    second = RateLimiter("shared", rate=50, burst=5, db_path=db_path, clock=clock)
+    first.acquire(max_wait=0)
+    with pytest.raises(RateLimited):
+        second.acquire(max_wait=0)
+
+    # any bucket update by first hands its 4 unused tokens back
+    first.acquire("low")
+    second.acquire(max_wait=0)
+
+
+def test_throttle_drops_the_lease(clock, db_path):
+    limiter = RateLimiter("t", rate=50, db_path=db_path, clock=clock)
+    limiter.acquire(max_wait=0)
+    limiter.record_throttle(retry_after=1)
+    with pytest.raises(RateLimited):
+        limiter.acquire(max_wait=0)
+
+
+def test_parse_duration():
+    assert parse_duration("2") == 2
+    assert parse_duration("1.5s") == 1.5
+    assert parse_duration("6m0s") == 360
+    assert parse_duration("20ms") == pytest.approx(0.02)
+    assert parse_duration("") is None
+    assert parse_duration("soon") is None
+
+
+# =====================================
+# Google calls
+# =====================================
+def test_429_throttles_without_opening_the_breaker(stub, monkeypatch, db_path):
+    limiter = RateLimiter("places:test", rate=10, db_path=db_path)
+    monkeypatch.setattr(app, "places_limiter", limiter)
+    app.places_breaker.record_success()
+    stub.faults.clear()
+    stub.faults.set("places_search", status=429, count=app.BREAKER_FAILURE_THRESHOLD + 1)
+
+    for _ in range(app.BREAKER_FAILURE_THRESHOLD + 1):
+        assert app.fetch_places(60.0, 10.0, "thai", 1000) is None
+    assert app.places_breaker.state == "closed"
+    assert limiter.stats()["throttled"] == app.BREAKER_FAILURE_THRESHOLD + 1
+    assert limiter.rate < 10
+    assert app.fetch_places(60.0, 10.0, "thai", 1000)
+
+
+def test_quota_headers_keep_calls_under_the_quota(stub, monkeypatch, db_path):
+    limiter = RateLimiter("places:test", rate=10, db_path=db_path)
+    monkeypatch.setattr(app, "places_limiter", limiter)
+    monkeypatch.setattr(stub, "quotas", {"places_search": 2})
+    stub.faults.clear()
+
+    for i in range(4):
+        assert app.fetch_places(61.0 + i, 10.0, "thai", 1000)
+    assert limiter.stats()["throttled"] == 0
+    assert limiter.stats()["queued"] >= 1
@@ -0,0 +1,232 @@
+"""
+Deadlines, circuit breakers and hedging, against bench/stub_upstreams.py
+with injected faults.
+
+    python -m pytest tests
+"""
+
+import asyncio
+import time
+
+import pytest
+import requests
+
+import app
+from cache import CacheEntry
+from conftest import FakeClock
+from resilience import CircuitBreaker, CircuitOpenError, Deadline, DeadlineExceeded, Hedger, stage_timeout
+
+BREAKERS = (app.geocode_breaker, app.places_breaker, app.details_breaker, app.openai_breaker)
+
+
+@pytest.fixture(autouse=True)
+def reset_breakers():
+    for b in BREAKERS:
+        b.record_success()
+    yield
+    for b in BREAKERS:
+        b.record_success()
+
+
+# =====================================
+# Deadline
+# =====================================
+def test_stage_timeout_is_capped_by_remaining_budget():
+    clock = FakeClock()
+    deadline = Deadline(10, clock=clock)
+    assert deadline.timeout(4) == 4
+
+    clock.now += 8.5
+    assert deadline.timeout(4) == pytest.approx(1.5)
+
+    clock.now += 2
+    with pytest.raises(DeadlineExceeded):
+        deadline.timeout(4)
+    assert stage_timeout(None, 3) == 3
+
+
+def test_slow_geocode_is_cut_off_by_the_search_budget(stub):
+    stub.faults.set("geocode", delay_ms=2000, count=1)
+    t0 = time.perf_counter()
+    assert app.geocode_address("1 Slow Street", Deadline(0.3)) == (None, None, None)
+    assert time.perf_counter() - t0 < 1.0
+
+
+def test_spent_budget_skips_the_call(stub):
+    stub.faults.clear()
+    assert app.geocode_address("2 Late Street", Deadline(0)) == (None, None, None)
+    assert stub.faults.requests.get("geocode", 0) == 0
+
+
+def test_rate_limit_queueing_counts_against_the_call_timeout(stub, monkeypatch):
+    stub.faults.clear()
+    stub.faults.set("geocode", delay_ms=500, count=1)
+    monkeypatch.setattr(app.geocode_limiter, "acquire", lambda *args, **kwargs: time.sleep(0.3))
+
+    t0 = time.perf_counter()
+    with pytest.raises(requests.Timeout):
+        app.google_request(
+            CircuitBreaker("t"),
+            app.geocode_limiter,
+            "GET",
+            app.GEOCODE_URL,
+            params=app.geocode_params("3 Queue Street"),
+            timeout=0.6,
+        )
+    assert time.perf_counter() - t0 < 0.75
+
+
+def test_dish_calls_stay_within_the_search_deadline(stub):
+    stub.faults.clear()
+    stub.faults.set("chat_completions", delay_ms=2000, count=1)
+    r = {"name": "Slowpoke", "place_id": "slow-dish-1", "rating": 4.0, "address": ""}
+
+    t0 = time.perf_counter()
+    text = app.generate_dish_recommendations_for_restaurant(r, "Korean", deadline=Deadline(0.5))
+    assert text == app.DISH_FAILED_MESSAGE
+    assert time.perf_counter() - t0 < 1.5
+
+
+# =====================================
+# Circuit breaker
+# =====================================
+def test_breaker_opens_after_threshold_and_probes_after_reset():
+    clock = FakeClock()
+    breaker = CircuitBreaker("t", failure_threshold=3, reset_seconds=30, clock=clock)
+
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            breaker.call(lambda: int("x"))
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: 1)
+
+    clock.now += 30
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()  # one probe at a time
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.stats()["opened"] == 1
+
+
+def test_failed_probe_reopens():
+    clock = FakeClock()
+    breaker = CircuitBreaker("t", failure_threshold=1, reset_seconds=5, clock=clock)
+    breaker.record_failure()
+    clock.now += 5
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.stats()["opened"] == 2
+
+
+def test_places_breaker_fails_fast_once_open(stub):
+    stub.faults.clear()
+    stub.faults.set("places_search", status=503)
+    for i in range(app.BREAKER_FAILURE_THRESHOLD):
+        assert app.search_restaurants(10.0 + i, 10.0, "chinese", 1000) == []
+    assert app.places_breaker.state == "open"
+
+    calls = stub.faults.requests["places_search"]
+    t0 = time.perf_counter()
+    assert app.search_restaurants(20.0, 10.0, "chinese", 1000) == []
+    assert time.perf_counter() - t0 < 0.1
+    assert stub.faults.requests["places_search"] == calls
+
+
+def test_client_errors_do_not_trip_the_breaker(stub):
+    stub.faults.clear()
+    stub.faults.set("places_search", status=400)
+    for i in range(app.BREAKER_FAILURE_THRESHOLD + 1):
+        app.search_restaurants(30.0 + i, 10.0, "chinese", 1000)
+    assert app.places_breaker.state == "closed"
+
+
+def test_failing_places_serves_the_stale_list(stub):
+    stub.faults.clear()
+    fresh = app.search_restaurants(40.0, 10.0, "italian", 1000)
+    assert fresh
+
+    key = app.places_cache_key(40.0, 10.0, "italian", 1000)[0]
+    entry = app.places_cache.get_entry(key)
+    now = time.time()
+    app.places_cache._store(key, CacheEntry(entry.value, now - 100, now - 1, now + 100))
+
+    stub.faults.set("places_search", status=503)
+    assert app.search_restaurants(40.0, 10.0, "italian", 1000) == fresh
+
+
+@pytest.mark.parametrize("mode", ["batched", "per_restaurant"])
+def test_open_openai_breaker_degrades_dishes_without_calls(stub, mode):
+    stub.faults.clear()
+    for _ in range(app.BREAKER_FAILURE_THRESHOLD):
+        app.openai_breaker.record_failure()
+
+    restaurants = [
+        {"name": f"Closed Kitchen {i}", "place_id": f"breaker-{mode}-{i}", "rating": 4.0, "address": ""}
+        for i in range(3)
+    ]
+    app.enrich_restaurants(restaurants, "Chinese", "New York", deadline_seconds=5, mode=mode)
+
+    assert [r["dish_recs"] for r in restaurants] == [app.DISH_UNAVAILABLE_MESSAGE] * 3
+    assert stub.faults.requests.get("chat_completions", 0) == 0
+
+
+def test_openai_errors_open_the_breaker(stub):
+    stub.faults.clear()
+    stub.faults.set("chat_completions", status=500)
+    for i in range(app.BREAKER_FAILURE_THRESHOLD):
+        r = {"name": "Flaky", "place_id": f"flaky-{i}", "rating": 4.0, "address": ""}
+        assert app.generate_dish_recommendations_for_restaurant(r, "Chinese") == app.DISH_FAILED_MESSAGE
+    assert app.openai_breaker.state == "open"
+
+
+# =====================================
+# Hedging
+# =====================================
+def test_slow_places_call_is_hedged(stub):
+    stub.faults.clear()
+    stub.faults.set("places_search", delay_ms=1500, count=1)
+    hedger = Hedger("t", default_after=0.1)
+
+    t0 = time.perf_counter()
+    places = hedger.call(lambda: app.fetch_places(50.0, 10.0, "korean", 1000), app.hedge_executor, timeout=3)
+    assert places
+    assert time.perf_counter() - t0 < 1.0
+    assert hedger.stats()["hedged"] == 1
+    assert hedger.stats()["hedge_wins"] == 1
+
+
+def test_fast_call_is_not_hedged(stub):
+    stub.faults.clear()
+    hedger = Hedger("t", default_after=1.0)
+    assert hedger.call(lambda: app.fetch_place_details("hedge-fast"), app.hedge_executor, timeout=3)
+    assert hedger.stats()["hedged"] == 0
+
+
+def test_hedge_delay_follows_observed_latency():
+    hedger = Hedger("t", quantile=0.9, min_samples=10, default_after=5.0)
+    assert hedger.hedge_after() == 5.0
+    for i in range(10):
+        hedger.observe(0.1 * (i + 1))
+    assert hedger.hedge_after() == pytest.approx(1.0)
+
+
+def test_async_hedge_returns_first_answer():
+    hedger = Hedger("t", default_after=0.05)
+    delays = [1.0, 0.01]
+
+    async def attempt():
+        await asyncio.sleep(delays.pop(0))
+        return "ok"
+
+    async def run():
+        t0 = time.perf_counter()
+        result = await hedger.call_async(attempt, timeout=2)
+        return result, time.perf_counter() - t0
+
+    result, elapsed = asyncio.run(run())
+    assert result == "ok"
+    assert elapsed < 0.5
+    assert hedger.stats()["hedge_wins"] == 1
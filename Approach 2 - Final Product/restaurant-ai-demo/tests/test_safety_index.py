@@ -0,0 +1,124 @@
+"""
+safety_index.py: exact and fuzzy matches of Places results against the
+inspection CSV, and incremental rebuilds when the CSV changes.
+
+    python -m pytest tests
+"""
+
+import csv
+import threading
+import time
+
+import pytest
+
+import app
+import safety_index
+from safety_index import SafetyIndex, load_or_build, parse_address
+
+COLUMNS = ["CAMIS", "RESTAURANT", "BUILDING", "STREET", "ZIPCODE", "PHONE", "CUISINE_DESCRIPTION", "CRITICALFLAG"]
+ROWS = [
+    ["1", "JOE'S PIZZA", "7", "CARMINE STREET", "10014.0", "", "Pizza", "Not Critical"],
+    ["2", "NOM WAH TEA PARLOR", "13", "DOYERS STREET", "10013.0", "", "Chinese", "Critical"],
+    ["3", "THE HALAL GUYS", "307", "EAST 14 STREET", "10003.0", "", "Middle Eastern", "Critical"],
+]
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        writer.writerows(rows)
+
+
+@pytest.fixture
+def paths(tmp_path):
+    data = tmp_path / "restaurants.csv"
+    write_csv(data, ROWS)
+    return str(data), str(tmp_path / "index.pickle")
+
+
+def test_parse_google_address():
+    assert parse_address("307 E 14th St #2, New York, NY 10003, USA") == ("307", "E 14 ST", "10003")
+    assert parse_address("Broadway, New York, NY 10004") == ("", "BROADWAY", "10004")
+
+
+def test_exact_and_fuzzy_matches(paths):
+    index = load_or_build(*paths)
+
+    record, match = index.lookup("Joe's Pizza", "7 Carmine St, New York, NY 10014, USA")
+    assert (record["camis"], record["flag"], match) == ("1", "Not Critical", "exact")
+
+    record, match = index.lookup("The Halal Guys", "307 E 14th St, New York, NY 10003, USA")
+    assert (record["camis"], match) == ("3", "exact")
+
+    record, match = index.lookup("Nom Wah Tea Parlour", "13 Doyers St, New York, NY 10013, USA")
+    assert (record["camis"], record["flag"], match) == ("2", "Critical", "fuzzy")
+
+    assert index.lookup("Joe's Pizza", "1 Broadway, New York, NY 10004, USA") == (None, None)
+    assert index.lookup("Totally Different Bistro", "7 Carmine St, New York, NY 10014") == (None, None)
+
+
+def test_refreshed_csv_is_indexed_incrementally(paths):
+    data, index_path = paths
+    index = load_or_build(data, index_path)
+    assert len(index.records) == 3
+
+    write_csv(data, [
+        ["1", "JOE'S PIZZA", "7", "CARMINE STREET", "10014.0", "", "Pizza", "Critical"],
+        ROWS[1],
+        ["4", "KATZ'S DELICATESSEN", "205", "EAST HOUSTON STREET", "10002.0", "", "Jewish/Kosher", "Not Critical"],
+    ])
+    index = SafetyIndex.load(index_path)
+    assert index.update_from_csv(data) == {"added": 1, "changed": 1, "removed": 1}
+
+    assert index.lookup("Joe's Pizza", "7 Carmine St, New York, NY 10014")[0]["flag"] == "Critical"
+    assert index.lookup("The Halal Guys", "307 E 14th St, New York, NY 10003") == (None, None)
+    assert index.lookup("Katz's Delicatessen", "205 E Houston St, New York, NY 10002")[1] == "exact"
+    assert "10003" not in {z for z, _ in index.by_trigram}
+
+    # an unchanged CSV is not re-indexed
+    assert index.update_from_csv(data) == {"added": 0, "changed": 0, "removed": 0}
+
+
+def test_search_results_carry_the_flag(paths, monkeypatch):
+    index = load_or_build(*paths)
+    monkeypatch.setattr(app, "safety_index", lambda: index)
+    restaurants = app.annotate_safety([
+        {"name": "Nom Wah Tea Parlor", "address": "13 Doyers St, New York, NY 10013, USA"},
+        {"name": "Unknown Place", "address": "1 Main St, New York, NY 10001, USA"},
+    ])
+    assert restaurants[0]["safety"] == {"flag": "Critical", "inspection_date": None, "match": "exact"}
+    assert restaurants[1]["safety"] is None
+
+
+def test_lookups_do_not_wait_for_the_index(paths, monkeypatch):
+    data, index_path = paths
+    # let the load app.py started at import finish first
+    while safety_index._refreshing:
+        time.sleep(0.01)
+    monkeypatch.setattr(safety_index, "SAFETY_DATA_PATH", data)
+    monkeypatch.setattr(safety_index, "SAFETY_INDEX_PATH", index_path)
+    monkeypatch.setattr(safety_index, "_index", SafetyIndex())
+    monkeypatch.setattr(safety_index, "_index_checked_at", None)
+    building = threading.Event()
+    build = safety_index.load_or_build
+
+    def slow_build(*args):
+        building.wait()
+        return build(*args)
+
+    monkeypatch.setattr(safety_index, "load_or_build", slow_build)
+    thread = safety_index.refresh_safety_index()
+    # a second refresh is not started while the first one runs
+    assert safety_index.refresh_safety_index() is None
+    assert safety_index.safety_index().lookup("Joe's Pizza", "7 Carmine St, New York, NY 10014") == (None, None)
+
+    building.set()
+    thread.join()
+    assert safety_index.safety_index().lookup("Joe's Pizza", "7 Carmine St, New York, NY 10014")[1] == "exact"
+
+
+def test_missing_dataset_gives_an_empty_index(tmp_path):
+    index = load_or_build(str(tmp_path / "missing.csv"), str(tmp_path / "index.pickle"))
+    assert index.lookup("Joe's Pizza", "7 Carmine St, New York, NY 10014") == (None, None)
+    assert safety_index.data_source(str(tmp_path / "missing.csv")) is None
@@ -0,0 +1,30 @@
+"""
+Search form parsing: tampered or empty radius/offset fields fall back to
+defaults instead of failing the request.
+
+    python -m pytest tests
+"""
+
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("5", 5), ("4.2", 5), ("0.1", 1), ("250", 10), ("", 3), ("far", 3), ("nan", 3), ("inf", 3), (None, 3),
+])
+def test_radius_snaps_to_an_offered_option(value, expected):
+    assert app.form_radius(value) == expected
+
+
+@pytest.mark.parametrize("value, expected", [("10", 10), ("-5", 0), ("", 0), ("2.5", 0), ("x", 0), (None, 0)])
+def test_offset_falls_back_to_the_first_page(value, expected):
+    assert app.form_offset(value) == expected
+
+
+def test_tampered_form_still_renders(stub):
+    stub.faults.clear()
+    form = {"address": "Form Street 9, New York", "cuisine": "french", "radius": "", "offset": "abc"}
+    resp = app.app.test_client().post("/search", data=form)
+    assert resp.status_code == 200
+    assert '<option value="3" selected' in resp.get_data(as_text=True)
@@ -0,0 +1,40 @@
+"""
+/search/stream against bench/stub_upstreams.py: every card is sent before
+any dishes, then each card's dish box arrives in one fillDishes chunk.
+
+    python -m pytest tests
+"""
+
+import json
+import re
+from collections import Counter
+
+import app
+
+FILL_RE = re.compile(r"<script>fillDishes\((\d+), (.*)\);</script>")
+
+
+def test_stream_sends_cards_first_then_one_dish_chunk_per_card(stub, monkeypatch):
+    monkeypatch.setattr(app, "DISH_LOADING", "eager")
+    app.openai_breaker.record_success()
+    stub.faults.clear()
+    form = {"address": "Stream Street 5, New York", "cuisine": "spanish", "radius": "1"}
+
+    resp = app.app.test_client().post("/search/stream", data=form, buffered=False)
+    assert resp.status_code == 200
+    chunks = [c.decode("utf-8") for c in resp.iter_encoded()]
+
+    head, fills, tail = chunks[0], chunks[1:-1], chunks[-1]
+    cards = re.findall(r'id="dishes-(\d+)"', head)
+    assert len(cards) == app.RESULTS_PAGE_SIZE
+    assert not FILL_RE.search(head)
+    assert tail.startswith("</body>")
+
+    filled = Counter()
+    for chunk in fills:
+        match = FILL_RE.fullmatch(chunk.strip())
+        assert match, chunk
+        filled[match.group(1)] += 1
+        assert "dish-list" in json.loads(match.group(2))
+    assert filled == Counter(cards)
+    assert stub.faults.requests["places_search"] == 1
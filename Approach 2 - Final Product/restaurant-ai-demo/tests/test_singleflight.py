@@ -0,0 +1,135 @@
+"""
+singleflight.py: concurrent callers share one execution and its result or
+error; a follower whose wait runs out calls fn() itself.
+
+    python -m pytest tests
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+import app
+from resilience import Deadline
+from singleflight import AsyncSingleFlight, SingleFlight
+
+
+def run_leader(flight, key, fn):
+    """Start flight.do(key, fn) on a thread and return once it is in flight."""
+    results = []
+    thread = threading.Thread(target=lambda: results.append(flight.do(key, fn)))
+    thread.start()
+    while flight.stats()["in_flight"] == 0:
+        time.sleep(0.001)
+    return thread, results
+
+
+def test_followers_share_the_leaders_result():
+    flight = SingleFlight("t")
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait()
+        return "value"
+
+    thread, results = run_leader(flight, "k", fn)
+    followers = [threading.Thread(target=lambda: results.append(flight.do("k", fn))) for _ in range(3)]
+    for f in followers:
+        f.start()
+    while flight.stats()["coalesced"] < 3:
+        time.sleep(0.001)
+    release.set()
+    for t in [thread, *followers]:
+        t.join()
+
+    assert results == ["value"] * 4
+    assert len(calls) == 1
+    assert flight.stats()["saved_calls"] == 3
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_followers_get_the_leaders_error():
+    flight = SingleFlight("t")
+    release = threading.Event()
+
+    def fail():
+        release.wait()
+        raise ValueError("upstream down")
+
+    errors = []
+
+    def leader():
+        try:
+            flight.do("k", fail)
+        except ValueError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    while flight.stats()["in_flight"] == 0:
+        time.sleep(0.001)
+    threading.Timer(0.05, release.set).start()
+    with pytest.raises(ValueError):
+        flight.do("k", lambda: "unused")
+    thread.join()
+    assert len(errors) == 1
+
+
+def test_follower_calls_upstream_itself_when_its_wait_runs_out():
+    flight = SingleFlight("t")
+    release = threading.Event()
+    thread, results = run_leader(flight, "k", lambda: release.wait() and "slow")
+
+    t0 = time.monotonic()
+    assert flight.do("k", lambda: "direct", timeout=0.05) == "direct"
+    assert time.monotonic() - t0 < 1.0
+    assert flight.stats()["fallbacks"] == 1
+    assert flight.stats()["saved_calls"] == 0
+
+    release.set()
+    thread.join()
+    assert results == ["slow"]
+
+
+def test_geocode_follower_is_bounded_by_its_deadline(monkeypatch):
+    """A stuck geocode leader holds a search only for its own geocode budget."""
+    release = threading.Event()
+    monkeypatch.setattr(app, "geocode_and_store", lambda key, address, timeout, priority: release.wait() and (1.0, 2.0, "Slow"))
+    address = "Stuck Street 1, New York"
+    thread = threading.Thread(target=app.geocode_address, args=(address,))
+    thread.start()
+    while app.geocode_flight.stats()["in_flight"] == 0:
+        time.sleep(0.001)
+
+    t0 = time.monotonic()
+    assert app.geocode_address(address, Deadline(0.1)) == (None, None, None)
+    assert time.monotonic() - t0 < 1.0
+
+    release.set()
+    thread.join()
+
+
+def test_async_follower_calls_upstream_itself_when_its_wait_runs_out():
+    flight = AsyncSingleFlight("t")
+
+    async def slow():
+        await asyncio.sleep(0.5)
+        return "slow"
+
+    async def direct():
+        return "direct"
+
+    async def callers():
+        leader = asyncio.ensure_future(flight.do("k", slow))
+        await asyncio.sleep(0)
+        shared = asyncio.ensure_future(flight.do("k", direct))
+        follower = await flight.do("k", direct, timeout=0.01)
+        return await leader, await shared, follower
+
+    assert asyncio.run(callers()) == ("slow", "slow", "direct")
+    assert flight.stats()["executions"] == 1
+    assert flight.stats()["fallbacks"] == 1
@@ -0,0 +1,63 @@
+"""
+warmup.py against bench/stub_upstreams.py: after a warm-up the same search
+makes no upstream calls, and warm-up calls are shed rather than queued when
+the rate limiters are short of tokens.
+
+    python -m pytest tests
+"""
+
+import app
+import warmup
+from ratelimit import RateLimiter
+
+LIMITERS = ("geocode_limiter", "places_limiter", "details_limiter", "openai_limiter")
+
+
+def replace_limiters(monkeypatch, tmp_path, rate):
+    """Fresh limiters of the given rate in place of app.py's shared ones."""
+    limiters = {}
+    for name in LIMITERS:
+        limiters[name] = RateLimiter(name, rate, db_path=str(tmp_path / "ratelimit.sqlite3"))
+        monkeypatch.setattr(app, name, limiters[name])
+    return limiters
+
+
+def test_warmed_search_is_served_from_cache(stub, tmp_path, monkeypatch):
+    # room for the whole warm-up, which runs at low priority
+    replace_limiters(monkeypatch, tmp_path, rate=1000)
+    app.openai_breaker.record_success()
+    anchors = tmp_path / "anchors.txt"
+    anchors.write_text("# comment\n\n77 Warm Street, New York\n")
+    assert warmup.read_anchors(str(anchors)) == ["77 Warm Street, New York"]
+
+    # cuisines warmup's --cuisines accepts, so the Places text query is a real one
+    cuisines = ["chinese", "french"]
+    assert set(cuisines) <= set(app.CUISINE_KEYWORDS)
+    stub.faults.clear()
+    totals = warmup.warm(["77 Warm Street, New York"], cuisines, [1, 3], rate=50, workers=4)
+    assert totals["anchors"] == 1
+    assert totals["searches"] == 4
+    assert totals["dishes"] == 4 * app.RESULTS_PAGE_SIZE
+    assert totals["errors"] == 0
+
+    stub.faults.clear()
+    client = app.app.test_client()
+    page = client.post("/search", data={"address": "77 Warm Street, New York", "cuisine": "french", "radius": "3"})
+    assert page.status_code == 200
+    assert stub.faults.requests == {}
+
+
+def test_warm_up_is_shed_instead_of_queueing(stub, tmp_path, monkeypatch):
+    limiters = replace_limiters(monkeypatch, tmp_path, rate=1)
+    stub.faults.clear()
+    totals = warmup.warm(["78 Busy Street, New York"], ["korean"], [1])
+    assert totals["failed_anchors"] == 1
+    assert stub.faults.requests == {}
+    assert limiters["geocode_limiter"].counters["shed"] == 1
+    assert limiters["geocode_limiter"].counters["queued"] == 0
+
+
+def test_radius_options_drive_the_form():
+    page = app.app.test_client().get("/").get_data(as_text=True)
+    for miles in app.RADIUS_OPTIONS:
+        assert f'<option value="{miles}"' in page
@@ -0,0 +1,115 @@
+"""
+Cache warm-up for the most common searches: every anchor address x every
+cuisine (CUISINE_KEYWORDS) x every radius (RADIUS_OPTIONS), so the first
+real search after a deploy or a cache expiry is served from cache.
+
+    python warmup.py                        # anchors from warmup_anchors.txt
+    python warmup.py anchors.txt --rate 2 --workers 8
+    python warmup.py --cuisines chinese korean --radii 1 3
+    python warmup.py --every 21600          # keep running, every 6 hours
+
+For each anchor it geocodes once, then for each cuisine and radius runs the
+same steps as a search: Places search, place details and dish
+recommendations for the first results page. Everything goes through app.py,
+so results land in the app's caches (CACHE_DB_PATH, shared with the running
+workers), and entries that are still fresh are not fetched again.
+
+Searches run on --workers threads, at most --rate per second. Upstream calls
+also go through app.py's shared rate limiters at low priority: they never
+queue for a token and are shed while the limiters' reserve is needed for
+live traffic, so a warm-up never slows real searches down. Run it from cron
+after deploys, or with --every as a long-running job.
+"""
+
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import app
+from metrics import log
+from ratelimit import RateLimiter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ANCHORS_PATH = os.path.join(HERE, "warmup_anchors.txt")
+
+
+def read_anchors(path: str) -> list:
+    """One address per line; blank lines and # comments are skipped."""
+    with open(path, encoding="utf-8") as f:
+        lines = (line.split("#", 1)[0].strip() for line in f)
+        return [line for line in lines if line]
+
+
+def warm_search(lat, lng, city, cuisine: str, radius: float) -> dict:
+    """One search's places, details and dishes -> counts for the summary."""
+    ranked = app.search_restaurants(lat, lng, cuisine, radius * app.MILES_TO_METERS, priority="low")
+    page = ranked[:app.RESULTS_PAGE_SIZE]
+    cuisine_label = app.CUISINE_LABELS.get(cuisine, "this cuisine style")
+    app.enrich_restaurants(page, cuisine_label, city, priority="low")
+
+    fallbacks = (app.DISH_FAILED_MESSAGE, app.DISH_EMPTY_MESSAGE, app.DISH_UNAVAILABLE_MESSAGE)
+    return {
+        "searches": 1,
+        "empty_searches": 0 if ranked else 1,
+        "restaurants": len(page),
+        "dishes": sum(1 for r in page if r.get("dish_recs") and r["dish_recs"] not in fallbacks),
+    }
+
+
+def warm(anchors, cuisines, radii, rate: float = 1.0, workers: int = 4) -> dict:
+    """Warm every anchor x cuisine x radius; returns summary counts."""
+    totals = {"anchors": 0, "failed_anchors": 0, "searches": 0, "empty_searches": 0,
+              "restaurants": 0, "dishes": 0, "errors": 0}
+    budget = RateLimiter("warmup", rate)
+
+    located = []
+    for address in anchors:
+        lat, lng, city = app.geocode_address(address, priority="low")
+        if lat is None:
+            log.warning("Warm-up: could not geocode %r, skipping it", address)
+            totals["failed_anchors"] += 1
+            continue
+        totals["anchors"] += 1
+        located.append((address, lat, lng, city))
+
+    def run(job):
+        (address, lat, lng, city), cuisine, radius = job
+        budget.acquire()
+        try:
+            return warm_search(lat, lng, city, cuisine, radius)
+        except Exception as e:
+            log.warning("Warm-up of %r / %s / %s mi failed: %r", address, cuisine, radius, e)
+            return {"errors": 1}
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="warmup") as pool:
+        for counts in pool.map(run, itertools.product(located, cuisines, radii)):
+            for name, n in counts.items():
+                totals[name] += n
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("anchors", nargs="?", default=DEFAULT_ANCHORS_PATH, help="file with one address per line")
+    parser.add_argument("--cuisines", nargs="+", choices=sorted(app.CUISINE_KEYWORDS), default=list(app.CUISINE_KEYWORDS))
+    parser.add_argument("--radii", nargs="+", type=float, default=list(app.RADIUS_OPTIONS), help="miles")
+    parser.add_argument("--rate", type=float, default=1.0, help="searches started per second at most")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--every", type=float, default=None, metavar="SECONDS", help="repeat forever with this period")
+    args = parser.parse_args(argv)
+
+    anchors = read_anchors(args.anchors)
+    while True:
+        t0 = time.perf_counter()
+        totals = warm(anchors, args.cuisines, args.radii, args.rate, args.workers)
+        elapsed = time.perf_counter() - t0
+        log.info("Warm-up done in %.1fs: %s", elapsed, totals)
+        if args.every is None:
+            return 0 if not totals["errors"] else 1
+        time.sleep(max(args.every - elapsed, 0))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())